@@ -0,0 +1,167 @@
+from journal import dumps
+from session_manager import SessionManager
+
+import asyncio
+import json
+import logging
+import os
+import time
+
+def read_queries(path: str):
+    """
+    Yield (id, query) pairs from a file with one query per line: either
+    plain text, identified by its line number, or a JSON object with a
+    "query" and an optional "id". Blank lines are skipped.
+    """
+    with open(path, encoding="utf-8") as file:
+        for number, line in enumerate(file, 1):
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                try:
+                    record = json.loads(line)
+                    yield str(record.get("id", number)), record["query"]
+                    continue
+                except (ValueError, KeyError):
+                    pass
+            yield str(number), line
+
+def to_pairs(queries):
+    """(id, query) pairs from strings, {"id", "query"} dicts or pairs; ids default to the position"""
+    for index, item in enumerate(queries):
+        if isinstance(item, str):
+            yield str(index), item
+        elif isinstance(item, dict):
+            yield str(item.get("id", index)), item["query"]
+        else:
+            query_id, query = item
+            yield str(query_id), query
+
+class BatchRunner:
+    """
+    Runs many independent queries over one MCPClient, at most concurrency
+    at a time. Every query is a new session of a SessionManager, so the
+    MCP connection, the tools and the provider SDK client are shared while
+    the histories are not. Results are yielded as they complete and, with
+    an output_path, appended to it as JSON lines; running again with the
+    same output_path skips the queries that already succeeded.
+    """
+
+    def __init__(self, mcp_client, concurrency: int = 8, output_path: str = None, journal_dir: str = None):
+        self.sessions = SessionManager(mcp_client, journal_dir=journal_dir)
+        self.concurrency = concurrency
+        self.output_path = output_path
+        self.completed = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def load_done(self):
+        """
+        Ids of the queries with a successful result in the output file. A
+        last line torn by an interruption is cut off, so its query runs
+        again and the next record starts on a line of its own.
+        """
+        done = set()
+        if self.output_path is None or not os.path.exists(self.output_path):
+            return done
+        with open(self.output_path, "rb+") as file:
+            data = file.read()
+            end = data.rfind(b"\n") + 1
+            if end < len(data):
+                file.truncate(end)
+        for line in data[:end].splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("error") is None:
+                done.add(record["id"])
+        return done
+
+    async def run_query(self, query_id: str, query):
+        """Run query in a session of its own and return its result record"""
+        answer = []
+        errors = []
+        started = time.monotonic()
+        record = {"id": query_id, "query": query}
+        try:
+            session_id = self.sessions.create_session(
+                query_id,
+                assistant_print=answer.append,
+                system_print=lambda *_: None,
+                error_print=errors.append
+            )
+        except ValueError as e:
+            return {**record, "error": str(e)}
+        model = self.sessions.get_session(session_id)
+        try:
+            await self.sessions.process_query(session_id, query)
+            error = None
+        except Exception as e:
+            logging.debug(f"Query {query_id} failed: {e}")
+            error = f"{type(e).__name__}: {e}"
+        finally:
+            self.sessions.close_session(session_id)
+        # Streamed answers are printed in deltas, the others message by message
+        record["answer"] = ("" if model.stream else "\n").join(answer)
+        record["error"] = error
+        if errors:
+            record["errors"] = errors
+        record["token_usage"] = model.token_usage
+        record["seconds"] = round(time.monotonic() - started, 3)
+        return record
+
+    async def run(self, queries):
+        """
+        Run queries (strings, {"id", "query"} dicts or (id, query) pairs,
+        e.g. from read_queries()) and yield every result record as soon as
+        it completes. The queries are read lazily, so the input can be
+        larger than memory.
+        """
+        done = self.load_done()
+        pairs = to_pairs(queries)
+        results = asyncio.Queue()
+
+        async def worker():
+            # Workers share the iterator: next() never awaits, so every
+            # query is taken by exactly one worker
+            for query_id, query in pairs:
+                if query_id in done:
+                    self.skipped += 1
+                    continue
+                await results.put(await self.run_query(query_id, query))
+
+        async def close():
+            await asyncio.gather(*workers, return_exceptions=True)
+            await results.put(None)
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        closer = asyncio.create_task(close())
+        output = open(self.output_path, "ab") if self.output_path is not None else None
+        try:
+            while True:
+                record = await results.get()
+                if record is None:
+                    break
+                if record["error"] is None:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                if output is not None:
+                    output.write(dumps(record))
+                    output.flush()
+                yield record
+            for task in workers:
+                # Errors of the input iterator end the run
+                if task.exception() is not None:
+                    raise task.exception()
+        finally:
+            for task in workers + [closer]:
+                task.cancel()
+            if output is not None:
+                output.close()
+
+    async def run_all(self, queries):
+        """Run queries to the end and return the result records in completion order"""
+        return [record async for record in self.run(queries)]
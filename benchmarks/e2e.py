@@ -0,0 +1,192 @@
+"""
+End-to-end benchmark: drive MCPClient.process_query against fake provider
+clients and an in-process fastmcp server, and report turn latency
+percentiles, throughput, summarization frequency and peak memory for
+several history lengths as JSON.
+
+    python -m benchmarks.e2e --providers openai,anthropic --history 0,100,400 --output e2e.json
+"""
+from benchmarks.fakes import QUERY_MARKER, FakeConfig, build_server, install_fake_client
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+
+API_KEY_SETTERS = {
+    "openai": "set_openai_api_key",
+    "openai-responses": "set_openai_api_key",
+    "anthropic": "set_anthropic_api_key",
+    "gemini": "set_gemini_api_key",
+}
+
+ASSISTANT_ROLES = {"gemini": "model"}
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def build_model(provider, args, tracer=None):
+    from model_factory import ModelFactory
+
+    def quiet(*_):
+        pass
+
+    factory = ModelFactory()
+    getattr(factory, API_KEY_SETTERS[provider])("benchmark")
+    factory.set_name("benchmark")
+    factory.set_max_tokens(args.max_tokens)
+    factory.set_temperature(0)
+    factory.set_prints(quiet, quiet, quiet)
+    factory.set_summarizer_max_tokens(args.summarizer_max_tokens)
+    factory.set_summarizer_language("english")
+    factory.set_summarizer_soft_threshold(args.soft_threshold)
+    factory.set_max_concurrent_tools(args.max_concurrent_tools)
+    factory.set_tracer(tracer)
+    factory.set_prompt_caching(args.prompt_caching)
+    factory.set_openai_responses(provider == "openai-responses")
+    model = factory.build()
+    model.init()
+    return model
+
+
+def prefill(model, history, response_size):
+    """Add history messages of past turns, alternating user and assistant"""
+    assistant_role = ASSISTANT_ROLES.get(model.format, "assistant")
+    text = "previous message " * (response_size // 17 + 1)
+    model.messages.extend(
+        model.get_role_message("user" if index % 2 == 0 else assistant_role, text)
+        for index in range(history)
+    )
+
+
+async def run_scenario(provider, history, args, trace_memory=False):
+    from fastmcp import Client
+    from mcp_client import MCPClient
+    from session_manager import SessionManager
+    from tracing import InMemoryTracer
+
+    config = FakeConfig(args.latency, args.fan_out, args.response_size, args.tool_latency)
+    tracer = InMemoryTracer() if args.trace else None
+    model = build_model(provider, args, tracer)
+    install_fake_client(model, config)
+
+    mcp_client = MCPClient(model)
+    mcp_client.client = Client(build_server(config))
+    model.client = mcp_client.client
+
+    async with mcp_client.client:
+        await mcp_client.init()
+        manager = SessionManager(mcp_client)
+        summaries = 0
+
+        def count_summaries(create_summary):
+            async def counted(messages):
+                nonlocal summaries
+                summaries += 1
+                return await create_summary(messages)
+            return counted
+
+        session_ids = []
+        for _ in range(args.sessions):
+            session_id = manager.create_session()
+            session = manager.get_session(session_id)
+            session.create_summary = count_summaries(session.create_summary)
+            prefill(session, history, args.response_size)
+            session_ids.append(session_id)
+
+        latencies = []
+
+        async def drive(session_id):
+            for turn in range(args.turns):
+                start = time.perf_counter()
+                await manager.process_query(session_id, f"{QUERY_MARKER} {turn}")
+                latencies.append(time.perf_counter() - start)
+
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        await asyncio.gather(*(drive(session_id) for session_id in session_ids))
+        elapsed = time.perf_counter() - start
+        peak = None
+        if trace_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    turns = len(latencies)
+    result = {
+        "turns": turns,
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+        "p90_ms": round(percentile(latencies, 0.9) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2),
+        "throughput_turns_per_s": round(turns / elapsed, 2),
+        "model_requests": config.requests,
+        "payload_kb_per_request": round(config.payload_chars / 1024 / max(1, config.requests), 2),
+        "summaries": summaries,
+        "summaries_per_turn": round(summaries / turns, 4),
+        "peak_memory_kb": None if peak is None else round(peak / 1024, 1),
+    }
+    if tracer is not None:
+        result["spans"] = {
+            name: {"count": entry["count"], "total_ms": round(entry["total"] * 1000, 2)}
+            for name, entry in tracer.summary().items()
+        }
+    return result
+
+
+def parse_list(value, cast=str):
+    return [cast(item) for item in value.split(",") if item]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--providers", default="openai,anthropic,gemini", help="comma separated provider formats")
+    parser.add_argument("--history", default="0,100,400", help="comma separated numbers of messages already in the history")
+    parser.add_argument("--turns", type=int, default=20, help="queries per session")
+    parser.add_argument("--sessions", type=int, default=4, help="concurrent sessions sharing the MCP connection")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per fake model request")
+    parser.add_argument("--tool-latency", type=float, default=0.01, help="seconds per tool call")
+    parser.add_argument("--fan-out", type=int, default=3, help="tool calls requested by the model per query")
+    parser.add_argument("--response-size", type=int, default=500, help="characters of answers and tool results")
+    parser.add_argument("--max-tokens", type=int, default=8000, help="history size that triggers summarization")
+    parser.add_argument("--summarizer-max-tokens", type=int, default=256)
+    parser.add_argument("--soft-threshold", type=float, default=None, help="background summarization threshold (fraction of max tokens)")
+    parser.add_argument("--max-concurrent-tools", type=int, default=8)
+    parser.add_argument("--prompt-caching", action="store_true", help="enable provider prompt caching")
+    parser.add_argument("--trace", action="store_true", help="collect spans and report the time spent per span name")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass that measures peak memory")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = {
+        "python": sys.version.split()[0],
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "scenarios": {}
+    }
+    for provider in parse_list(args.providers):
+        for history in parse_list(args.history, int):
+            result = asyncio.run(run_scenario(provider, history, args))
+            if not args.no_memory:
+                # Separate pass: tracing allocations slows every turn down
+                traced = asyncio.run(run_scenario(provider, history, args, trace_memory=True))
+                result["peak_memory_kb"] = traced["peak_memory_kb"]
+            report["scenarios"][f"{provider}/history={history}"] = result
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+In-process stand-ins used by the end-to-end benchmark: fake provider SDK
+clients that answer like OpenAI, Anthropic and Gemini after a configurable
+latency, and a fastmcp server with a tool of configurable latency and
+response size.
+
+A fake model answers a benchmark query with fan_out tool calls and, once
+the tool results are in the history, with a final text of response_size
+characters. Requests without tools are summarization requests and get a
+short summary.
+"""
+from types import SimpleNamespace
+import asyncio
+import itertools
+import json
+
+QUERY_MARKER = "benchmark query"
+SUMMARY_TEXT = "Summary of the benchmark conversation so far."
+
+
+def message_text(message):
+    if isinstance(message, dict):
+        return str(message.get("content"))
+    parts = getattr(message, "parts", None)
+    if parts is not None:
+        return "".join(getattr(part, "text", None) or "" for part in parts)
+    return str(message)
+
+
+class FakeConfig:
+    def __init__(self, latency: float = 0.05, fan_out: int = 2, response_size: int = 500, tool_latency: float = 0.01):
+        self.latency = latency
+        self.fan_out = fan_out
+        self.response_size = response_size
+        self.tool_latency = tool_latency
+        self.requests = 0
+        self.payload_chars = 0
+        self.ids = itertools.count()
+
+    def answer_text(self):
+        return ("lorem ipsum " * (self.response_size // 12 + 1))[:self.response_size]
+
+    def wants_tools(self, last_message):
+        # Tool results never contain the marker, so the model stops after one round
+        return self.fan_out > 0 and QUERY_MARKER in message_text(last_message)
+
+    def tool_calls(self):
+        return [(f"call_{next(self.ids)}", "lookup", {"key": f"key-{index}"}) for index in range(self.fan_out)]
+
+    async def wait(self, payload=None):
+        self.requests += 1
+        if payload is not None:
+            self.payload_chars += len(json.dumps(payload, default=message_text))
+        await asyncio.sleep(self.latency)
+
+
+class FakeOpenAI:
+    """Replaces AsyncOpenAI: only chat.completions.create is used by OpenAIModel"""
+
+    def __init__(self, config: FakeConfig):
+        self.config = config
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, messages=None, tools=None, **kwargs):
+        await self.config.wait(messages)
+        if not tools:
+            message = SimpleNamespace(content=SUMMARY_TEXT, tool_calls=None)
+            finish_reason = "stop"
+        elif self.config.wants_tools(messages[-1]):
+            message = SimpleNamespace(content=None, tool_calls=[
+                SimpleNamespace(id=call_id, type="function", function=SimpleNamespace(name=name, arguments=json.dumps(args)))
+                for call_id, name, args in self.config.tool_calls()
+            ])
+            finish_reason = "tool_calls"
+        else:
+            message = SimpleNamespace(content=self.config.answer_text(), tool_calls=None)
+            finish_reason = "stop"
+        return SimpleNamespace(choices=[SimpleNamespace(finish_reason=finish_reason, message=message)])
+
+
+class FakeOpenAIResponses:
+    """Replaces AsyncOpenAI for OpenAIResponsesModel: only responses.create is used"""
+
+    def __init__(self, config: FakeConfig):
+        self.config = config
+        self.responses = SimpleNamespace(create=self.create)
+        self.ids = itertools.count()
+
+    def message(self, text):
+        content = SimpleNamespace(type="output_text", text=text)
+        return SimpleNamespace(type="message", content=[content])
+
+    async def create(self, input=None, tools=None, **kwargs):
+        await self.config.wait(input)
+        response_id = f"resp_{next(self.ids)}"
+        if not tools:
+            output = [self.message(SUMMARY_TEXT)]
+        elif input and self.config.wants_tools(input[-1]):
+            output = [
+                SimpleNamespace(type="function_call", call_id=call_id, name=name, arguments=json.dumps(args))
+                for call_id, name, args in self.config.tool_calls()
+            ]
+        else:
+            output = [self.message(self.config.answer_text())]
+        return SimpleNamespace(id=response_id, output=output, usage=None)
+
+
+class FakeAnthropic:
+    """Replaces AsyncAnthropic: only messages.create is used by AnthropicModel"""
+
+    def __init__(self, config: FakeConfig):
+        self.config = config
+        self.messages = SimpleNamespace(create=self.create)
+
+    async def create(self, messages=None, tools=None, **kwargs):
+        await self.config.wait(messages)
+        if not tools:
+            return SimpleNamespace(content=[SimpleNamespace(type="text", text=SUMMARY_TEXT)])
+        if self.config.wants_tools(messages[-1]):
+            return SimpleNamespace(content=[
+                SimpleNamespace(type="tool_use", id=call_id, name=name, input=args)
+                for call_id, name, args in self.config.tool_calls()
+            ])
+        return SimpleNamespace(content=[SimpleNamespace(type="text", text=self.config.answer_text())])
+
+
+class FakeGemini:
+    """Replaces the google-genai Client: GeminiModel uses aio.models.generate_content and aio.caches.create"""
+
+    def __init__(self, config: FakeConfig):
+        self.config = config
+        self.caches = itertools.count()
+        self.aio = SimpleNamespace(
+            models=SimpleNamespace(generate_content=self.generate_content),
+            caches=SimpleNamespace(create=self.create_cache)
+        )
+
+    async def create_cache(self, model=None, config=None):
+        await self.config.wait()
+        return SimpleNamespace(name=f"cachedContents/{next(self.caches)}")
+
+    async def generate_content(self, contents=None, config=None, **kwargs):
+        await self.config.wait(contents)
+        # With prompt caching the tools are in the cached content
+        if not getattr(config, "tools", None) and not getattr(config, "cached_content", None):
+            text = SUMMARY_TEXT
+        elif self.config.wants_tools(contents[-1]):
+            # Like Gemini, a turn with function calls ends with STOP
+            calls = [
+                SimpleNamespace(function_call=SimpleNamespace(id=call_id, name=name, args=args))
+                for call_id, name, args in self.config.tool_calls()
+            ]
+            candidate = SimpleNamespace(finish_reason="STOP", content=SimpleNamespace(parts=calls), text=None)
+            return SimpleNamespace(candidates=[candidate], text=None)
+        else:
+            text = self.config.answer_text()
+        candidate = SimpleNamespace(
+            finish_reason="STOP",
+            content=SimpleNamespace(parts=[SimpleNamespace(text=text)]),
+            text=text
+        )
+        return SimpleNamespace(candidates=[candidate], text=text)
+
+
+FAKE_CLIENTS = {
+    "openai": ("openai", FakeOpenAI),
+    "openai-responses": ("openai", FakeOpenAIResponses),
+    "anthropic": ("anthropic", FakeAnthropic),
+    "gemini": ("gemini", FakeGemini),
+}
+
+
+def install_fake_client(model, config: FakeConfig):
+    """Replace the provider SDK client of model with its fake"""
+    attribute, fake_class = FAKE_CLIENTS[model.format]
+    setattr(model, attribute, fake_class(config))
+
+
+def build_server(config: FakeConfig):
+    """fastmcp server with a single lookup tool, used through the in-memory transport"""
+    from fastmcp import FastMCP
+
+    server = FastMCP("benchmark")
+    payload = "x" * config.response_size
+
+    @server.tool
+    async def lookup(key: str) -> str:
+        """Return the value stored under key"""
+        await asyncio.sleep(config.tool_latency)
+        return payload
+
+    return server
@@ -0,0 +1,88 @@
+"""
+Measure the cold start cost of the library: every scenario runs in a fresh
+interpreter and reports how long its statements take and which heavy
+modules they loaded.
+
+    python -m benchmarks.import_time --repeat 5 --output import_time.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ["openai", "anthropic", "google.genai", "tiktoken", "fastmcp"]
+
+FACTORY = """
+from model_factory import ModelFactory
+factory = ModelFactory()
+{setter}
+factory.set_name("benchmark")
+factory.set_max_tokens(1024)
+factory.set_temperature(0)
+factory.set_prints(print, print, print)
+factory.set_summarizer_max_tokens(256)
+factory.set_summarizer_language("english")
+model = factory.build()
+"""
+
+SCENARIOS = {
+    "import model_factory": "import model_factory",
+    "import mcp_client": "import mcp_client",
+    "build openai": FACTORY.format(setter='factory.set_openai_api_key("key")'),
+    "build anthropic": FACTORY.format(setter='factory.set_anthropic_api_key("key")'),
+    "build gemini": FACTORY.format(setter='factory.set_gemini_api_key("key")'),
+    "first token count": FACTORY.format(setter='factory.set_openai_api_key("key")') + "model.count_message_tokens({'role': 'user', 'content': 'hello'})",
+}
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+exec(compile({code!r}, "<scenario>", "exec"))
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def run_scenario(code):
+    probe = PROBE.format(code=code, heavy=HEAVY_MODULES)
+    completed = subprocess.run([sys.executable, "-c", probe], cwd=ROOT, capture_output=True, text=True)
+    if completed.returncode != 0:
+        return {"error": completed.stderr.strip().splitlines()[-1]}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per scenario")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = {"python": sys.version.split()[0], "repeat": args.repeat, "scenarios": {}}
+    for name, code in SCENARIOS.items():
+        runs = [run_scenario(code) for _ in range(args.repeat)]
+        errors = [run["error"] for run in runs if "error" in run]
+        if errors:
+            report["scenarios"][name] = {"error": errors[0]}
+            continue
+        seconds = [run["seconds"] for run in runs]
+        report["scenarios"][name] = {
+            "median_ms": round(statistics.median(seconds) * 1000, 2),
+            "min_ms": round(min(seconds) * 1000, 2),
+            "max_ms": round(max(seconds) * 1000, 2),
+            "loaded": runs[-1]["loaded"],
+        }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+from model import Model
+from utils import normalize_args
+
+import asyncio
+import copy
+import logging
+
+def retrieve_result(task):
+    # The requests that lost the race are cancelled or fail unobserved
+    if not task.cancelled():
+        task.exception()
+
+class CompositeModel(Model):
+    """
+    Model that sends each request to several provider models (members),
+    in order of preference. When the first member has not answered within
+    hedge_delay seconds, the request is sent to the next one as well and
+    the first answer wins; when a member fails (open circuit, exhausted
+    quota, exhausted retries) the next one is tried at once. The history
+    is kept in the chat completions format and translated into the format
+    of each member with from_chat_messages(), incrementally while the
+    history is only appended to.
+    """
+
+    def __init__(self, members, hedge_delay: float = None, **kwargs):
+        self.members = members
+        self.hedge_delay = hedge_delay
+        super().__init__(**kwargs)
+        for member in members:
+            # An exhausted quota is not retried on a member: the next one is tried
+            member.retry_policy = copy.copy(member.retry_policy)
+            member.retry_policy.retry_quota = False
+            # Only the composite prints the answer and runs the tools
+            member.stream = False
+            member.tool_output_store = None
+        self.synced = [(None, 0)] * len(members)
+        self.last_response = None
+        self.reset_messages()
+
+    @property
+    def selects_tools(self):
+        return all(member.selects_tools for member in self.members)
+
+    @property
+    def stores_tool_outputs(self):
+        return all(member.stores_tool_outputs for member in self.members)
+
+    @property
+    def aggregates_servers(self):
+        return all(member.aggregates_servers for member in self.members)
+
+    @property
+    def client(self):
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        # The members share the MCP client (Gemini passes its session as tools)
+        self._client = client
+        for member in self.members:
+            member.client = client
+
+    def init(self):
+        for member in self.members:
+            member.init()
+            member.set_system(self.system)
+
+    def reset_messages(self):
+        self.messages = [{
+            "role": "system",
+            "content": self.system
+        }]
+
+    def fork(self, **attributes):
+        # The members of the fork print through the prints given to it
+        prints = {key: value for key, value in attributes.items() if key in ("assistant_print", "system_print", "error_print")}
+        members = [member.fork(**prints) for member in self.members]
+        # client is a property, which __dict__.update in Model.fork would shadow
+        client = attributes.pop("client", self.client)
+        model = super().fork(**attributes)
+        model.members = members
+        model.client = client
+        model.synced = [(None, 0)] * len(members)
+        model.last_response = None
+        return model
+
+    def init_tools(self, tools):
+        super().init_tools(tools)
+        tools = self.add_builtin_tools(tools)
+        for member in self.members:
+            member.init_tools(tools)
+        # Tool schemas are counted as the preferred member sends them
+        self.set_tools(tools, self.members[0].available_tools)
+
+    def select_tools(self, names):
+        super().select_tools(names)
+        for member in self.members:
+            member.select_tools(names)
+        self.available_tools = self.members[0].available_tools
+
+    def set_system(self, system_prompt):
+        super().set_system(system_prompt)
+        self.messages[0] = {
+            "role": "system",
+            "content": system_prompt
+        }
+        for member in self.members:
+            member.set_system(system_prompt)
+
+    def sync_member(self, index):
+        """Bring the history of the member at index up to date with self.messages"""
+        member = self.members[index]
+        history, count = self.synced[index]
+        if history is not self.messages or count > len(self.messages):
+            member.reset_messages()
+            count = self.history_start
+        if count < len(self.messages):
+            member.messages.extend(member.from_chat_messages(self.messages[count:]))
+        self.synced[index] = (self.messages, len(self.messages))
+
+    async def request_member(self, index):
+        self.sync_member(index)
+        response = await self.members[index].create_message()
+        if response is None:
+            return None
+        return index, response
+
+    async def create_message(self):
+        """
+        Chat completions assistant message of the first member that
+        answers, or None when every member exhausted its tries. When every
+        member failed with an error, the last error is raised.
+        """
+        with self.tracer.span("hedged_request", members=len(self.members)) as span:
+            waiting = list(range(len(self.members)))
+            pending = set()
+            hedges = 0
+            failovers = 0
+            error = None
+
+            def start_next():
+                task = asyncio.create_task(self.request_member(waiting.pop(0)))
+                task.add_done_callback(retrieve_result)
+                pending.add(task)
+
+            start_next()
+            try:
+                while pending:
+                    timeout = self.hedge_delay if waiting else None
+                    done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                    if not done:
+                        # The latency budget is spent: hedge on the next member
+                        hedges += 1
+                        start_next()
+                        continue
+                    for task in done:
+                        pending.discard(task)
+                        try:
+                            result = task.result()
+                        except Exception as e:
+                            logging.debug(f"A member of the composite model failed: {e}")
+                            error = e
+                            result = None
+                        if result is not None:
+                            index, response = result
+                            member = self.members[index]
+                            usage = member.get_usage(response)
+                            self.add_usage(usage)
+                            self.calibrate_token_counter(usage)
+                            self.last_response = (index, response)
+                            span.set(member=member.name, provider=member.format, hedges=hedges, failovers=failovers)
+                            return member.to_chat_message(response)
+                    if waiting and not pending:
+                        failovers += 1
+                        start_next()
+            finally:
+                for task in pending:
+                    task.cancel()
+            span.set(hedges=hedges, failovers=failovers, exhausted=error is None)
+            if error is not None:
+                raise error
+            return None
+
+    def accept_last_response(self):
+        """Let the member that produced the last answer know it is in the history"""
+        index, response = self.last_response
+        self.sync_member(index)
+        self.members[index].accept_response(response)
+
+    async def _process_query(self, query):
+        """Process a query with the members and the available tools"""
+        await self._examine_query(query)
+
+        tool_use_detected = True
+        # Interaction loop with the members
+        while tool_use_detected:
+            # Check if summarization is needed
+            next_message = [{
+                "role": "user",
+                "content": query
+            }]
+            await self.summarize_if_needed(next_message)
+            self.response = await self.create_message()
+            if self.response is None:
+                return
+
+            self.messages.append(self.response)
+            self.accept_last_response()
+            if self.response.get("content"):
+                self.assistant_print(self.response["content"])
+
+            tool_calls = self.response.get("tool_calls") or []
+            tool_use_detected = len(tool_calls) > 0
+            if tool_use_detected:
+                results = await self.call_tools([
+                    (tool_call["function"]["name"], normalize_args(tool_call["function"]["arguments"]))
+                    for tool_call in tool_calls
+                ])
+                # Tool messages must follow the order of the tool calls
+                for tool_call, result in zip(tool_calls, results):
+                    self.messages.append({
+                        "role": "tool",
+                        "tool_call_id": tool_call["id"],
+                        "name": tool_call["function"]["name"],
+                        "content": result.content[0].text
+                    })
+
+    async def create_summary(self, messages):
+        """Summary by the first member that manages to write one"""
+        error = None
+        for member in self.members:
+            try:
+                return await member.create_summary(messages)
+            except Exception as e:
+                logging.debug(f"A member of the composite model could not summarize: {e}")
+                error = e
+        raise error
+
+    def build_summarized_messages(self, summary, messages):
+        new_messages = [
+        {
+            "role": "system",
+            "content": self.system
+        },
+        {
+            "role": "system",
+            "content": summary
+        }]
+        new_messages.extend(messages)
+        return new_messages
@@ -0,0 +1,143 @@
+import json
+import logging
+import os
+import time
+
+def to_plain(value):
+    """
+    JSON-compatible copy of a message: SDK objects (Anthropic content
+    blocks, MCP contents, Gemini Content) are dumped to dicts.
+    """
+    if isinstance(value, dict):
+        return {key: to_plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_plain(item) for item in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if hasattr(value, "model_dump"):
+        return to_plain(value.model_dump(mode="json", exclude_none=True))
+    return str(value)
+
+def dumps(record):
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode() + b"\n"
+
+# Checkpoint lines start with this prefix, so resume finds the last one
+# without parsing the lines before it
+CHECKPOINT_PREFIX = b'{"c":'
+
+class Journal:
+    """
+    Append-only JSON lines journal of one conversation. Every message added
+    to the history is one line; a checkpoint line holds the whole history
+    after it was replaced (init, summary, set_messages). Resuming reads the
+    last checkpoint and the messages appended after it. Writes are buffered
+    and fsynced every sync_every records, every sync_interval seconds, and
+    at the end of every turn (sync()).
+    """
+
+    def __init__(self, path: str, sync_every: int = 64, sync_interval: float = 1.0, encode=to_plain):
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.encode = encode
+        self.file = None
+        self.pending = 0
+        self.last_sync = time.monotonic()
+
+    def open(self):
+        if self.file is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.file = open(self.path, "ab")
+        return self.file
+
+    def write(self, record):
+        self.open().write(dumps(record))
+        self.pending += 1
+        if self.pending >= self.sync_every or time.monotonic() - self.last_sync >= self.sync_interval:
+            self.sync()
+
+    def append(self, message, tokens: int):
+        self.write({"m": self.encode(message), "t": tokens})
+
+    def checkpoint(self, history, summarized: bool = False):
+        """Record that the history was replaced by history (a MessageHistory)"""
+        self.write({
+            "c": [self.encode(message) for message in history],
+            "t": list(history.token_counts),
+            "s": summarized
+        })
+
+    def sync(self):
+        """Write the buffered records and fsync them"""
+        if self.file is None or self.pending == 0:
+            return
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+    def load(self, compact: bool = True):
+        """
+        Return (messages, token_counts, summarized) of the journaled
+        history, as plain JSON values, or None when the journal is missing.
+        With compact, the lines before the last checkpoint are dropped from
+        the file.
+        """
+        self.close()
+        try:
+            with open(self.path, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            return None
+        lines = data.splitlines()
+
+        # The last checkpoint that parses: a torn one is skipped
+        start, checkpoint = 0, None
+        for index in range(len(lines) - 1, -1, -1):
+            if lines[index].startswith(CHECKPOINT_PREFIX):
+                try:
+                    checkpoint = json.loads(lines[index])
+                except ValueError:
+                    continue
+                start = index
+                break
+        messages, token_counts, summarized = [], [], False
+        if checkpoint is not None:
+            messages, token_counts, summarized = checkpoint["c"], checkpoint["t"], checkpoint["s"]
+        end = len(lines)
+        for index in range(start + (checkpoint is not None), len(lines)):
+            try:
+                record = json.loads(lines[index])
+            except ValueError:
+                # A line torn by a crash can only be the last one
+                logging.warning(f"Skipping a corrupted line of the journal {self.path}")
+                end = index
+                break
+            if "c" in record:
+                messages, token_counts, summarized = record["c"], record["t"], record["s"]
+            else:
+                messages.append(record["m"])
+                token_counts.append(record["t"])
+
+        # The torn tail (or a last line without its newline) is cut before
+        # anything is appended again, so the next record starts a new line
+        torn = end < len(lines) or (data and not data.endswith(b"\n"))
+        if torn or (compact and start > 0):
+            self.rewrite(lines[start if compact else 0:end])
+        return messages, token_counts, summarized
+
+    def rewrite(self, lines):
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(b"".join(line + b"\n" for line in lines))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self.path)
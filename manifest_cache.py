@@ -0,0 +1,39 @@
+from response_cache import hash_data
+
+import json
+import os
+import time
+
+class ManifestCache:
+    """
+    Tool and prompt lists of MCP servers on disk, keyed by server URL and
+    version fingerprint, so a restarted client can start without waiting
+    for the discovery. Entries older than max_age seconds are ignored.
+    """
+
+    def __init__(self, directory: str, max_age: float = None, clock=time.time):
+        self.directory = directory
+        self.max_age = max_age
+        self.clock = clock
+
+    def get_path(self, url: str, fingerprint):
+        return os.path.join(self.directory, f"{hash_data([url, fingerprint])}.json")
+
+    def load(self, url: str, fingerprint):
+        """Saved manifest ({"tools": [...], "prompts": [...]}) or None"""
+        try:
+            with open(self.get_path(url, fingerprint), encoding="utf-8") as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if self.max_age is not None and self.clock() - entry.get("saved_at", 0) > self.max_age:
+            return None
+        return entry["manifest"]
+
+    def save(self, url: str, fingerprint, manifest):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.get_path(url, fingerprint)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump({"url": url, "saved_at": self.clock(), "manifest": manifest}, file, ensure_ascii=False)
+        os.replace(temporary, path)
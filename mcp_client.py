@@ -1,13 +1,44 @@
 from fastmcp import Client
 from fastmcp.client.logging import LogMessage
+from multi_server_client import MultiServerClient, get_server_info
+from response_cache import to_data, to_record
+from tracing import NOOP_TRACER
+
+import asyncio
+import logging
+
+# Notifications sent by a server when one of its lists changed
+LIST_CHANGED = {
+    "notifications/tools/list_changed": "tools",
+    "notifications/prompts/list_changed": "prompts"
+}
 
 class MCPClient:
-    def __init__(self, model):
+    """
+    Connects a model to MCP servers: the one at model.url or, with
+    servers ({name: url}), every server of the dict through a
+    MultiServerClient, with namespaced tool names and at most
+    max_concurrent_calls tool calls per server.
+    """
+
+    def __init__(self, model, servers: dict = None, max_concurrent_calls: int = 8):
+        if servers and not model.aggregates_servers:
+            # Gemini calls the tools through the session of a single fastmcp Client
+            raise ValueError(f"Several MCP servers are not supported by the {model.format} format")
         self.client = None
         self.model = model
+        self.servers = servers
+        self.max_concurrent_calls = max_concurrent_calls
         self.assistant_print = model.assistant_print
         self.system_print = model.system_print
         self.error_print = model.error_print
+        self.manifest_cache = None
+        self.tools = None
+        self.prompts = None
+        self.base_system = None
+        self.refresh_task = None
+        # Forks of the model (the sessions of a SessionManager) that get the refreshed lists too
+        self.forks = []
 
 
     def get_client(self):
@@ -17,26 +48,149 @@ class MCPClient:
                     self.error_print(msg.data.get("msg"))
                 else:
                     self.system_print(msg.data.get("msg"))  
-            self.client = Client(self.model.url, log_handler=_log_handler)
+            if self.servers:
+                self.client = MultiServerClient({
+                    server: Client(url, log_handler=_log_handler, message_handler=self.handle_message)
+                    for server, url in self.servers.items()
+                }, self.max_concurrent_calls)
+            else:
+                self.client = Client(self.model.url, log_handler=_log_handler, message_handler=self.handle_message)
             self.model.client = self.client
         return self.client
 
+    def set_tool_cache(self, tool_cache):
+        """Share a ToolCache with the model; pass None to disable caching"""
+        self.model.tool_cache = tool_cache
+
+    def set_tracer(self, tracer):
+        """Share a Tracer with the model; pass None to stop tracing"""
+        self.model.tracer = tracer or NOOP_TRACER
+
+    def set_manifest_cache(self, manifest_cache):
+        """Start from the tools and prompts saved in a ManifestCache; pass None to always list them"""
+        self.manifest_cache = manifest_cache
+
+    def set_cassette(self, cassette):
+        """Record the session into a Cassette, or replay it without the server; pass None to stop"""
+        self.model.cassette = cassette
+
+    async def list(self, kind):
+        """list_tools() or list_prompts() of the server, recorded into or replayed from the model's cassette"""
+        cassette = self.model.cassette
+        with self.model.tracer.span(f"list_{kind}") as span:
+            if cassette is not None and cassette.replaying:
+                items = to_record(cassette.take(kind, kind))
+            else:
+                items = await getattr(self.get_client(), f"list_{kind}")()
+                if cassette is not None:
+                    cassette.record(kind, kind, to_data(items))
+            span.set(count=len(items))
+        return items
+
+    async def discover(self, kinds=("tools", "prompts")):
+        """Lists of the given kinds, requested concurrently"""
+        return dict(zip(kinds, await asyncio.gather(*(self.list(kind) for kind in kinds))))
+
+    def get_fingerprint(self):
+        """Name and version the server reported when the connection was initialized"""
+        return to_data(get_server_info(getattr(self.client, "initialize_result", None)))
+
+    def get_server_key(self):
+        """URL of the server, or the servers with their names when there are several"""
+        if self.servers:
+            return " ".join(f"{server}={url}" for server, url in sorted(self.servers.items()))
+        return self.model.url
+
+    def load_manifest(self):
+        cassette = self.model.cassette
+        if self.manifest_cache is None or (cassette is not None and cassette.replaying):
+            return None
+        manifest = self.manifest_cache.load(self.get_server_key(), self.get_fingerprint())
+        return to_record(manifest) if manifest is not None else None
+
+    def save_manifest(self):
+        if self.manifest_cache is not None:
+            manifest = {"tools": to_data(self.tools), "prompts": to_data(self.prompts)}
+            self.manifest_cache.save(self.get_server_key(), self.get_fingerprint(), manifest)
+
     async def init(self):
-        tools = await self.get_client().list_tools()
+        """
+        Discover the tools and prompts of the server. With a manifest
+        cache, the saved lists are used at once and revalidated in the
+        background.
+        """
+        manifest = self.load_manifest()
+        with self.model.tracer.span("discover", cached=manifest is not None):
+            if manifest is None:
+                manifest = await self.discover()
+                self.apply(manifest["tools"], manifest["prompts"])
+                self.save_manifest()
+            else:
+                self.apply(manifest["tools"], manifest["prompts"])
+                self.start_refresh()
+
+    def add_fork(self, model):
+        """Keep a fork of the model up to date with the lists of the server"""
+        self.forks.append(model)
+
+    def remove_fork(self, model):
+        self.forks.remove(model)
+
+    def apply(self, tools, prompts):
+        """Give the model and its forks the tools and add the prompts to the system prompt"""
+        self.tools = tools
+        self.prompts = prompts
         self.system_print("Available tools: " + ", ".join([tool.name for tool in tools]))
-        prompts = await self.get_client().list_prompts()
         self.system_print("Available prompts: " + ", ".join([prompt.name for prompt in prompts]))
 
-        self.model.init_tools(tools)
+        models = [self.model] + self.forks
+        for model in models:
+            model.init_tools(tools)
 
         self.available_prompts = [{
             "name": prompt.name,
             "description": prompt.description
         } for prompt in prompts]
 
+        # The commands are added to the system prompt the model started with
+        if self.base_system is None:
+            self.base_system = self.model.system
+        system = self.base_system
         if len(self.available_prompts)!=0:
             prompts = "\n".join([f"/{prompt['name']} - {prompt['description']}" for prompt in self.available_prompts])
-            self.model.set_system(self.model.system + "\nThe following commands are available: " + prompts)
+            system += "\nThe following commands are available: " + prompts
+        for model in models:
+            if system != model.system:
+                model.set_system(system)
+
+    def start_refresh(self, kinds=("tools", "prompts")):
+        """Revalidate the lists of the given kinds in the background, after any refresh already running"""
+        self.refresh_task = asyncio.create_task(self.refresh(kinds, self.refresh_task))
+        return self.refresh_task
+
+    async def refresh(self, kinds=("tools", "prompts"), previous=None):
+        """List the given kinds again and apply them when they changed; returns whether they did"""
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        try:
+            lists = await self.discover(kinds)
+        except Exception as e:
+            logging.warning(f"Could not refresh the lists of the MCP server: {e}")
+            return False
+        tools = lists.get("tools", self.tools)
+        prompts = lists.get("prompts", self.prompts)
+        changed = to_data(tools) != to_data(self.tools) or to_data(prompts) != to_data(self.prompts)
+        if changed:
+            self.apply(tools, prompts)
+            self.save_manifest()
+        return changed
+
+    async def handle_message(self, message):
+        """Refresh the list named by a list-changed notification of the server"""
+        method = getattr(getattr(message, "root", message), "method", None)
+        kind = LIST_CHANGED.get(method)
+        if kind is not None:
+            self.start_refresh((kind,))
 
     async def process_query(self, query):
         await self.model.process_query(query)
\ No newline at end of file
@@ -0,0 +1,106 @@
+class MessageHistory(list):
+    """
+    List of conversation messages that keeps the token count of every
+    message up to date, so the size of the whole history is known without
+    encoding it again. With a journal, appended messages are written to it
+    and any other change writes a checkpoint of the whole history.
+    token_counts restores the counts of messages (e.g. from a journal)
+    instead of counting them again. summarized marks a history that starts
+    with a running summary and is carried into its checkpoints.
+    """
+
+    def __init__(self, messages=(), count_tokens=None, journal=None, token_counts=None, summarized=False):
+        super().__init__()
+        self.summarized = summarized
+        self.count_tokens = count_tokens or (lambda message: 0)
+        self.journal = None
+        if token_counts is None:
+            self.token_counts = []
+            self.total_tokens = 0
+            self.extend(messages)
+        else:
+            super().extend(messages)
+            self.token_counts = list(token_counts)
+            self.total_tokens = sum(self.token_counts)
+        self.journal = journal
+
+    def _changed(self):
+        if self.journal is not None:
+            self.journal.checkpoint(self, self.summarized)
+
+    def __reduce__(self):
+        return (self.__class__, (list(self), self.count_tokens))
+
+    def _set_counts(self, index, counts):
+        old = self.token_counts[index]
+        self.token_counts[index] = counts
+        if isinstance(index, slice):
+            self.total_tokens += sum(counts) - sum(old)
+        else:
+            self.total_tokens += counts - old
+
+    def append(self, message):
+        tokens = self.count_tokens(message)
+        super().append(message)
+        self.token_counts.append(tokens)
+        self.total_tokens += tokens
+        if self.journal is not None:
+            self.journal.append(message, tokens)
+
+    def extend(self, messages):
+        for message in messages:
+            self.append(message)
+
+    def __iadd__(self, messages):
+        self.extend(messages)
+        return self
+
+    def insert(self, index, message):
+        tokens = self.count_tokens(message)
+        super().insert(index, message)
+        self.token_counts.insert(index, tokens)
+        self.total_tokens += tokens
+        self._changed()
+
+    def __setitem__(self, index, message):
+        if isinstance(index, slice):
+            message = list(message)
+            counts = [self.count_tokens(item) for item in message]
+        else:
+            counts = self.count_tokens(message)
+        super().__setitem__(index, message)
+        self._set_counts(index, counts)
+        self._changed()
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        removed = self.token_counts[index]
+        del self.token_counts[index]
+        self.total_tokens -= sum(removed) if isinstance(index, slice) else removed
+        self._changed()
+
+    def pop(self, index=-1):
+        message = super().pop(index)
+        self.total_tokens -= self.token_counts.pop(index)
+        self._changed()
+        return message
+
+    def remove(self, message):
+        del self[self.index(message)]
+
+    def clear(self):
+        super().clear()
+        self.token_counts.clear()
+        self.total_tokens = 0
+        self._changed()
+
+    # Operations that would reorder or duplicate messages are not needed by
+    # the models and would desynchronise token_counts
+    def __imul__(self, n):
+        raise TypeError("MessageHistory does not support in-place repetition")
+
+    def sort(self, *args, **kwargs):
+        raise TypeError("MessageHistory does not support sorting")
+
+    def reverse(self):
+        raise TypeError("MessageHistory does not support reversing")
@@ -1,10 +1,32 @@
+import asyncio
+import copy
 import logging
 from fastmcp import McpError
-import tiktoken
-TIKTOKEN = tiktoken.get_encoding("o200k_base")
+from message_history import MessageHistory
+from rate_limiter import get_credentials_key, get_rate_limiter
+from response_cache import hash_data, to_data, to_record
+from retry import CircuitOpenError, RetryPolicy, get_retry_after, get_status_code
+from token_counter import TokenCounter, get_role, render_message
+from tool_index import get_text
+from tracing import NOOP_TRACER
 
 class Model:
-    def __init__(self, format: str, max_tokens: int, temperature: float, name: str, url: str, api_key: str, system_prompt: str, max_tries: int, wait_seconds: int, summarizer_system_prompt: str, summarizer_user_prompt: str, summarizer_max_tokens: int, summarizer_temperature: float, assistant_print, system_print, error_print):
+    # Index of the first message that can be summarized (the providers that
+    # keep the system prompt inside the history start from 1)
+    history_start = 1
+    # False for the providers that send the system prompt apart from the history
+    system_in_history = True
+    token_counter_class = TokenCounter
+    # False for the providers that cannot be sent a subset of the tools
+    selects_tools = True
+    # False for the providers that cannot be sent the read_tool_output tool
+    stores_tool_outputs = True
+    # False for the providers that need the session of a single fastmcp Client
+    aggregates_servers = True
+    # Provider whose account the format bills, when it is not the format itself
+    provider = None
+
+    def __init__(self, format: str, max_tokens: int, temperature: float, name: str, url: str, api_key: str, system_prompt: str, max_tries: int, wait_seconds: int, summarizer_system_prompt: str, summarizer_user_prompt: str, summarizer_max_tokens: int, summarizer_temperature: float, assistant_print, system_print, error_print, stream: bool = False, max_concurrent_tools: int = 8, tool_cache=None, summarizer_soft_threshold: float = None, retry_policy: RetryPolicy = None, tracer=None, prompt_caching: bool = False, token_counter: TokenCounter = None, summarizer_keep_turns: int = 1, tool_output_store=None, rate_limits: dict = None, response_cache=None, cassette=None, tool_index=None):
         self.format = format
         self.max_tokens = max_tokens
         self.temperature = temperature
@@ -22,22 +44,375 @@ class Model:
         self.assistant_print = assistant_print
         self.system_print = system_print
         self.error_print = error_print
+        self.stream = stream
+        self.max_concurrent_tools = max_concurrent_tools
+        self.tool_cache = tool_cache
+        self.summarizer_soft_threshold = summarizer_soft_threshold
+        self.summarizer_keep_turns = summarizer_keep_turns
+        self.tool_output_store = tool_output_store
+        # Without an explicit policy, back off up to wait_seconds between tries
+        self.retry_policy = retry_policy or RetryPolicy(max_tries=max_tries, max_delay=wait_seconds)
+        self.tracer = tracer or NOOP_TRACER
+        # Models built from the same credentials share one limiter, whatever API of the provider they use
+        self.rate_limits = rate_limits
+        self.rate_limiter = get_rate_limiter(get_credentials_key(self.provider or format, url, api_key), **rate_limits) if rate_limits else None
+        self.response_cache = response_cache
+        self.cassette = cassette
+        self.tools_digest = (None, None)
+        if tool_index is not None and not self.selects_tools:
+            raise ValueError(f"Tool selection is not supported by the {format} format")
+        if tool_output_store is not None and not self.stores_tool_outputs:
+            raise ValueError(f"Tool output stores are not supported by the {format} format")
+        self.tool_index = tool_index
+        self.all_tools = None
+        self.tool_entries = []
+        self.selected_tools = None
+        self.prompt_caching = prompt_caching
+        self.token_usage = {}
+        self.token_counter = token_counter or self.token_counter_class()
+        self.fixed_tokens = (None, None, 0)
+        self.summary_task = None
+        self.summary_snapshot = None
+        self.summarized_history = None
+        self.journal = None
         self.client = None
         self.response = None
+        self.response_streamed = False
         self.available_tools = None
         self.available_prompts = None
     
+    @property
+    def messages(self):
+        return self._messages
+
+    @messages.setter
+    def messages(self, messages):
+        self.replace_history(messages)
+
+    def replace_history(self, messages, summarized: bool = False):
+        """
+        Every replacement (init, summarize, set_messages) gets token
+        accounting and, with a journal, a checkpoint.
+        """
+        history = MessageHistory(messages, self.count_message_tokens, journal=self.journal, summarized=summarized)
+        self._messages = history
+        if summarized:
+            self.summarized_history = history
+        if self.journal is not None:
+            self.journal.checkpoint(history, summarized)
+
+    def set_journal(self, journal):
+        """Journal the conversation from now on, starting from the current history"""
+        self.journal = journal
+        self.replace_history(self.messages, self.messages is self.summarized_history)
+
+    def resume(self, journal):
+        """
+        Restore the history saved in journal and keep journaling to it.
+        Messages and token counts are read back as they were written, so
+        nothing is counted or summarized again. Returns False when the
+        journal is empty.
+        """
+        state = journal.load()
+        if state is None:
+            return False
+        messages, token_counts, summarized = state
+        self.discard_background_summary()
+        self._messages = MessageHistory(
+            [self.decode_message(message) for message in messages],
+            self.count_message_tokens, journal=journal, token_counts=token_counts, summarized=summarized
+        )
+        self.summarized_history = self._messages if summarized else None
+        self.journal = journal
+        return True
+
+    def decode_message(self, message):
+        """Message of the history from its journaled JSON form"""
+        return message
+
+    def from_chat_messages(self, messages):
+        """
+        Messages of the history converted from the chat completions format
+        (role/content dicts, tool_calls and tool messages) used by
+        CompositeModel. The system prompt is never among them.
+        """
+        return list(messages)
+
+    def to_chat_message(self, response):
+        """Chat completions assistant message holding the text and the tool calls of response"""
+        pass
+
+    def accept_response(self, response):
+        """Called by CompositeModel once the message of response was added to the history"""
+        pass
+
     def init(self):
         pass
 
+    def reset_messages(self):
+        """Start an empty conversation"""
+        self.messages = []
+
+    def fork(self, **attributes):
+        """
+        Return a model with an empty conversation that shares the provider
+        SDK client, the MCP client, the tools and the caches of this one.
+        attributes overrides attributes of the copy (e.g. the prints).
+        """
+        model = copy.copy(self)
+        model.__dict__.update(attributes)
+        model.response = None
+        model.response_streamed = False
+        model.summary_task = None
+        model.summary_snapshot = None
+        model.summarized_history = None
+        model.journal = attributes.get("journal")
+        model.token_usage = {}
+        model.reset_messages()
+        return model
+
     def init_tools(self, tools):   
         pass
 
+    def add_builtin_tools(self, tools):
+        """MCP tools followed by the tools implemented by the model itself"""
+        if self.tool_output_store is None:
+            return list(tools)
+        return list(tools) + [self.tool_output_store.get_tool()]
+
+    def set_tools(self, tools, schemas):
+        """
+        Give the model the tools (MCP tools and built-in ones) with their
+        schemas in the format of the provider, in the same order. All of
+        them are sent until a tool index selects some.
+        """
+        self.tool_entries = list(tools)
+        self.all_tools = schemas
+        self.available_tools = schemas
+        self.selected_tools = None
+
+    def select_tools(self, names):
+        """Send only the tools in names from now on"""
+        names = set(names)
+        if names == self.selected_tools:
+            return
+        self.selected_tools = names
+        self.available_tools = [
+            schema for tool, schema in zip(self.tool_entries, self.all_tools) if tool.name in names
+        ]
+
+    def get_pinned_tools(self):
+        """Tools sent whatever the query: the pinned ones of the index and the built-in ones"""
+        pinned = list(self.tool_index.pinned)
+        if self.tool_output_store is not None:
+            pinned.append(self.tool_output_store.tool_name)
+        return pinned
+
+    async def choose_tools(self, query):
+        """Select the tools relevant to query with the tool index, when there is one"""
+        index = self.tool_index
+        if index is None or self.all_tools is None:
+            return
+        with self.tracer.span("select_tools") as span:
+            if index.names != [tool.name for tool in self.tool_entries]:
+                index.build(self.tool_entries)
+            text = query if isinstance(query, str) else " ".join(get_text(to_data(query)))
+            self.select_tools(self.get_pinned_tools() + await index.search(text))
+            span.set(count=len(self.available_tools), total=len(self.all_tools))
+
+    async def widen_tools(self, names):
+        """
+        Add the tools the model asked for to the selection. A name that is
+        not a tool adds the tools that match it best, so the model can
+        find the right one on the next step.
+        """
+        if self.selected_tools is None:
+            return
+        missing = [name for name in names if name not in self.selected_tools]
+        if not missing:
+            return
+        known = {tool.name for tool in self.tool_entries}
+        added = set()
+        for name in missing:
+            added.update([name] if name in known else await self.tool_index.search(name))
+        logging.debug(f"Tool selection widened with {sorted(added)}")
+        self.select_tools(self.selected_tools | added)
+
     def set_system(self, system_prompt: str):
         self.system = system_prompt
     
     def create_message(self):
         pass
+
+    def get_provider_key(self):
+        """Key of the circuit breaker shared by the models that use the same endpoint"""
+        return f"{self.format}:{self.url or ''}"
+
+    def get_request_key(self):
+        """Content address of the next request: model, sampling settings, tool schemas and history"""
+        tools, digest = self.tools_digest
+        if digest is None or tools is not self.available_tools:
+            digest = hash_data(to_data(self.available_tools))
+            self.tools_digest = (self.available_tools, digest)
+        return hash_data({
+            "format": self.format,
+            "model": self.name,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            "system": self.system,
+            "tools": digest,
+            "messages": to_data(self.messages)
+        })
+
+    def encode_response(self, response):
+        """JSON form of a response returned by request_message, for the response cache and the cassette"""
+        return to_data(response)
+
+    def decode_response(self, data):
+        """Response read by the provider loop from its encoded form"""
+        return to_record(data)
+
+    def lookup_response(self, key):
+        """
+        Encoded response stored for key and where it came from, or
+        (None, None). A replaying cassette never lets a request through.
+        """
+        cassette = self.cassette
+        if cassette is not None and cassette.replaying:
+            return cassette.take("response", key), "replayed"
+        if self.response_cache is not None:
+            data = self.response_cache.get(key)
+            if data is not None:
+                if cassette is not None:
+                    cassette.record("response", key, data)
+                return data, "cached"
+        return None, None
+
+    def store_response(self, key, response):
+        data = self.encode_response(response)
+        if self.cassette is not None:
+            self.cassette.record("response", key, data)
+        if self.response_cache is not None:
+            self.response_cache.put(key, data)
+
+    def print_request_error(self, error, delay):
+        """Report a failed request; delay is None when it will not be retried"""
+        if delay is None:
+            self.error_print(f"{error}")
+        else:
+            self.error_print(f"{error}; a new attempt will be made in {delay:.1f} seconds")
+
+    async def call_with_retry(self, request):
+        """
+        Await request() following self.retry_policy. Errors that cannot be
+        fixed by retrying are raised after being reported, and
+        CircuitOpenError is raised while the provider's circuit breaker is
+        open. Returns None when every attempt failed. With a response cache
+        or a cassette, a request already answered is not sent again.
+        """
+        policy = self.retry_policy
+        breaker = policy.get_circuit_breaker(self.get_provider_key())
+        limiter = self.rate_limiter
+        attempt = 0
+        retry_sleep = 0
+        rate_wait = 0
+        key = None
+        with self.tracer.span("create_message", provider=self.format, model=self.name) as span:
+            if self.response_cache is not None or self.cassette is not None:
+                key = self.get_request_key()
+                data, source = self.lookup_response(key)
+                if data is not None:
+                    span.set(**{source: True})
+                    return self.decode_response(data)
+            while attempt < policy.max_tries:
+                if not breaker.allow():
+                    self.error_print(f"The provider is not responding; requests are suspended for {breaker.remaining():.0f} seconds")
+                    raise CircuitOpenError(self.get_provider_key())
+                attempt += 1
+                if limiter is not None:
+                    # The whole context is counted against the input budget,
+                    # max_tokens against the output one until usage is known
+                    estimate = {"input_tokens": self.count_next_tokens([]), "output_tokens": self.max_tokens}
+                    rate_wait += await limiter.acquire(estimate)
+                try:
+                    response = await request()
+                except Exception as e:
+                    span.set(tries=attempt, retry_sleep=retry_sleep, rate_wait=rate_wait)
+                    if limiter is not None:
+                        limiter.refund(estimate)
+                        if get_status_code(e) == 429:
+                            # Hold back every model of these credentials, not only this one
+                            limiter.block(get_retry_after(e) or policy.get_delay(attempt, e))
+                    if not policy.is_retryable(e):
+                        self.print_request_error(e, None)
+                        raise
+                    breaker.record_failure()
+                    delay = policy.get_delay(attempt, e)
+                    self.print_request_error(e, delay if attempt < policy.max_tries else None)
+                    if attempt < policy.max_tries:
+                        retry_sleep += delay
+                        await asyncio.sleep(delay)
+                else:
+                    breaker.record_success()
+                    if key is not None:
+                        self.store_response(key, response)
+                    usage = self.get_usage(response)
+                    if limiter is not None:
+                        limiter.settle(estimate, usage)
+                    self.add_usage(usage)
+                    self.calibrate_token_counter(usage)
+                    span.set(tries=attempt, retry_sleep=retry_sleep, rate_wait=rate_wait, **usage)
+                    return response
+            self.error_print("Maximum number of attempts reached, please try again later")
+            span.set(tries=attempt, retry_sleep=retry_sleep, rate_wait=rate_wait, exhausted=True)
+            return None
+
+    def get_usage(self, response):
+        """
+        Input and output tokens reported by the provider for response, as
+        {"input_tokens": ..., "output_tokens": ...}, plus cache_read_tokens
+        and cache_write_tokens when the provider reports prompt caching;
+        empty when unknown.
+        """
+        usage = getattr(response, "usage", None) or getattr(response, "usage_metadata", None)
+        if usage is None:
+            return {}
+        # openai: prompt/completion, anthropic: input/output, gemini: *_token_count
+        for input_name, output_name in (
+            ("input_tokens", "output_tokens"),
+            ("prompt_tokens", "completion_tokens"),
+            ("prompt_token_count", "candidates_token_count"),
+        ):
+            input_tokens = getattr(usage, input_name, None)
+            if isinstance(input_tokens, int):
+                output_tokens = getattr(usage, output_name, None)
+                result = {
+                    "input_tokens": input_tokens,
+                    "output_tokens": output_tokens if isinstance(output_tokens, int) else None
+                }
+                break
+        else:
+            return {}
+        # anthropic reports cache reads and writes, openai and gemini only reads
+        for cache_read in (
+            getattr(usage, "cache_read_input_tokens", None),
+            getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None),
+            getattr(getattr(usage, "input_tokens_details", None), "cached_tokens", None),
+            getattr(usage, "cached_content_token_count", None),
+        ):
+            if isinstance(cache_read, int):
+                result["cache_read_tokens"] = cache_read
+                break
+        cache_write = getattr(usage, "cache_creation_input_tokens", None)
+        if isinstance(cache_write, int):
+            result["cache_write_tokens"] = cache_write
+        return result
+
+    def add_usage(self, usage):
+        """Add the usage of one request to the totals in self.token_usage"""
+        for key, value in usage.items():
+            if value is not None:
+                self.token_usage[key] = self.token_usage.get(key, 0) + value
     
     def get_user_message(self, query: str):
         return self.get_role_message("user", query)
@@ -45,25 +420,85 @@ class Model:
     def get_role_message(self, role: str, content: str):
         return {"role": role, "content": content}
     
-    def check_summarize_needed(self, next_message):
+    def is_summarizer_configured(self):
         # Summarization must be explicitly configured
-        if (
+        return not (
             self.summarizer_max_tokens is None
             or self.summarizer_system_prompt is None
             or self.summarizer_user_prompt is None
-        ):
-            return False
+        )
 
+    def count_fixed_tokens(self):
+        """
+        Raw tokens sent with every request besides the history: the tool
+        schemas and, when it is not part of the history, the system prompt.
+        """
+        tools, system, tokens = self.fixed_tokens
+        if tools is not self.available_tools or system != self.system:
+            tokens = self.token_counter.count_tools(self.available_tools)
+            if not self.system_in_history:
+                tokens += self.token_counter.count_text(self.system)
+            self.fixed_tokens = (self.available_tools, self.system, tokens)
+        return tokens
+
+    def count_raw_tokens(self):
         try:
-            messages_snapshot = list(self.get_messages()) + next_message
-        except Exception:
-            messages_snapshot = next_message
-        if len(TIKTOKEN.encode(str(messages_snapshot))) >= self.max_tokens:
+            history = self.messages.total_tokens
+        except AttributeError:
+            history = 0
+        return history + self.count_fixed_tokens()
+
+    def count_next_tokens(self, next_message):
+        """Calibrated tokens of the next request: history, tools and next_message"""
+        raw = self.count_raw_tokens() + sum(self.count_message_tokens(message) for message in next_message)
+        return self.token_counter.scale(raw)
+
+    def calibrate_token_counter(self, usage):
+        """Compare the estimate of the request just sent with the prompt tokens reported for it"""
+        reported = self.token_counter.get_prompt_tokens(usage)
+        if reported:
+            self.token_counter.calibrate(self.count_raw_tokens(), reported)
+
+    def check_summarize_needed(self, next_message):
+        if not self.is_summarizer_configured():
+            return False
+
+        with self.tracer.span("check_summarize_needed") as span:
+            tokens = self.count_next_tokens(next_message)
+            span.set(tokens=tokens, max_tokens=self.max_tokens, needed=tokens >= self.max_tokens)
+        if tokens >= self.max_tokens:
             logging.debug("A summary is needed")
             return True
         return False
 
+    def check_background_summarize_needed(self, next_message):
+        """True when the soft threshold is crossed and no summary is being prepared"""
+        if (
+            self.summarizer_soft_threshold is None
+            or self.summary_task is not None
+            or not self.is_summarizer_configured()
+            or self.get_summary_cut() is None
+        ):
+            return False
+
+        if self.count_next_tokens(next_message) >= self.max_tokens * self.summarizer_soft_threshold:
+            logging.debug("A background summary can be prepared")
+            return True
+        return False
+
+    def count_message_tokens(self, message):
+        """Raw tokens of one message; MessageHistory keeps these per message"""
+        return self.token_counter.count_message(message)
+
+    def get_token_count(self):
+        """Calibrated tokens of the current history, kept up to date by MessageHistory"""
+        try:
+            return self.token_counter.scale(self.messages.total_tokens)
+        except AttributeError:
+            return 0
+
     async def _examine_query(self, query):
+        await self.choose_tools(query)
         message = self.get_user_message(query)
         if isinstance(query, str) and query[:1] == "/":
             try:
@@ -73,17 +508,204 @@ class Model:
                         self.messages.append(self.get_role_message(prompt_message.role, prompt_message.content.text))
                 else:
                     self.messages.append(message)
-            except McpError:
+            except (McpError, LookupError):
+                # Not a prompt of the server (or of any server of a MultiServerClient)
                 self.messages.append(message)
         else:
             self.messages.append(message)
     
+    async def call_tool(self, tool_name, tool_args):
+        with self.tracer.span("call_tool", tool=tool_name) as span:
+            store = self.tool_output_store
+            if store is not None and tool_name == store.tool_name:
+                return store.call(tool_args)
+            result = await self.call_recorded_tool(tool_name, tool_args, span)
+            if store is not None:
+                spilled = store.spill(result)
+                span.set(spilled=spilled is not result)
+                result = spilled
+            return result
+
+    async def call_recorded_tool(self, tool_name, tool_args, span):
+        """call_mcp_tool(), recorded into or replayed from the cassette when there is one"""
+        cassette = self.cassette
+        if cassette is None:
+            return await self.call_mcp_tool(tool_name, tool_args, span)
+        key = cassette.make_tool_key(tool_name, tool_args)
+        if cassette.replaying:
+            span.set(replayed=True)
+            return to_record(cassette.take("tool", key))
+        result = await self.call_mcp_tool(tool_name, tool_args, span)
+        cassette.record("tool", key, to_data(result))
+        return result
+
+    async def call_mcp_tool(self, tool_name, tool_args, span):
+        if self.tool_cache is None:
+            return await self.client.call_tool(tool_name, tool_args)
+        called = False
+
+        async def call_client(name, args):
+            nonlocal called
+            called = True
+            return await self.client.call_tool(name, args)
+
+        result = await self.tool_cache.call(tool_name, tool_args, call_client)
+        span.set(cached=not called)
+        return result
+
+    async def call_tools(self, tool_calls):
+        """
+        Run the (tool_name, tool_args) pairs of one model turn concurrently,
+        at most max_concurrent_tools at a time, and return the results in
+        the same order as the calls.
+        """
+        with self.tracer.span("call_tools", count=len(tool_calls)):
+            await self.widen_tools([name for name, _ in tool_calls])
+            if not self.max_concurrent_tools:
+                return await asyncio.gather(*(self.call_tool(name, args) for name, args in tool_calls))
+
+            semaphore = asyncio.Semaphore(self.max_concurrent_tools)
+
+            async def limited_call(tool_name, tool_args):
+                async with semaphore:
+                    return await self.call_tool(tool_name, tool_args)
+
+            return await asyncio.gather(*(limited_call(name, args) for name, args in tool_calls))
+
     async def process_query(self, query):
+        with self.tracer.span("process_query", provider=self.format, model=self.name) as span:
+            await self._process_query(query)
+            span.set(tokens=self.get_token_count(), messages=len(self.messages))
+        if self.journal is not None:
+            self.journal.sync()
+
+    async def _process_query(self, query):
+        """Provider interaction loop of process_query"""
         pass
 
-    async def summarize(self):
+    async def create_summary(self, messages):
+        """Ask the model for a summary of messages and return its text"""
+        pass
+
+    def get_summarizer_prompt(self, messages):
+        """User prompt of the summarizer: the instructions followed by the rendered messages"""
+        return self.summarizer_user_prompt + "\n".join(
+            f"{get_role(message)}: {render_message(message)}" for message in messages
+        )
+
+    def is_tool_result(self, message):
+        """True for the messages that answer the tool calls of the previous one"""
+        return get_role(message) == "tool"
+
+    def is_turn_start(self, message):
+        return get_role(message) == "user" and not self.is_tool_result(message)
+
+    def get_summary_cut(self):
+        """
+        Index of the first message kept verbatim by a summary: the start of
+        the last summarizer_keep_turns turns, or of as many as there are
+        after the first one. When the current turn is the only one (a long
+        tool loop), the cut falls on its last model message, so tool calls
+        are never separated from their results. Returns None when nothing
+        but the running summary would be summarized.
+        """
+        first = self.history_start
+        # The running summary is folded again together with the new messages
+        if self.messages is self.summarized_history:
+            first += 1
+        starts = [
+            index for index in range(first + 1, len(self.messages))
+            if self.is_turn_start(self.messages[index])
+        ]
+        if starts:
+            # Fewer turns than summarizer_keep_turns are all kept whole
+            return starts[-min(len(starts), self.summarizer_keep_turns)]
+        for index in range(len(self.messages) - 1, first, -1):
+            if not self.is_tool_result(self.messages[index]):
+                return index
+        return None
+
+    def build_summarized_messages(self, summary, messages):
+        """Return the new history made of the summary followed by messages"""
         pass
 
+    async def summarize(self):
+        logging.debug("Started summarization")
+        self.discard_background_summary()
+        cut = self.get_summary_cut()
+        if cut is None:
+            logging.debug("Nothing to summarize")
+            return
+        with self.tracer.span("summarize", tokens_before=self.get_token_count()) as span:
+            summary = await self.create_summary(self.messages[self.history_start:cut])
+            logging.debug(f"Summary produced:{summary}")
+            self.replace_history(self.build_summarized_messages(summary, self.messages[cut:]), summarized=True)
+            span.set(tokens_after=self.get_token_count())
+        logging.debug("Finished summarization")
+
+    async def _background_summary(self, messages):
+        with self.tracer.span("background_summary", messages=len(messages)) as span:
+            try:
+                return await self.create_summary(messages)
+            except Exception as e:
+                logging.debug(f"Background summarization failed: {e}")
+                span.set(error=type(e).__name__)
+                return None
+
+    def start_background_summary(self):
+        """
+        Summarize a snapshot of the history in a background task. The turns
+        kept by summarize() are left out of the snapshot.
+        """
+        cut = self.get_summary_cut()
+        self.summary_snapshot = (self.messages, cut)
+        self.summary_task = asyncio.create_task(
+            self._background_summary(self.messages[self.history_start:cut])
+        )
+        logging.debug("Started background summarization")
+
+    def discard_background_summary(self):
+        if self.summary_task is not None:
+            self.summary_task.cancel()
+        self.summary_task = None
+        self.summary_snapshot = None
+
+    async def apply_background_summary(self):
+        """
+        Wait for the background summary and swap it into the history. The
+        messages added after the snapshot are kept after the summary.
+        Returns False when the summary cannot be used.
+        """
+        task = self.summary_task
+        messages, cut = self.summary_snapshot
+        self.summary_task = None
+        self.summary_snapshot = None
+        summary = await task
+        # The history was replaced (set_messages, another summary) meanwhile
+        if summary is None or self.messages is not messages:
+            return False
+        logging.debug(f"Summary produced:{summary}")
+        self.replace_history(self.build_summarized_messages(summary, self.messages[cut:]), summarized=True)
+        logging.debug("Applied background summary")
+        return True
+
+    async def summarize_if_needed(self, next_message):
+        """
+        Summarize before sending next_message when the hard threshold is
+        reached, using the background summary when one was prepared, and
+        start a background summary when the soft threshold is crossed.
+        """
+        if self.check_summarize_needed(next_message):
+            if (
+                self.summary_task is not None
+                and await self.apply_background_summary()
+                and not self.check_summarize_needed(next_message)
+            ):
+                return
+            await self.summarize()
+        elif self.check_background_summarize_needed(next_message):
+            self.start_background_summary()
+
     def get_messages(self):
         for msg in self.messages:
             yield msg
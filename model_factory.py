@@ -1,6 +1,18 @@
-from models.openai import OpenAIModel
-from models.gemini import GeminiModel
-from models.anthropic import AnthropicModel
+import importlib
+
+# Provider modules are imported only when a model of that format is built,
+# so a process never pays for the SDKs it does not use
+PROVIDERS = {
+    "openai": ("models.openai", "OpenAIModel"),
+    "openai-responses": ("models.openai_responses", "OpenAIResponsesModel"),
+    "gemini": ("models.gemini", "GeminiModel"),
+    "anthropic": ("models.anthropic", "AnthropicModel"),
+    "composite": ("composite_model", "CompositeModel"),
+}
+
+def load_model_class(format: str):
+    module_name, class_name = PROVIDERS[format]
+    return getattr(importlib.import_module(module_name), class_name)
 
 class ModelFactory:
     def __init__(self):
@@ -17,9 +29,26 @@ class ModelFactory:
         self.summarizer_user_prompt = None
         self.summarizer_max_tokens = None
         self.summarizer_temperature = 0.3
+        self.summarizer_soft_threshold = None
+        self.summarizer_keep_turns = 1
+        self.tool_output_store = None
+        self.retry_policy = None
+        self.tracer = None
+        self.prompt_caching = False
+        self.openai_responses = False
+        self.token_counter = None
         self.assistant_print = None
         self.system_print = None
         self.error_print = None
+        self.stream = False
+        self.max_concurrent_tools = 8
+        self.tool_cache = None
+        self.fallbacks = []
+        self.hedge_delay = None
+        self.rate_limits = None
+        self.response_cache = None
+        self.cassette = None
+        self.tool_index = None
     
     def set_openai_api_key(self, api_key: str):
         self.format = "openai"
@@ -60,9 +89,40 @@ class ModelFactory:
         self.system_print = system_print
         self.error_print = error_print
     
+    def set_stream(self, stream: bool):
+        self.stream = stream
+    
+    def set_max_concurrent_tools(self, max_concurrent_tools: int):
+        self.max_concurrent_tools = max_concurrent_tools
+    
+    def set_tool_cache(self, tool_cache):
+        self.tool_cache = tool_cache
+
+    def set_tool_output_store(self, tool_output_store):
+        self.tool_output_store = tool_output_store
+
+    def set_response_cache(self, response_cache):
+        self.response_cache = response_cache
+
+    def set_cassette(self, cassette):
+        self.cassette = cassette
+    
+    def set_tool_index(self, tool_index):
+        self.tool_index = tool_index
+
     def set_summarizer_max_tokens(self, max_tokens: int):
         self.summarizer_max_tokens = max_tokens
 
+    def set_summarizer_soft_threshold(self, soft_threshold: float):
+        if soft_threshold is not None and not 0 < soft_threshold < 1:
+            raise ValueError("The summarizer soft threshold must be between 0 and 1")
+        self.summarizer_soft_threshold = soft_threshold
+
+    def set_summarizer_keep_turns(self, keep_turns: int):
+        if keep_turns < 1:
+            raise ValueError("The summarizer must keep at least one turn")
+        self.summarizer_keep_turns = keep_turns
+
     def set_summarizer_language(self, language: str):
         if self.summarizer_max_tokens is None:
             raise ValueError("You must call set_summarizer_max_tokens before setting the language")
@@ -81,8 +141,42 @@ class ModelFactory:
     def set_wait_seconds(self, wait_seconds: int):
         self.wait_seconds = wait_seconds
     
+    def set_retry_policy(self, retry_policy):
+        self.retry_policy = retry_policy
+    
+    def set_tracer(self, tracer):
+        self.tracer = tracer
+    
+    def set_prompt_caching(self, prompt_caching: bool):
+        self.prompt_caching = prompt_caching
+    
+    def set_openai_responses(self, openai_responses: bool):
+        self.openai_responses = openai_responses
+    
+    def set_token_counter(self, token_counter):
+        self.token_counter = token_counter
+    
     def set_system_prompt(self, system_prompt: str):
         self.system_prompt = system_prompt
+
+    def set_fallbacks(self, fallbacks):
+        self.fallbacks = list(fallbacks)
+
+    def set_hedge_delay(self, hedge_delay: float):
+        if hedge_delay is not None and hedge_delay < 0:
+            raise ValueError("The hedge delay cannot be negative")
+        self.hedge_delay = hedge_delay
+
+    def set_rate_limits(self, requests_per_minute: int = None, input_tokens_per_minute: int = None, output_tokens_per_minute: int = None):
+        limits = {
+            "requests_per_minute": requests_per_minute,
+            "input_tokens_per_minute": input_tokens_per_minute,
+            "output_tokens_per_minute": output_tokens_per_minute
+        }
+        if any(limit is not None and limit <= 0 for limit in limits.values()):
+            raise ValueError("Rate limits must be positive")
+        limits = {name: limit for name, limit in limits.items() if limit is not None}
+        self.rate_limits = limits or None
     
     def build(self):
         if self.format is None:
@@ -104,65 +198,59 @@ class ModelFactory:
         if self.format == "openai":
             if self.api_key is None and self.url is None:
                 raise ValueError("You must call set_openai_api_key, set_openai_url or set_openai_api_key_and_url before building the model")
-            return OpenAIModel(
-                format=self.format,
-                max_tokens=self.max_tokens,
-                temperature=self.temperature,
-                name=self.name,
-                url=self.url,
-                api_key=self.api_key,
-                system_prompt=self.system_prompt,
-                max_tries=self.max_tries,
-                wait_seconds=self.wait_seconds,
-                summarizer_system_prompt=self.summarizer_system_prompt,
-                summarizer_user_prompt=self.summarizer_user_prompt,
-                summarizer_max_tokens=self.summarizer_max_tokens,
-                summarizer_temperature=self.summarizer_temperature,
-                assistant_print=self.assistant_print,
-                system_print=self.system_print,
-                error_print=self.error_print
-            )
         elif self.format == "gemini":
             if self.api_key is None:
                 raise ValueError("You must call set_gemini_api_key before building the model")
-            return GeminiModel(
-                format=self.format,
-                max_tokens=self.max_tokens,
-                temperature=self.temperature,
-                name=self.name,
-                url=self.url,
-                api_key=self.api_key,
-                system_prompt=self.system_prompt,
-                max_tries=self.max_tries,
-                wait_seconds=self.wait_seconds,
-                summarizer_system_prompt=self.summarizer_system_prompt,
-                summarizer_user_prompt=self.summarizer_user_prompt,
-                summarizer_max_tokens=self.summarizer_max_tokens,
-                summarizer_temperature=self.summarizer_temperature,
-                assistant_print=self.assistant_print,
-                system_print=self.system_print,
-                error_print=self.error_print
-            )
         elif self.format == "anthropic":
             if self.api_key is None:
                 raise ValueError("You must call set_anthropic_api_key before building the model")
-            return AnthropicModel(
-                format=self.format,
-                max_tokens=self.max_tokens,
-                temperature=self.temperature,
-                name=self.name,
-                url=self.url,
-                api_key=self.api_key,
-                system_prompt=self.system_prompt,
-                max_tries=self.max_tries,
-                wait_seconds=self.wait_seconds,
-                summarizer_system_prompt=self.summarizer_system_prompt,
-                summarizer_user_prompt=self.summarizer_user_prompt,
-                summarizer_max_tokens=self.summarizer_max_tokens,
-                summarizer_temperature=self.summarizer_temperature,
-                assistant_print=self.assistant_print,
-                system_print=self.system_print,
-                error_print=self.error_print
-            )
         else:
             raise ValueError(f"Unsupported model format: {self.format}")
+
+        format = self.format
+        if self.openai_responses:
+            if self.format != "openai":
+                raise ValueError("The Responses API is only available for OpenAI models")
+            format = "openai-responses"
+
+        kwargs = dict(
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            name=self.name,
+            url=self.url,
+            api_key=self.api_key,
+            system_prompt=self.system_prompt,
+            max_tries=self.max_tries,
+            wait_seconds=self.wait_seconds,
+            summarizer_system_prompt=self.summarizer_system_prompt,
+            summarizer_user_prompt=self.summarizer_user_prompt,
+            summarizer_max_tokens=self.summarizer_max_tokens,
+            summarizer_temperature=self.summarizer_temperature,
+            assistant_print=self.assistant_print,
+            system_print=self.system_print,
+            error_print=self.error_print,
+            stream=self.stream,
+            max_concurrent_tools=self.max_concurrent_tools,
+            tool_cache=self.tool_cache,
+            summarizer_soft_threshold=self.summarizer_soft_threshold,
+            retry_policy=self.retry_policy,
+            tracer=self.tracer,
+            prompt_caching=self.prompt_caching,
+            token_counter=self.token_counter,
+            summarizer_keep_turns=self.summarizer_keep_turns,
+            tool_output_store=self.tool_output_store,
+            rate_limits=self.rate_limits,
+            response_cache=self.response_cache,
+            cassette=self.cassette,
+            tool_index=self.tool_index
+        )
+        if not self.fallbacks:
+            return load_model_class(format)(format=format, **kwargs)
+        # The fallback factories build the other members; the settings of the
+        # conversation (prints, summarizer, tools, token counter) are the
+        # ones of this factory and belong to the composite
+        members = [load_model_class(format)(format=format, **dict(kwargs, token_counter=None, tool_index=None))]
+        members.extend(factory.build() for factory in self.fallbacks)
+        # Only the members send requests, each within the limits of its
+        # credentials; the composite selects the tools for all of them
+        return load_model_class("composite")(members=members, hedge_delay=self.hedge_delay, format="composite", **dict(kwargs, rate_limits=None))
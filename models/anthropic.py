@@ -1,11 +1,15 @@
 from model import Model
+from token_counter import AnthropicTokenCounter
+from utils import clean_object, normalize_args
 
-from anthropic import Anthropic
+from anthropic import AsyncAnthropic
 from fastmcp import McpError
 import asyncio
-import logging
+import json
 
 
+CACHE_CONTROL = {"type": "ephemeral"}
+
 def mcp_tools_to_anthropic_tools(mcp_tools):
     return [{
             "name": tool.name,
@@ -13,51 +17,162 @@ def mcp_tools_to_anthropic_tools(mcp_tools):
             "input_schema": tool.inputSchema
         } for tool in mcp_tools]
 
+def with_cache_breakpoint(message):
+    """
+    Copy of message whose last content block carries a cache breakpoint.
+    The history itself is never modified.
+    """
+    content = message["content"]
+    if isinstance(content, str):
+        content = [{"type": "text", "text": content}]
+    if not content or not isinstance(content[-1], dict):
+        return message
+    content = list(content)
+    content[-1] = {**content[-1], "cache_control": CACHE_CONTROL}
+    return {**message, "content": content}
+
+def chat_messages_to_anthropic_messages(messages):
+    """
+    Convert chat completions messages into Messages API messages: tool
+    calls become tool_use blocks, consecutive tool messages one user
+    message of tool_result blocks, and system messages (summaries) user
+    messages.
+    """
+    converted = []
+    for message in messages:
+        role = message["role"]
+        if role == "tool":
+            block = {
+                "type": "tool_result",
+                "tool_use_id": message.get("tool_call_id"),
+                "content": message["content"]
+            }
+            previous = converted[-1] if converted else None
+            # Every result of one turn travels in the same user message
+            if previous is not None and previous["role"] == "user" and isinstance(previous["content"], list):
+                previous["content"].append(block)
+            else:
+                converted.append({"role": "user", "content": [block]})
+        elif role == "assistant":
+            blocks = [{"type": "text", "text": message["content"]}] if message.get("content") else []
+            blocks.extend({
+                "type": "tool_use",
+                "id": tool_call["id"],
+                "name": tool_call["function"]["name"],
+                "input": normalize_args(tool_call["function"]["arguments"])
+            } for tool_call in message.get("tool_calls") or [])
+            converted.append({"role": "assistant", "content": blocks or ""})
+        else:
+            converted.append({"role": "user", "content": message["content"]})
+    return converted
+
+def anthropic_message_to_chat_message(message):
+    return clean_object({
+        "role": "assistant",
+        "content": "".join(block.text for block in message.content if block.type == "text") or None,
+        "tool_calls": [{
+            "id": block.id,
+            "type": "function",
+            "function": {
+                "name": block.name,
+                "arguments": json.dumps(block.input)
+            }
+        } for block in message.content if block.type == "tool_use"] or None
+    })
+
 class AnthropicModel(Model):
+    history_start = 0
+    system_in_history = False
+    token_counter_class = AnthropicTokenCounter
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.client = None
 
     def init(self):
-        self.anthropic = Anthropic(api_key=self.api_key)
-        self.messages = []
+        self.anthropic = AsyncAnthropic(api_key=self.api_key)
+        self.reset_messages()
 
     def init_tools(self, tools):
         super().init_tools(tools)
-        self.available_tools = mcp_tools_to_anthropic_tools(tools)
+        tools = self.add_builtin_tools(tools)
+        self.set_tools(tools, mcp_tools_to_anthropic_tools(tools))
     
     def set_system(self, system_prompt):
         super().set_system(system_prompt)
     
     async def create_message(self):
         super().create_message()
-        tries = 0
-        while tries < self.max_tries:
-            try:
-                tries += 1
-                return self.anthropic.messages.create(
-                    model=self.name,
-                    max_tokens=self.max_tokens,
-                    messages=self.messages,
-                    tools=self.available_tools,
-                    system=self.system
-                )
-            except Exception as e:
-                if e.body["error"]["message"] == "Your credit balance is too low to access the Anthropic API. Please go to Plans & Billing to upgrade or purchase credits.":
-                    self.error_print(f"You have no Anthropic credits. Purchase more to continue; a new attempt will be made in {self.model.wait_seconds} seconds")
-                elif e.body["error"]["message"] == "Overloaded":
-                    self.error_print(f"Anthropic's server is overloaded; a new attempt will be made in {self.model.wait_seconds} seconds")
-                elif e.body["error"]["message"].startswith("This request would exceed your organization's"):
-                    self.error_print(f"You have exceeded the requests-per-minute limit; a new attempt will be made in {self.model.wait_seconds} seconds")
-                else:
-                    if e.body is not None and "error" in e.body and "message" in e.body["error"]:
-                        self.error_print(f"{e.body['error']['message']}")
-                    else:
-                        self.error_print(f"{e}")
-            await asyncio.sleep(self.model.wait_seconds)
-        self.error_print("Maximum number of attempts reached, please try again later")
+        return await self.call_with_retry(self.request_message)
+
+    async def request_message(self):
+        if self.stream:
+            return await self.create_streamed_message()
+        return await self.anthropic.messages.create(**self.get_request_params())
+
+    def get_request_params(self):
+        """
+        Parameters of a messages request. With prompt caching, cache
+        breakpoints are set after the tools, after the system prompt and on
+        the last message, so every step of the tool loop reads the previous
+        prefix from the cache.
+        """
+        params = {
+            "model": self.name,
+            "max_tokens": self.max_tokens,
+            "messages": self.messages,
+            "tools": self.available_tools,
+            "system": self.system
+        }
+        if not self.prompt_caching:
+            return params
+        if self.available_tools:
+            params["tools"] = self.available_tools[:-1] + [{**self.available_tools[-1], "cache_control": CACHE_CONTROL}]
+        if self.system:
+            params["system"] = [{"type": "text", "text": self.system, "cache_control": CACHE_CONTROL}]
+        if len(self.messages) > 0:
+            params["messages"] = self.messages[:-1] + [with_cache_breakpoint(self.messages[-1])]
+        return params
+
+    def from_chat_messages(self, messages):
+        return chat_messages_to_anthropic_messages(messages)
+
+    def to_chat_message(self, response):
+        return anthropic_message_to_chat_message(response)
+
+    def print_request_error(self, error, delay):
+        body = getattr(error, "body", None)
+        if isinstance(body, dict) and isinstance(body.get("error"), dict) and "message" in body["error"]:
+            message = body["error"]["message"]
+            if message == "Your credit balance is too low to access the Anthropic API. Please go to Plans & Billing to upgrade or purchase credits.":
+                error = "You have no Anthropic credits. Purchase more to continue"
+            elif message == "Overloaded":
+                error = "Anthropic's server is overloaded"
+            elif message.startswith("This request would exceed your organization's"):
+                error = "You have exceeded the requests-per-minute limit"
+            else:
+                error = message
+        super().print_request_error(error, delay)
+
+    async def create_streamed_message(self):
+        """Stream the response, printing text deltas, and return the final message"""
+        async with self.anthropic.messages.stream(**self.get_request_params()) as stream:
+            async for text in stream.text_stream:
+                self.assistant_print(text)
+                self.response_streamed = True
+            return await stream.get_final_message()
     
-    async def process_query(self, query):
+    async def call_tool(self, tool_name, tool_args):
+        result = None
+        while result is None:
+            try:
+                result = await super().call_tool(tool_name, tool_args)
+            except McpError as e:
+                self.error_print(f"Error while calling tool {tool_name}: {str(e)}, a new attempt will be made in {self.wait_seconds} seconds")
+                await asyncio.sleep(self.wait_seconds)
+        return result
+
+    async def _process_query(self, query):
         """Process a query using Claude and the available tools"""
         await self._examine_query(query)
 
@@ -69,83 +184,71 @@ class AnthropicModel(Model):
                 "role": "user",
                 "content": query
             }]
-            if self.check_summarize_needed(next_message):
-                await self.summarize()
+            await self.summarize_if_needed(next_message)
             # Request to Claude
+            self.response_streamed = False
             self.response = await self.create_message()
 
-            response_content = list(self.response.content)
             assistant_parts = []
+            tool_uses = []
 
-            tool_use_detected = False
-
-            while response_content:
-                content = response_content.pop(0)  # Take the first element of the response
-
+            for content in self.response.content:
                 if content.type == 'text':  # Assistant normal text
-                    self.assistant_print(content.text)
+                    if not self.response_streamed:
+                        self.assistant_print(content.text)
                     assistant_parts.append(content)
 
                 elif content.type == 'tool_use':  # Tool use
-                    tool_use_detected = True
-                    tool_name = content.name
-                    tool_args = content.input
-                    tool_id = content.id
-
-                    # Save assistant message (testo + tool_use)
-                    self.messages.append({
-                        "role": "assistant",
-                        "content": assistant_parts + [content]
-                    })
-
-                    result = None
-                    while result is None:
-                        try:
-                            # Call the tool
-                            result = await self.client.call_tool(tool_name, tool_args)
-                        except McpError as e:
-                            self.error_print(f"Error while calling tool {tool_name}: {str(e)}, a new attempt will be made in {self.model.wait_seconds} seconds")
-                            await asyncio.sleep(self.model.wait_seconds)
-
-                    # Add the tool_result right after
-                    self.messages.append({
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "tool_result",
-                                "tool_use_id": tool_id,
-                                "content": result.content
-                            }
-                        ]
-                    })
+                    assistant_parts.append(content)
+                    tool_uses.append(content)
+
+            # Save the assistant message (text + every tool_use of this turn)
+            self.messages.append({
+                "role": "assistant",
+                "content": assistant_parts
+            })
 
             # If there are no tools to call, exit the loop
-            if not tool_use_detected:
-                # Save the assistant's response
+            tool_use_detected = len(tool_uses) > 0
+            if tool_use_detected:
+                results = await self.call_tools([(content.name, content.input) for content in tool_uses])
+
+                # One user message carrying every tool_result, in tool_use order
                 self.messages.append({
-                    "role": "assistant",
-                    "content": assistant_parts
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "tool_result",
+                            "tool_use_id": content.id,
+                            "content": result.content
+                        }
+                        for content, result in zip(tool_uses, results)
+                    ]
                 })
     
-    async def summarize(self):
-        logging.debug("Started summarization")
-        history = [{"role":"system", "content": self.summarizer_system_prompt},{"role": "user", "content": f"{self.summarizer_user_prompt}{str(self.messages[1:-2])}"}]
-        summarizer = self.anthropic.messages.create(
+    async def create_summary(self, messages):
+        summarizer = await self.anthropic.messages.create(
             model=self.name,
             max_tokens=self.summarizer_max_tokens,
-            messages=history
+            temperature=self.summarizer_temperature,
+            system=self.summarizer_system_prompt,
+            messages=[{"role": "user", "content": self.get_summarizer_prompt(messages)}]
         )
-        summary = summarizer.content
-        logging.debug(f"Summary produced:{summary}")
-        new_messages = [
-        {
-            "role": "system",
-            "content": self.system
-        },
-        {
-            "role": "system",
+        return "".join(block.text for block in summarizer.content if block.type == "text")
+
+    def is_tool_result(self, message):
+        # Tool results travel in a user message made of tool_result blocks
+        content = message.get("content") if isinstance(message, dict) else None
+        return isinstance(content, list) and any(
+            isinstance(block, dict) and block.get("type") == "tool_result" for block in content
+        )
+
+    def build_summarized_messages(self, summary, messages):
+        # The system prompt is sent apart and the Messages API has no system
+        # role, so the summary opens the history as a user message
+        new_messages = [{
+            "role": "user",
             "content": summary
         }]
-        new_messages.extend(self.messages[-2:])
-        self.messages = new_messages
-        logging.debug("Finished summarization")
\ No newline at end of file
+        new_messages.extend(messages)
+        return new_messages
\ No newline at end of file
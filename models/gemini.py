@@ -1,10 +1,13 @@
 from model import Model
-from utils import normalize_args
+from utils import clean_object, normalize_args
 
 from google import genai
 from google.genai import types
-import asyncio
+from types import SimpleNamespace
+import json
 import logging
+import time
+import uuid
 
 def mcp_tools_to_gemini_tools(mcp_tools):
     """
@@ -26,12 +29,77 @@ def mcp_tools_to_gemini_tools(mcp_tools):
         }
     ]
 
+def chat_messages_to_gemini_contents(messages):
+    """
+    Convert chat completions messages into Gemini contents: tool calls
+    become function_call parts, consecutive tool messages one content of
+    function_response parts, and system messages (summaries) user contents
+    like the system prompt.
+    """
+    contents = []
+    previous_role = None
+    for message in messages:
+        role = message["role"]
+        if role == "tool":
+            part = types.Part(function_response=types.FunctionResponse(
+                id=message.get("tool_call_id"),
+                name=message.get("name"),
+                response={"result": message["content"]}
+            ))
+            # Every result of one turn travels in the same content
+            if previous_role == "tool":
+                contents[-1].parts.append(part)
+            else:
+                contents.append(types.Content(role="user", parts=[part]))
+        elif role == "assistant":
+            parts = [types.Part(text=message["content"])] if message.get("content") else []
+            parts.extend(types.Part(function_call=types.FunctionCall(
+                id=tool_call["id"],
+                name=tool_call["function"]["name"],
+                args=normalize_args(tool_call["function"]["arguments"])
+            )) for tool_call in message.get("tool_calls") or [])
+            contents.append(types.Content(role="model", parts=parts or [types.Part(text="")]))
+        else:
+            contents.append(types.Content(role="user", parts=[types.Part(text=message["content"])]))
+        previous_role = role
+    return contents
+
+def gemini_response_to_chat_message(response):
+    parts = response.candidates[0].content.parts or []
+    function_calls = [part.function_call for part in parts if getattr(part, "function_call", None)]
+    return clean_object({
+        "role": "assistant",
+        "content": "".join(part.text for part in parts if getattr(part, "text", None)) or None,
+        "tool_calls": [{
+            # Gemini only sets an id on some models; the other providers need one
+            "id": function_call.id or f"call_{uuid.uuid4().hex[:24]}",
+            "type": "function",
+            "function": {
+                "name": function_call.name,
+                "arguments": json.dumps(dict(function_call.args or {}))
+            }
+        } for function_call in function_calls] or None
+    })
+
 class GeminiModel(Model):
+    # Lifetime of the cached-content entry used with prompt caching, in seconds
+    cached_content_ttl = 3600
+    # The SDK is given the MCP session and sees only the tools of the server
+    selects_tools = False
+    stores_tool_outputs = False
+    aggregates_servers = False
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self.cached_content = None
+        self.cached_content_expires_at = 0
+        self.cached_content_stale = True
 
     def init(self):
         self.gemini = genai.client.Client(api_key=self.api_key)
+        self.reset_messages()
+
+    def reset_messages(self):
         self.messages = [
             types.Content(
                 role="user", parts=[types.Part(text=self.system)]
@@ -40,44 +108,144 @@ class GeminiModel(Model):
     
     def init_tools(self, tools):
         super().init_tools(tools)
-        self.available_tools = mcp_tools_to_gemini_tools(tools)
+        self.available_tools = mcp_tools_to_gemini_tools(self.add_builtin_tools(tools))
+        self.cached_content_stale = True
     
     def set_system(self, system_prompt):
         super().set_system(system_prompt)
         self.messages[0] = types.Content(
             role="user", parts=[types.Part(text=system_prompt)]
         )
+        self.cached_content_stale = True
+
+    async def get_cached_content(self):
+        """
+        Name of the cached-content entry holding the system instruction and
+        the function declarations, created again when set_system() or
+        init_tools() changed them or when it is about to expire. Returns
+        None when the entry cannot be created (e.g. the prefix is shorter
+        than the minimum cacheable size), until the prefix changes again.
+        The replaced entries are left to expire, since forks may still use
+        them.
+        """
+        if not self.cached_content_stale and time.monotonic() < self.cached_content_expires_at:
+            return self.cached_content
+        self.cached_content_stale = False
+        self.cached_content_expires_at = time.monotonic() + self.cached_content_ttl * 0.9
+        try:
+            cache = await self.gemini.aio.caches.create(
+                model=self.name,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=self.system,
+                    tools=self.available_tools,
+                    ttl=f"{self.cached_content_ttl}s"
+                )
+            )
+            self.cached_content = cache.name
+        except Exception as e:
+            logging.debug(f"Cached content not available: {e}")
+            self.cached_content = None
+        return self.cached_content
     
     async def create_message(self):
         super().create_message()
-        tries = 0
-        while tries < self.max_tries:
-            try:
-                tries += 1
-
-                response = await self.gemini.aio.models.generate_content(
-                    model = self.name,
-                    contents = self.messages,
-                    config=types.GenerateContentConfig(
-                        temperature=self.temperature,
-                        max_output_tokens=self.max_tokens,
-                        tools=[self.client.session],
-                    )
-                )
+        return await self.call_with_retry(self.request_message)
 
-                return response
+    async def request_message(self):
+        if self.stream:
+            return await self.create_streamed_message()
 
-            except Exception as e:
-                self.error_print(str(e))
+        return await self.gemini.aio.models.generate_content(**await self.get_request_params())
 
-            await asyncio.sleep(self.wait_seconds)
+    async def get_request_params(self):
+        """
+        Parameters of a generate_content request. With prompt caching the
+        system prompt (the first message) and the tools are read from the
+        cached-content entry instead of being sent again.
+        """
+        cached_content = await self.get_cached_content() if self.prompt_caching else None
+        if cached_content is None:
+            return {
+                "model": self.name,
+                "contents": self.messages,
+                "config": self.get_generate_config()
+            }
+        return {
+            "model": self.name,
+            "contents": self.messages[1:],
+            "config": self.get_generate_config(cached_content)
+        }
+
+    def get_generate_config(self, cached_content=None):
+        if cached_content is not None:
+            return types.GenerateContentConfig(
+                temperature=self.temperature,
+                max_output_tokens=self.max_tokens,
+                cached_content=cached_content,
+            )
+        return types.GenerateContentConfig(
+            temperature=self.temperature,
+            max_output_tokens=self.max_tokens,
+            tools=[self.client.session],
+        )
 
-        self.error_print("Maximum number of attempts reached, please try again later")
+    async def create_streamed_message(self):
+        """Stream the response, printing text deltas, and rebuild a single candidate"""
+        stream = await self.gemini.aio.models.generate_content_stream(**await self.get_request_params())
+        text = []
+        function_calls = []
+        finish_reason = None
+        usage_metadata = None
+        async for chunk in stream:
+            # Every chunk reports the usage so far
+            usage_metadata = getattr(chunk, "usage_metadata", None) or usage_metadata
+            if not chunk.candidates:
+                continue
+            candidate = chunk.candidates[0]
+            parts = candidate.content.parts if candidate.content is not None else None
+            for part in parts or []:
+                if getattr(part, "function_call", None):
+                    function_calls.append(part)
+                elif part.text:
+                    text.append(part.text)
+                    self.assistant_print(part.text)
+                    self.response_streamed = True
+            if candidate.finish_reason:
+                finish_reason = candidate.finish_reason
+
+        full_text = "".join(text)
+        text_parts = [types.Part(text=full_text)] if full_text or not function_calls else []
+        return SimpleNamespace(candidates=[SimpleNamespace(
+            finish_reason=finish_reason,
+            content=types.Content(role="model", parts=text_parts + function_calls),
+            text=full_text
+        )], usage_metadata=usage_metadata)
     
     def get_role_message(self, role, content):
         return types.Content(role=role, parts=[types.Part(text=content)])
+
+    def is_tool_result(self, message):
+        # Tool results travel in a user content made of function_response parts
+        parts = getattr(message, "parts", None) or []
+        return any(getattr(part, "function_response", None) for part in parts)
+
+    def decode_message(self, message):
+        return types.Content.model_validate(message)
+
+    def decode_response(self, data):
+        response = super().decode_response(data)
+        # The contents go back to the API with the history
+        for candidate in response.candidates:
+            candidate["content"] = types.Content.model_validate(candidate["content"])
+        return response
+
+    def from_chat_messages(self, messages):
+        return chat_messages_to_gemini_contents(messages)
+
+    def to_chat_message(self, response):
+        return gemini_response_to_chat_message(response)
     
-    async def process_query(self, query):
+    async def _process_query(self, query):
         """Process a query using a model and the available tools"""
         await self._examine_query(query)
 
@@ -89,82 +257,70 @@ class GeminiModel(Model):
                 "role": "user",
                 "content": query
             }]
-            if self.check_summarize_needed(next_message):
-                await self.summarize()
+            await self.summarize_if_needed(next_message)
             # Request to the model
+            self.response_streamed = False
             self.response = await self.create_message()
 
             candidate = self.response.candidates[0]
-            finish = candidate.finish_reason
+            parts = (candidate.content.parts if candidate.content is not None else None) or []
+            # Gemini ends a turn that calls functions with STOP too, so the
+            # calls are found in the parts whatever the finish reason
+            calls = [part.function_call for part in parts if getattr(part, "function_call", None)]
 
-            tool_use_detected = False
+            tool_use_detected = len(calls) > 0
 
-            if finish == "STOP":
+            if not tool_use_detected:
                 # The answer is complete; there are no tools to call
-                text = candidate.content.parts[0].text
+                text = "".join(part.text for part in parts if getattr(part, "text", None))
                 self.messages.append(types.Content(
                     role="model", parts=[types.Part(text=text)]
                 ))
-                self.assistant_print(text)
-            elif finish == "CALL_FUNCTION":
-                tool_use_detected = True
-
-                calls = []
-                for part in candidate.content:
-                    if hasattr(part, "function_call") and part.function_call:
-                        calls.append(part.function_call)
-                
-                # Add a part for the model's intent anyway
-                self.messages.append(types.Content(
-                    role="model", parts=[types.Part(text=candidate.text or "")]
-                ))
-
-
-                # Process each tool call
-                for fc in calls:
-                    tool_name = fc.name
-                    tool_args = normalize_args(fc.args)
+                if not self.response_streamed:
+                    self.assistant_print(text)
+            else:
+                # The calls go back to the model with their results
+                self.messages.append(types.Content(role="model", parts=list(parts)))
 
-                    # Call FastMCP
-                    result = await self.client.call_tool(tool_name, tool_args)
-                    tool_output = result.content[0].text
+                # Call FastMCP for every tool call of this turn at once
+                results = await self.call_tools([(fc.name, normalize_args(fc.args)) for fc in calls])
 
-                    # Append the result as simple context for Gemini
-                    self.messages.append(types.Content(
-                        role="user", parts=[types.Part(text=tool_output)]
+                # Every result of the turn travels in one content, matched to its call
+                self.messages.append(types.Content(role="user", parts=[
+                    types.Part(function_response=types.FunctionResponse(
+                        id=getattr(fc, "id", None), name=fc.name, response={"result": result.content[0].text}
                     ))
+                    for fc, result in zip(calls, results)
+                ]))
 
-    async def summarize(self):
-        logging.debug("Started summarization")
+    async def create_summary(self, messages):
         history = [
             types.Content(
-                role="system", parts=[types.Part(text=self.model.summarizer_system_prompt)]
-            ),
-            types.Content(
-                role="user", parts=[types.Part(text=f"{self.model.summarizer_user_prompt}{str(self.messages[1:-2])}")]
+                role="user", parts=[types.Part(text=self.get_summarizer_prompt(messages))]
             )
         ]
         summarizer = await self.gemini.aio.models.generate_content(
-            model=self.model.name,
+            model=self.name,
             contents=history,
             config=types.GenerateContentConfig(
-                max_output_tokens=self.model.summarizer_max_tokens,
-                temperature=self.model.summarizer_temperature
+                system_instruction=self.summarizer_system_prompt,
+                max_output_tokens=self.summarizer_max_tokens,
+                temperature=self.summarizer_temperature
             )
         )
-        summary = summarizer.candidates[0].parts[0].text
-        logging.debug(f"Summary produced:{summary}")
+        return summarizer.text
+
+    def build_summarized_messages(self, summary, messages):
         new_messages = [
             types.Content(
                 role="user", parts=[types.Part(text=self.system)]
             ),
             types.Content(
-                role="system", parts=[types.Part(text=summary)]
+                role="user", parts=[types.Part(text=summary)]
             )
         ]
-        new_messages.extend(self.messages[-2:])
-        self.messages = new_messages
-        logging.debug("Finished summarization")
+        new_messages.extend(messages)
+        return new_messages
     
     def get_messages(self):
         for msg in self.messages:
@@ -1,9 +1,8 @@
 from model import Model
-from utils import normalize_args
+from utils import clean_object, normalize_args
 
-import logging
-import asyncio
-from openai import OpenAI
+from types import SimpleNamespace
+from openai import AsyncOpenAI
 
 def mcp_tools_to_openai_tools(mcp_tools):
     converted = []
@@ -18,26 +17,50 @@ def mcp_tools_to_openai_tools(mcp_tools):
         })
     return converted
 
+def assistant_message_to_dict(message):
+    """
+    Convert an assistant message (SDK object or rebuilt streamed message)
+    into the plain dict accepted by the chat completions API.
+    """
+    tool_calls = getattr(message, "tool_calls", None) or []
+    return clean_object({
+        "role": "assistant",
+        "content": message.content,
+        "tool_calls": [{
+            "id": getattr(tool_call, "id", None),
+            "type": "function",
+            "function": {
+                "name": tool_call.function.name,
+                "arguments": tool_call.function.arguments
+            }
+        } for tool_call in tool_calls] or None
+    })
+
 class OpenAIModel(Model):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.client = None
+        self.last_usage = None
         if self.url is None or self.url=="":
-            self.openai = OpenAI(api_key=self.api_key)
+            self.openai = AsyncOpenAI(api_key=self.api_key)
         else:
-            self.openai = OpenAI(api_key=self.api_key, base_url=self.url)
+            self.openai = AsyncOpenAI(api_key=self.api_key, base_url=self.url)
+        self.reset_messages()
+
+    def init(self):
+        super().init()
+
+    def reset_messages(self):
         self.messages = [{
             "role": "system",
             "content": self.system
         }]
-
-    def init(self):
-        super().init()
         
     
     def init_tools(self, tools):
         super().init_tools(tools)
-        self.available_tools = mcp_tools_to_openai_tools(tools)
+        tools = self.add_builtin_tools(tools)
+        self.set_tools(tools, mcp_tools_to_openai_tools(tools))
     
     def set_system(self, system_prompt):
         super().set_system(system_prompt)
@@ -48,30 +71,90 @@ class OpenAIModel(Model):
     
     async def create_message(self):
         super().create_message()
-        tries = 0
-        while tries < self.max_tries:
-            try:
-                tries += 1
-                return self.openai.chat.completions.create(
-                    model=self.name,
-                    messages=self.messages,
-                    max_tokens=self.max_tokens,
-                    temperature=self.temperature,
-                    tools=self.available_tools
-                ).choices[0]
-            
-            except Exception as e:
-                if not hasattr(e, "body"):
-                    self.error_print(f"{e}")
-                else:
-                    if "error" in e.body and "message" in e.body["error"]:
-                        self.error_print(f"{e.body['error']['message']}")
-                    else:
-                        self.error_print(f"{e}")
-            await asyncio.sleep(self.wait_seconds)
-        self.error_print("Maximum number of attempts reached, please try again later")
+        return await self.call_with_retry(self.request_message)
+
+    async def request_message(self):
+        self.last_usage = None
+        if self.stream:
+            return await self.create_streamed_message()
+        response = await self.openai.chat.completions.create(
+            model=self.name,
+            messages=self.messages,
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            # The API rejects an empty tools array, e.g. when no tool matched the query
+            tools=self.available_tools or None
+        )
+        self.last_usage = getattr(response, "usage", None)
+        return response.choices[0]
+
+    def to_chat_message(self, response):
+        return assistant_message_to_dict(response.message)
+
+    def get_usage(self, response):
+        # The usage is reported on the completion, not on the returned choice
+        return super().get_usage(SimpleNamespace(usage=self.last_usage))
+
+    def print_request_error(self, error, delay):
+        body = getattr(error, "body", None)
+        if isinstance(body, dict):
+            if isinstance(body.get("error"), dict) and "message" in body["error"]:
+                error = body["error"]["message"]
+            elif "message" in body:
+                error = body["message"]
+        super().print_request_error(error, delay)
+
+    async def create_streamed_message(self):
+        """Stream the completion, printing text deltas and rebuilding the final choice"""
+        stream = await self.openai.chat.completions.create(
+            model=self.name,
+            messages=self.messages,
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            tools=self.available_tools or None,
+            stream=True,
+            # The usage arrives in a last chunk without choices
+            stream_options={"include_usage": True}
+        )
+        content = []
+        tool_calls = {}
+        finish_reason = None
+        async for chunk in stream:
+            if getattr(chunk, "usage", None) is not None:
+                self.last_usage = chunk.usage
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            delta = choice.delta
+            if delta.content:
+                content.append(delta.content)
+                self.assistant_print(delta.content)
+                self.response_streamed = True
+            for tool_call in delta.tool_calls or []:
+                # Tool calls arrive in fragments that share the same index
+                entry = tool_calls.setdefault(tool_call.index, {"id": None, "name": "", "arguments": ""})
+                if tool_call.id:
+                    entry["id"] = tool_call.id
+                if tool_call.function is not None:
+                    entry["name"] += tool_call.function.name or ""
+                    entry["arguments"] += tool_call.function.arguments or ""
+            if choice.finish_reason:
+                finish_reason = choice.finish_reason
+
+        return SimpleNamespace(
+            finish_reason=finish_reason,
+            message=SimpleNamespace(
+                role="assistant",
+                content="".join(content),
+                tool_calls=[SimpleNamespace(
+                    id=entry["id"],
+                    type="function",
+                    function=SimpleNamespace(name=entry["name"], arguments=entry["arguments"])
+                ) for _, entry in sorted(tool_calls.items())]
+            )
+        )
     
-    async def process_query(self, query):
+    async def _process_query(self, query):
         """Process a query using a model and the available tools"""
         await self._examine_query(query)
 
@@ -83,9 +166,9 @@ class OpenAIModel(Model):
                 "role": "user",
                 "content": query
             }]
-            if self.check_summarize_needed(next_message):
-                await self.summarize()
+            await self.summarize_if_needed(next_message)
             # Request to the model
+            self.response_streamed = False
             self.response = await self.create_message()
 
             tool_use_detected = False
@@ -96,36 +179,39 @@ class OpenAIModel(Model):
                     "role": "assistant",
                     "content": self.response.message.content
                 })
-                self.assistant_print(self.response.message.content)
+                if not self.response_streamed:
+                    self.assistant_print(self.response.message.content)
             elif self.response.finish_reason == "tool_calls":
                 tool_use_detected = True
                 tool_calls = self.response.message.tool_calls
-                self.messages.append(self.response.message)
-                for tool_call in tool_calls:
-                    tool_name = tool_call.function.name
-                    tool_args = normalize_args(tool_call.function.arguments)
-                    result = await self.client.call_tool(tool_name, tool_args)
-
-                    self.messages.append({
+                self.messages.append(assistant_message_to_dict(self.response.message))
+                results = await self.call_tools([
+                    (tool_call.function.name, normalize_args(tool_call.function.arguments))
+                    for tool_call in tool_calls
+                ])
+                # Tool messages must follow the order of the tool calls
+                for tool_call, result in zip(tool_calls, results):
+                    self.messages.append(clean_object({
                         "role": "tool",
-                        "name": tool_name,
+                        "tool_call_id": getattr(tool_call, "id", None),
+                        "name": tool_call.function.name,
                         "content": result.content[0].text
-                    })
+                    }))
     
-    async def summarize(self):
-        logging.debug("Started summarization")
+    async def create_summary(self, messages):
         history = [
             {"role":"system", "content": self.summarizer_system_prompt},
-            {"role": "user", "content": f"{self.summarizer_user_prompt}{str(self.messages[1:-2])}"}
+            {"role": "user", "content": self.get_summarizer_prompt(messages)}
         ]
-        summarizer = self.openai.chat.completions.create(
+        summarizer = await self.openai.chat.completions.create(
             model=self.name,
             messages=history,
             max_tokens=self.summarizer_max_tokens,
             temperature=self.summarizer_temperature
         )
-        summary = summarizer.choices[0].message.content
-        logging.debug(f"Summary produced:{summary}")
+        return summarizer.choices[0].message.content
+
+    def build_summarized_messages(self, summary, messages):
         new_messages = [
         {
             "role": "system",
@@ -135,6 +221,5 @@ class OpenAIModel(Model):
             "role": "system",
             "content": summary
         }]
-        new_messages.extend(self.messages[-2:])
-        self.messages = new_messages
-        logging.debug("Finished summarization")
\ No newline at end of file
+        new_messages.extend(messages)
+        return new_messages
\ No newline at end of file
@@ -0,0 +1,216 @@
+from models.openai import OpenAIModel
+from retry import get_status_code
+from utils import clean_object, normalize_args
+
+import logging
+
+# Status of the non-streamed request that fails for the same reason
+STREAM_ERROR_STATUS = {"server_error": 500, "rate_limit_exceeded": 429}
+
+class StreamedResponseError(Exception):
+    """A streamed response that failed, or a stream that ended without a response"""
+
+    def __init__(self, error=None):
+        self.error_code = getattr(error, "code", None)
+        super().__init__(getattr(error, "message", None) or self.error_code or "The stream ended without a response")
+        # Retried like the status the request would have got without streaming
+        self.status_code = STREAM_ERROR_STATUS.get(self.error_code)
+
+def mcp_tools_to_responses_tools(mcp_tools):
+    return [{
+        "type": "function",
+        "name": t.name,
+        "description": t.description,
+        "parameters": t.input_schema if hasattr(t, "input_schema") else {"type": "object", "properties": {}}
+    } for t in mcp_tools]
+
+def messages_to_responses_input(messages):
+    """
+    Convert chat completions messages (the local history) into the input
+    items of the Responses API.
+    """
+    items = []
+    for message in messages:
+        if message["role"] == "tool":
+            items.append({
+                "type": "function_call_output",
+                "call_id": message.get("tool_call_id"),
+                "output": message["content"]
+            })
+            continue
+        if message.get("content"):
+            items.append({"role": message["role"], "content": message["content"]})
+        for tool_call in message.get("tool_calls") or []:
+            items.append({
+                "type": "function_call",
+                "call_id": tool_call["id"],
+                "name": tool_call["function"]["name"],
+                "arguments": tool_call["function"]["arguments"]
+            })
+    return items
+
+def response_text(response):
+    return "".join(
+        content.text
+        for item in response.output if item.type == "message"
+        for content in item.content if content.type == "output_text"
+    )
+
+class OpenAIResponsesModel(OpenAIModel):
+    """
+    OpenAI model that uses the Responses API and keeps the conversation on
+    the server: every request sends only the messages added since the
+    previous response, chained by previous_response_id. self.messages stays
+    a chat completions style mirror of the conversation, so get_messages,
+    set_messages and summarization work as with OpenAIModel.
+    """
+    provider = "openai"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.previous_response_id = None
+        self.synced_messages = None
+        self.synced_count = 0
+
+    def init_tools(self, tools):
+        super().init_tools(tools)
+        tools = self.add_builtin_tools(tools)
+        self.set_tools(tools, mcp_tools_to_responses_tools(tools))
+
+    def get_pending_messages(self):
+        """
+        Messages the server does not know yet. When the history was
+        replaced (summary, set_messages, fork) the chain starts again from
+        the whole history.
+        """
+        if self.previous_response_id is None or self.messages is not self.synced_messages:
+            self.previous_response_id = None
+            # The system prompt is sent as instructions
+            return self.messages[self.history_start:]
+        return self.messages[self.synced_count:]
+
+    def get_request_params(self):
+        return clean_object({
+            "model": self.name,
+            "instructions": self.system,
+            "input": messages_to_responses_input(self.get_pending_messages()),
+            "previous_response_id": self.previous_response_id,
+            "max_output_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "tools": self.available_tools or None,
+            "store": True
+        })
+
+    async def request_message(self):
+        self.last_usage = None
+        try:
+            response = await self.send_request()
+        except Exception as e:
+            # The stored response may have expired or been deleted
+            if self.previous_response_id is None or get_status_code(e) not in (400, 404):
+                raise
+            logging.debug(f"Previous response not available, sending the whole history: {e}")
+            self.previous_response_id = None
+            response = await self.send_request()
+        self.last_usage = getattr(response, "usage", None)
+        return response
+
+    async def send_request(self):
+        if self.stream:
+            return await self.create_streamed_message()
+        return await self.openai.responses.create(**self.get_request_params())
+
+    async def create_streamed_message(self):
+        """
+        Stream the response, printing text deltas, and return the final
+        response: completed, or incomplete (e.g. cut at max_output_tokens)
+        like the non-streamed request returns it
+        """
+        stream = await self.openai.responses.create(**self.get_request_params(), stream=True)
+        response = None
+        async for event in stream:
+            if event.type == "response.output_text.delta":
+                self.assistant_print(event.delta)
+                self.response_streamed = True
+            elif event.type in ("response.completed", "response.incomplete"):
+                response = event.response
+            elif event.type == "response.failed":
+                raise StreamedResponseError(getattr(event.response, "error", None))
+            elif event.type == "error":
+                raise StreamedResponseError(event)
+        if response is None:
+            raise StreamedResponseError()
+        return response
+
+    def to_chat_message(self, response):
+        return clean_object({
+            "role": "assistant",
+            "content": response_text(response) or None,
+            "tool_calls": [{
+                "id": item.call_id,
+                "type": "function",
+                "function": {
+                    "name": item.name,
+                    "arguments": item.arguments
+                }
+            } for item in response.output if item.type == "function_call"] or None
+        })
+
+    def accept_response(self, response):
+        self.set_synced(response)
+
+    def set_synced(self, response):
+        """Record that the server holds the history up to its current end"""
+        self.previous_response_id = response.id
+        self.synced_messages = self.messages
+        self.synced_count = len(self.messages)
+
+    async def _process_query(self, query):
+        """Process a query using a model and the available tools"""
+        await self._examine_query(query)
+
+        tool_use_detected = True
+        # Interaction loop with the model
+        while tool_use_detected:
+            # Check if summarization is needed
+            next_message = [{
+                "role": "user",
+                "content": query
+            }]
+            await self.summarize_if_needed(next_message)
+            # Request to the model
+            self.response_streamed = False
+            self.response = await self.create_message()
+
+            text = response_text(self.response)
+            tool_calls = [item for item in self.response.output if item.type == "function_call"]
+            self.messages.append(self.to_chat_message(self.response))
+            self.set_synced(self.response)
+
+            if text and not self.response_streamed:
+                self.assistant_print(text)
+
+            tool_use_detected = len(tool_calls) > 0
+            if tool_use_detected:
+                results = await self.call_tools([
+                    (tool_call.name, normalize_args(tool_call.arguments))
+                    for tool_call in tool_calls
+                ])
+                for tool_call, result in zip(tool_calls, results):
+                    self.messages.append({
+                        "role": "tool",
+                        "tool_call_id": tool_call.call_id,
+                        "name": tool_call.name,
+                        "content": result.content[0].text
+                    })
+
+    async def create_summary(self, messages):
+        summarizer = await self.openai.responses.create(
+            model=self.name,
+            instructions=self.summarizer_system_prompt,
+            input=self.get_summarizer_prompt(messages),
+            max_output_tokens=self.summarizer_max_tokens,
+            temperature=self.summarizer_temperature,
+            store=False
+        )
+        return response_text(summarizer)
\ No newline at end of file
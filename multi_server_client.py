@@ -0,0 +1,93 @@
+import asyncio
+import copy
+import types
+
+def rename(item, name: str):
+    """Copy of an MCP tool or prompt with another name"""
+    if hasattr(item, "model_copy"):
+        return item.model_copy(update={"name": name})
+    item = copy.copy(item)
+    item.name = name
+    return item
+
+def get_server_info(result):
+    """serverInfo of an initialize result; a result rebuilt from its fields names it server_info"""
+    return getattr(result, "serverInfo", None) or getattr(result, "server_info", None)
+
+class MultiServerClient:
+    """
+    Several MCP servers behind the interface of one fastmcp Client. Every
+    server keeps its own client (connection) and its own limit of
+    concurrent tool calls, so a slow server does not hold up the others.
+    Tools and prompts are listed as "<server><separator><name>", and every
+    call is routed to the server in its name.
+    """
+
+    def __init__(self, clients: dict, max_concurrent_calls: int = 8, separator: str = "__"):
+        for server in clients:
+            if not server or separator in server:
+                raise ValueError(f"Invalid MCP server name: {server!r}")
+        self.clients = dict(clients)
+        self.separator = separator
+        self.max_concurrent_calls = max_concurrent_calls
+        self.semaphores = {server: asyncio.Semaphore(max_concurrent_calls) for server in clients} if max_concurrent_calls else {}
+
+    async def __aenter__(self):
+        # The servers are connected concurrently; when one fails the others are closed
+        clients = list(self.clients.values())
+        results = await asyncio.gather(*(client.__aenter__() for client in clients), return_exceptions=True)
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            await asyncio.gather(*(
+                client.__aexit__(None, None, None)
+                for client, result in zip(clients, results) if not isinstance(result, BaseException)
+            ), return_exceptions=True)
+            raise errors[0]
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await asyncio.gather(*(client.__aexit__(exc_type, exc, tb) for client in self.clients.values()), return_exceptions=True)
+        return False
+
+    @property
+    def initialize_result(self):
+        """serverInfo of every server, the fingerprint of the whole set"""
+        return types.SimpleNamespace(serverInfo={
+            server: get_server_info(getattr(client, "initialize_result", None))
+            for server, client in self.clients.items()
+        })
+
+    def split_name(self, name: str):
+        """(server, name on that server) of a namespaced tool or prompt name"""
+        server, separator, local_name = name.partition(self.separator)
+        if not separator or server not in self.clients:
+            raise LookupError(f"Unknown MCP server for {name!r}")
+        return server, local_name
+
+    async def list_all(self, kind: str):
+        servers = list(self.clients)
+        lists = await asyncio.gather(*(getattr(self.clients[server], f"list_{kind}")() for server in servers))
+        return [
+            rename(item, f"{server}{self.separator}{item.name}")
+            for server, items in zip(servers, lists) for item in items
+        ]
+
+    async def list_tools(self):
+        return await self.list_all("tools")
+
+    async def list_prompts(self):
+        return await self.list_all("prompts")
+
+    async def call_tool(self, name: str, arguments=None):
+        server, local_name = self.split_name(name)
+        semaphore = self.semaphores.get(server)
+        if semaphore is None:
+            return await self.clients[server].call_tool(local_name, arguments)
+        async with semaphore:
+            return await self.clients[server].call_tool(local_name, arguments)
+
+    async def get_prompt(self, name: str, arguments=None):
+        server, local_name = self.split_name(name)
+        if arguments is None:
+            return await self.clients[server].get_prompt(local_name)
+        return await self.clients[server].get_prompt(local_name, arguments)
@@ -0,0 +1,117 @@
+import asyncio
+import hashlib
+import time
+
+class TokenBucket:
+    """Budget of per_minute units, refilled continuously"""
+
+    def __init__(self, per_minute: float, clock=time.monotonic):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.clock = clock
+        self.updated = clock()
+
+    def refill(self):
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def get_wait(self, amount: float):
+        """Seconds before amount is available; a request larger than the whole budget waits for a full bucket"""
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def add(self, amount: float):
+        # A negative amount (more usage than estimated) can leave a debt
+        self.level = min(self.capacity, self.level + amount)
+
+class RateLimiter:
+    """
+    Client-side budget of requests, input tokens and output tokens per
+    minute. Callers wait in arrival order until their estimate fits, then
+    the estimate is taken from the buckets; settle() corrects it with the
+    usage reported by the provider. block() stops every caller after a 429,
+    so concurrent sessions do not retry in lockstep.
+    """
+
+    def __init__(self, requests_per_minute: int = None, input_tokens_per_minute: int = None, output_tokens_per_minute: int = None, clock=time.monotonic, sleep=asyncio.sleep):
+        self.buckets = {
+            name: TokenBucket(per_minute, clock)
+            for name, per_minute in (
+                ("requests", requests_per_minute),
+                ("input_tokens", input_tokens_per_minute),
+                ("output_tokens", output_tokens_per_minute),
+            ) if per_minute
+        }
+        self.clock = clock
+        self.sleep = sleep
+        self.blocked_until = 0
+        self.lock = None
+        self.lock_loop = None
+
+    def get_lock(self):
+        """
+        Lock of the running event loop. asyncio.Lock wakes its waiters in
+        FIFO order but is bound to the loop that first waits on it, so a
+        later asyncio.run() in the same process gets a new one; the budget
+        is kept.
+        """
+        loop = asyncio.get_running_loop()
+        if self.lock_loop is not loop:
+            self.lock = asyncio.Lock()
+            self.lock_loop = loop
+        return self.lock
+
+    def get_wait(self, estimate):
+        wait = self.blocked_until - self.clock()
+        for name, bucket in self.buckets.items():
+            bucket.refill()
+            wait = max(wait, bucket.get_wait(estimate.get(name, 1 if name == "requests" else 0)))
+        return wait
+
+    async def acquire(self, estimate):
+        """
+        Wait until the request described by estimate ({"input_tokens": ...,
+        "output_tokens": ...}) fits the budget and take it. Returns the
+        seconds waited.
+        """
+        started = self.clock()
+        async with self.get_lock():
+            wait = self.get_wait(estimate)
+            while wait > 0:
+                await self.sleep(wait)
+                wait = self.get_wait(estimate)
+            for name, bucket in self.buckets.items():
+                bucket.add(-estimate.get(name, 1 if name == "requests" else 0))
+        return self.clock() - started
+
+    def settle(self, estimate, usage):
+        """Replace the token estimate of a completed request with its reported usage"""
+        for name in ("input_tokens", "output_tokens"):
+            bucket = self.buckets.get(name)
+            actual = usage.get(name)
+            if bucket is not None and actual is not None:
+                bucket.add(estimate.get(name, 0) - actual)
+
+    def refund(self, estimate):
+        """Give back the tokens of a failed request; the request itself still counts"""
+        self.settle(estimate, {"input_tokens": 0, "output_tokens": 0})
+
+    def block(self, seconds: float):
+        """Let no request through for the next seconds"""
+        self.blocked_until = max(self.blocked_until, self.clock() + seconds)
+
+def get_credentials_key(provider: str, url: str, api_key: str):
+    """Key of the models that share the limits of one API key; the key itself is not kept"""
+    digest = hashlib.sha256((api_key or "").encode()).hexdigest()[:16]
+    return f"{provider}:{url or ''}:{digest}"
+
+# One limiter per set of credentials, shared by every model that uses them
+rate_limiters = {}
+
+def get_rate_limiter(key, requests_per_minute: int = None, input_tokens_per_minute: int = None, output_tokens_per_minute: int = None):
+    limiter = rate_limiters.get(key)
+    if limiter is None:
+        limiter = rate_limiters[key] = RateLimiter(requests_per_minute, input_tokens_per_minute, output_tokens_per_minute)
+    return limiter
@@ -0,0 +1,194 @@
+from journal import dumps
+from utils import normalize_args
+
+from collections import OrderedDict
+import copy
+import hashlib
+import json
+import os
+
+def to_data(value):
+    """
+    JSON-compatible copy of a provider response or MCP result: SDK objects
+    are dumped with their None fields, plain objects (SimpleNamespace,
+    dataclasses) through their attributes.
+    """
+    if isinstance(value, dict):
+        return {str(key): to_data(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_data(item) for item in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if hasattr(value, "model_dump"):
+        return to_data(value.model_dump(mode="json"))
+    if hasattr(value, "__dict__"):
+        return to_data({key: item for key, item in vars(value).items() if not key.startswith("_")})
+    return str(value)
+
+class Record(dict):
+    """
+    Decoded response: a dict whose keys can be read as attributes, so the
+    providers handle it like the SDK object it was dumped from, and the SDKs
+    accept it back as a plain dict when it is added to the history.
+    """
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+def to_record(data):
+    if isinstance(data, dict):
+        return Record((key, to_record(item)) for key, item in data.items())
+    if isinstance(data, list):
+        return [to_record(item) for item in data]
+    return data
+
+def hash_data(data):
+    text = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+class ResponseCache:
+    """
+    Content-addressed store of model responses on disk: one JSON file per
+    request key in directory. The least recently used entries are evicted
+    beyond max_entries. One instance can be shared by several models.
+    """
+
+    def __init__(self, directory: str, max_entries: int = 10000):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.entries = None
+        self.hits = 0
+        self.misses = 0
+
+    def get_path(self, key: str):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def load_entries(self):
+        """Index of the stored keys, least recently used first"""
+        if self.entries is None:
+            os.makedirs(self.directory, exist_ok=True)
+            names = [name for name in os.listdir(self.directory) if name.endswith(".json")]
+            names.sort(key=lambda name: os.path.getmtime(os.path.join(self.directory, name)))
+            self.entries = OrderedDict((name[:-len(".json")], None) for name in names)
+        return self.entries
+
+    def get(self, key: str):
+        entries = self.load_entries()
+        if key not in entries:
+            self.misses += 1
+            return None
+        path = self.get_path(key)
+        try:
+            with open(path, encoding="utf-8") as file:
+                data = json.load(file)
+            # The modification time keeps the recency across runs
+            os.utime(path)
+        except (OSError, ValueError):
+            del entries[key]
+            self.misses += 1
+            return None
+        entries.move_to_end(key)
+        self.hits += 1
+        return data
+
+    def put(self, key: str, data):
+        entries = self.load_entries()
+        path = self.get_path(key)
+        # Readers never see a partly written entry
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(data, file, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temporary, path)
+        entries[key] = None
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            old_key, _ = entries.popitem(last=False)
+            try:
+                os.remove(self.get_path(old_key))
+            except OSError:
+                pass
+
+    def clear(self):
+        for key in list(self.load_entries()):
+            try:
+                os.remove(self.get_path(key))
+            except OSError:
+                pass
+        self.entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self.load_entries())
+        }
+
+class CassetteMissError(LookupError):
+    """A replayed session made a request or a tool call that was not recorded"""
+
+class Cassette:
+    """
+    Recording of the model responses, MCP tool results and MCP listings of
+    one or more sessions, as JSON lines. In "record" mode everything is
+    appended to path as it happens; in "replay" mode path is loaded and
+    the same requests get the same answers, in recording order, without
+    calling the provider or the MCP server.
+    """
+
+    def __init__(self, path: str, mode: str = "replay"):
+        if mode not in ("record", "replay"):
+            raise ValueError("The cassette mode must be 'record' or 'replay'")
+        self.path = path
+        self.mode = mode
+        self.entries = {}
+        self.cursors = {}
+        self.file = None
+        if self.replaying:
+            self.load()
+
+    @property
+    def replaying(self):
+        return self.mode == "replay"
+
+    def load(self):
+        with open(self.path, encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    record = json.loads(line)
+                    self.entries.setdefault((record["kind"], record["key"]), []).append(record["data"])
+
+    def make_tool_key(self, tool_name: str, tool_args):
+        # normalize_args removes None values in place, so work on a copy
+        return hash_data([tool_name, normalize_args(copy.deepcopy(tool_args))])
+
+    def take(self, kind: str, key: str):
+        """Next recorded data for (kind, key); raises CassetteMissError when there is none"""
+        recorded = self.entries.get((kind, key), [])
+        cursor = self.cursors.get((kind, key), 0)
+        if cursor >= len(recorded):
+            raise CassetteMissError(f"No recorded {kind} for this request in {self.path}")
+        self.cursors[(kind, key)] = cursor + 1
+        return recorded[cursor]
+
+    def record(self, kind: str, key: str, data):
+        if self.file is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.file = open(self.path, "ab")
+        self.file.write(dumps({"kind": kind, "key": key, "data": data}))
+        self.file.flush()
+
+    def rewind(self):
+        """Replay again from the first recorded answers"""
+        self.cursors.clear()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,176 @@
+from email.utils import parsedate_to_datetime
+import asyncio
+import datetime
+import random
+import time
+
+# Rate limits, timeouts, conflicts and server errors are worth another try;
+# any other HTTP status (auth, invalid request, not found...) is not
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+# Words of the errors that report an exhausted quota or credit balance,
+# which usually arrive as 429 (openai, gemini) or 400 (anthropic)
+QUOTA_MARKERS = ("insufficient_quota", "quota", "credit balance", "billing")
+
+# Errors of the provider SDKs (openai, anthropic, httpx under google-genai)
+# raised when the request did not reach the server or got no answer in time
+TRANSPORT_ERROR_NAMES = {"APIConnectionError", "APITimeoutError", "TransportError", "TimeoutException"}
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit breaker is open"""
+    pass
+
+def get_status_code(error):
+    # openai and anthropic errors have status_code, google-genai errors have code
+    for status in (
+        getattr(error, "status_code", None),
+        getattr(error, "code", None),
+        getattr(getattr(error, "response", None), "status_code", None),
+    ):
+        if isinstance(status, int):
+            return status
+    return None
+
+def is_transport_error(error):
+    """True for connection errors and timeouts, which have no status code"""
+    if isinstance(error, (OSError, asyncio.TimeoutError, TimeoutError)):
+        return True
+    return any(cls.__name__ in TRANSPORT_ERROR_NAMES for cls in type(error).__mro__)
+
+def is_retryable(error):
+    status = get_status_code(error)
+    if status is None:
+        # Other errors without a status are bugs, not provider failures
+        return is_transport_error(error)
+    return status in RETRYABLE_STATUS_CODES or status >= 500
+
+def is_quota_error(error):
+    """True when error reports an exhausted quota or credit balance rather than a short rate limit"""
+    status = get_status_code(error)
+    if status == 402:
+        return True
+    if status not in (400, 403, 429):
+        return False
+    text = f"{error} {getattr(error, 'body', '')}".lower()
+    return any(marker in text for marker in QUOTA_MARKERS)
+
+def get_retry_after(error):
+    """Seconds to wait requested by the server through the rate-limit headers, if any"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if headers is None:
+        headers = getattr(error, "headers", None)
+    if not headers:
+        return None
+    try:
+        value = headers.get("retry-after-ms") or headers.get("Retry-After-Ms")
+        if value is not None:
+            return max(0.0, float(value) / 1000)
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            date = parsedate_to_datetime(value)
+            return max(0.0, (date - datetime.datetime.now(date.tzinfo)).total_seconds())
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+class CircuitBreaker:
+    """
+    Counts consecutive failures of a provider. After failure_threshold of
+    them the circuit opens and requests fail fast; after reset_timeout
+    seconds one request (the probe) is let through and its outcome closes
+    or reopens the circuit. A probe that never reports its outcome is
+    replaced by another one after reset_timeout seconds.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started_at = None
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        state = self.state
+        if state != "half_open":
+            return state == "closed"
+        now = self.clock()
+        if self.probe_started_at is not None and now - self.probe_started_at < self.reset_timeout:
+            return False
+        self.probe_started_at = now
+        return True
+
+    def remaining(self):
+        """Seconds before the open circuit lets a request through"""
+        if self.opened_at is None:
+            return 0
+        return max(0, self.reset_timeout - (self.clock() - self.opened_at))
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        self.probe_started_at = None
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.opened_at = self.clock()
+
+# One breaker per provider endpoint, shared by every model that uses it
+circuit_breakers = {}
+
+def get_circuit_breaker(key, failure_threshold: int = 5, reset_timeout: float = 30):
+    breaker = circuit_breakers.get(key)
+    if breaker is None:
+        breaker = circuit_breakers[key] = CircuitBreaker(failure_threshold, reset_timeout)
+    return breaker
+
+class RetryPolicy:
+    """
+    Retry settings shared by the create_message of every provider:
+    exponential backoff with full jitter, capped at max_delay, unless the
+    server asks for a specific wait through Retry-After.
+    """
+
+    def __init__(self, max_tries: int = 50, base_delay: float = 0.5, max_delay: float = 6, multiplier: float = 2, jitter: bool = True, respect_retry_after: bool = True, failure_threshold: int = 5, reset_timeout: float = 30, random=random.random, retry_quota: bool = True):
+        self.max_tries = max_tries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.respect_retry_after = respect_retry_after
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.random = random
+        self.retry_quota = retry_quota
+
+    def is_retryable(self, error):
+        if not self.retry_quota and is_quota_error(error):
+            return False
+        return is_retryable(error)
+
+    def get_delay(self, attempt: int, error=None):
+        """Seconds to wait after the given failed attempt (starting from 1)"""
+        if self.respect_retry_after and error is not None:
+            retry_after = get_retry_after(error)
+            if retry_after is not None:
+                return retry_after
+        delay = min(self.max_delay, self.base_delay * self.multiplier ** (attempt - 1))
+        if self.jitter:
+            delay *= self.random()
+        return delay
+
+    def get_circuit_breaker(self, key):
+        return get_circuit_breaker(key, self.failure_threshold, self.reset_timeout)
@@ -0,0 +1,96 @@
+from journal import Journal
+
+import asyncio
+import os
+import uuid
+
+class SessionManager:
+    """
+    Many independent conversations over one MCPClient. Every session is a
+    fork of the client's model: the connected fastmcp Client, the
+    discovered tools and the provider SDK client are shared, while each
+    session has its own message history. With a journal_dir, every session
+    is journaled to <journal_dir>/<session_id>.jsonl and can be resumed
+    after a restart.
+    """
+
+    def __init__(self, mcp_client, max_sessions: int = None, journal_dir: str = None):
+        self.mcp_client = mcp_client
+        self.max_sessions = max_sessions
+        self.journal_dir = journal_dir
+        self.sessions = {}
+        self.locks = {}
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def __contains__(self, session_id):
+        return session_id in self.sessions
+
+    def create_session(self, session_id: str = None, assistant_print=None, system_print=None, error_print=None):
+        """
+        Create a session and return its id. The prints default to the ones
+        of the MCPClient's model.
+        """
+        if session_id is None:
+            session_id = uuid.uuid4().hex
+        attributes = self.get_fork_attributes(session_id, assistant_print, system_print, error_print)
+        if self.journal_dir is not None:
+            attributes["journal"] = self.get_journal(session_id)
+        self.add_session(session_id, self.mcp_client.model.fork(**attributes))
+        return session_id
+
+    def resume_session(self, session_id: str, assistant_print=None, system_print=None, error_print=None):
+        """Recreate a session from its journal, e.g. after a restart"""
+        if self.journal_dir is None:
+            raise ValueError("Sessions can be resumed only with a journal_dir")
+        attributes = self.get_fork_attributes(session_id, assistant_print, system_print, error_print)
+        model = self.mcp_client.model.fork(**attributes)
+        if not model.resume(self.get_journal(session_id)):
+            raise ValueError(f"Session {session_id} has no journal")
+        self.add_session(session_id, model)
+        return session_id
+
+    def get_fork_attributes(self, session_id, assistant_print, system_print, error_print):
+        if session_id in self.sessions:
+            raise ValueError(f"Session {session_id} already exists")
+        if self.max_sessions is not None and len(self.sessions) >= self.max_sessions:
+            raise ValueError("Maximum number of sessions reached")
+
+        model = self.mcp_client.model
+        # The fork must use the connected client even if it was created later
+        attributes = {"client": self.mcp_client.client or model.client}
+        if assistant_print is not None:
+            attributes["assistant_print"] = assistant_print
+        if system_print is not None:
+            attributes["system_print"] = system_print
+        if error_print is not None:
+            attributes["error_print"] = error_print
+        return attributes
+
+    def get_journal(self, session_id: str):
+        return Journal(os.path.join(self.journal_dir, f"{session_id}.jsonl"))
+
+    def add_session(self, session_id, model):
+        self.sessions[session_id] = model
+        self.locks[session_id] = asyncio.Lock()
+        # Tools and prompts refreshed by the MCPClient reach the session too
+        self.mcp_client.add_fork(model)
+
+    def get_session(self, session_id: str):
+        """Return the model of the session"""
+        return self.sessions[session_id]
+
+    def close_session(self, session_id: str):
+        model = self.sessions.pop(session_id)
+        del self.locks[session_id]
+        self.mcp_client.remove_fork(model)
+        model.discard_background_summary()
+        if model.journal is not None:
+            model.journal.close()
+
+    async def process_query(self, session_id: str, query):
+        # Queries of the same session run one at a time, different sessions
+        # run concurrently
+        async with self.locks[session_id]:
+            await self.sessions[session_id].process_query(query)
@@ -1,6 +1,9 @@
+import asyncio
 import sys
 import types
 
+import pytest
+
 
 def _install_tiktoken_stub():
     mod = types.ModuleType("tiktoken")
@@ -26,9 +29,10 @@ def _install_fastmcp_stub():
         pass
 
     class Client:
-        def __init__(self, url=None, log_handler=None):
+        def __init__(self, url=None, log_handler=None, message_handler=None):
             self.url = url
             self.log_handler = log_handler
+            self.message_handler = message_handler
 
         # Minimal API used in code under test
         async def list_tools(self):
@@ -82,7 +86,22 @@ def _install_openai_stub():
             self.base_url = base_url
             self.chat = _Chat()
 
+    class _AsyncChatCompletions:
+        async def create(self, **kwargs):
+            return _ChatCompletions().create(**kwargs)
+
+    class _AsyncChat:
+        def __init__(self):
+            self.completions = _AsyncChatCompletions()
+
+    class AsyncOpenAI:
+        def __init__(self, api_key=None, base_url=None):
+            self.api_key = api_key
+            self.base_url = base_url
+            self.chat = _AsyncChat()
+
     mod.OpenAI = OpenAI
+    mod.AsyncOpenAI = AsyncOpenAI
     sys.modules["openai"] = mod
 
 
@@ -100,7 +119,17 @@ def _install_anthropic_stub():
             self.api_key = api_key
             self.messages = _Messages()
 
+    class _AsyncMessages:
+        async def create(self, **kwargs):
+            return _Messages().create(**kwargs)
+
+    class AsyncAnthropic:
+        def __init__(self, api_key=None):
+            self.api_key = api_key
+            self.messages = _AsyncMessages()
+
     mod.Anthropic = Anthropic
+    mod.AsyncAnthropic = AsyncAnthropic
     sys.modules["anthropic"] = mod
 
 
@@ -110,20 +139,53 @@ def _install_google_genai_stub():
     genai_mod = types.ModuleType("google.genai")
     types_mod = types.ModuleType("google.genai.types")
 
+    class FunctionCall:
+        def __init__(self, id=None, name=None, args=None):
+            self.id = id
+            self.name = name
+            self.args = args
+
+    class FunctionResponse:
+        def __init__(self, id=None, name=None, response=None):
+            self.id = id
+            self.name = name
+            self.response = response
+
     class Part:
-        def __init__(self, text=""):
+        def __init__(self, text="", function_call=None, function_response=None):
             self.text = text
+            self.function_call = function_call
+            self.function_response = function_response
+
+        def model_dump(self, mode=None, exclude_none=False):
+            return {"text": self.text}
 
     class Content:
         def __init__(self, role="user", parts=None):
             self.role = role
             self.parts = parts or []
 
+        def model_dump(self, mode=None, exclude_none=False):
+            return {"role": self.role, "parts": [part.model_dump() for part in self.parts]}
+
+        @classmethod
+        def model_validate(cls, data):
+            return cls(role=data["role"], parts=[Part(**part) for part in data["parts"]])
+
     class GenerateContentConfig:
-        def __init__(self, temperature=None, max_output_tokens=None, tools=None):
+        def __init__(self, temperature=None, max_output_tokens=None, tools=None, system_instruction=None, cached_content=None):
+            self.system_instruction = system_instruction
             self.temperature = temperature
             self.max_output_tokens = max_output_tokens
             self.tools = tools or []
+            self.cached_content = cached_content
+
+    class CreateCachedContentConfig:
+        def __init__(self, system_instruction=None, tools=None, ttl=None, contents=None):
+            self.system_instruction = system_instruction
+            self.tools = tools
+            self.ttl = ttl
+            self.contents = contents
 
     class _Client:
         def __init__(self, api_key=None):
@@ -163,8 +225,11 @@ def _install_google_genai_stub():
     setattr(google_pkg, "genai", genai_mod)
     setattr(genai_mod, "client", genai_client_mod)
     setattr(types_mod, "Part", Part)
+    setattr(types_mod, "FunctionCall", FunctionCall)
+    setattr(types_mod, "FunctionResponse", FunctionResponse)
     setattr(types_mod, "Content", Content)
     setattr(types_mod, "GenerateContentConfig", GenerateContentConfig)
+    setattr(types_mod, "CreateCachedContentConfig", CreateCachedContentConfig)
 
 
 _install_tiktoken_stub()
@@ -172,3 +237,108 @@ _install_fastmcp_stub()
 _install_openai_stub()
 _install_anthropic_stub()
 _install_google_genai_stub()
+
+import rate_limiter
+import retry
+
+
+@pytest.fixture(autouse=True)
+def clear_registries():
+    """Circuit breakers and rate limiters are shared per process: start every test without them"""
+    retry.circuit_breakers.clear()
+    rate_limiter.rate_limiters.clear()
+    yield
+    retry.circuit_breakers.clear()
+    rate_limiter.rate_limiters.clear()
+
+
+def model_kwargs(**overrides):
+    """Constructor arguments of a test model: one try, no waits and silent prints"""
+    defaults = dict(
+        format="openai",
+        max_tokens=1000,
+        temperature=0.1,
+        name="test",
+        url=None,
+        api_key="key",
+        system_prompt="system",
+        max_tries=1,
+        wait_seconds=0,
+        summarizer_system_prompt="sum sys",
+        summarizer_user_prompt="sum user",
+        summarizer_max_tokens=64,
+        summarizer_temperature=0.1,
+        assistant_print=lambda *_: None,
+        system_print=lambda *_: None,
+        error_print=lambda *_: None,
+    )
+    defaults.update(overrides)
+    return defaults
+
+
+class FakeClock:
+    """Clock that only moves when a test sets now or something sleeps on it"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+        await asyncio.sleep(0)
+
+
+def text_result(text):
+    return types.SimpleNamespace(content=[types.SimpleNamespace(type="text", text=text)], is_error=False)
+
+
+def tool_call(name, arguments="{}"):
+    return types.SimpleNamespace(id=f"call_{name}", type="function", function=types.SimpleNamespace(name=name, arguments=arguments))
+
+
+def choice(content=None, tool_calls=None):
+    message = types.SimpleNamespace(role="assistant", content=content, tool_calls=tool_calls)
+    return types.SimpleNamespace(choices=[types.SimpleNamespace(finish_reason="tool_calls" if tool_calls else "stop", message=message)])
+
+
+class FakeCompletions:
+    """
+    Chat completions that answer with the given choices in order, then with
+    answer(messages); the names of the tools sent are kept for every request
+    """
+
+    def __init__(self, *choices, answer=None):
+        self.choices = list(choices)
+        self.answer = answer
+        self.calls = 0
+        self.tools = []
+
+    async def create(self, messages, tools=None, **kwargs):
+        self.calls += 1
+        self.tools.append(None if tools is None else [schema["function"]["name"] for schema in tools])
+        if self.choices:
+            return self.choices.pop(0)
+        return self.answer(messages)
+
+
+class FakeServer:
+    """MCP client with the given tools that answers a call with outputs[name], by default "<name> done\""""
+
+    def __init__(self, tools=(), outputs=None):
+        self.tools = list(tools)
+        self.outputs = outputs or {}
+        self.calls = []
+
+    async def list_tools(self):
+        return list(self.tools)
+
+    async def list_prompts(self):
+        return []
+
+    async def call_tool(self, name, args):
+        self.calls.append(name)
+        return text_result(self.outputs.get(name, f"{name} done"))
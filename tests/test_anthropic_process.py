@@ -106,3 +106,155 @@ async def test_anthropic_process_query_tool_use_then_text():
     # Final assistant message appended
     assert model.messages[-1]["role"] == "assistant"
     assert model.messages[-1]["content"][0].type == "text"
+
+
+@pytest.mark.asyncio
+async def test_anthropic_create_message_awaits_async_client():
+    model = make_model()
+    captured = {}
+
+    class FakeMessages:
+        async def create(self, **kwargs):
+            captured.update(kwargs)
+            await asyncio.sleep(0)
+            return FakeResponse([FakeBlockText("ok")])
+
+    model.anthropic = pytypes.SimpleNamespace(messages=FakeMessages())
+
+    response = await asyncio.wait_for(model.create_message(), timeout=2.0)
+
+    assert response.content[0].text == "ok"
+    assert captured["system"] == "system"
+
+
+@pytest.mark.asyncio
+async def test_anthropic_streaming_prints_deltas_once():
+    printed = []
+    model = make_model(stream=True, assistant_print=printed.append)
+    model.check_summarize_needed = lambda *_: False
+
+    class FakeStream:
+        def __init__(self):
+            self.text_stream = self._texts()
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def _texts(self):
+            for text in ["hel", "lo"]:
+                yield text
+
+        async def get_final_message(self):
+            return FakeResponse([FakeBlockText("hello")])
+
+    class FakeMessages:
+        def stream(self, **kwargs):
+            return FakeStream()
+
+    model.anthropic = pytypes.SimpleNamespace(messages=FakeMessages())
+
+    await asyncio.wait_for(model.process_query("hi"), timeout=2.0)
+
+    assert printed == ["hel", "lo"]
+    assert model.messages[-1]["content"][0].text == "hello"
+
+
+@pytest.mark.asyncio
+async def test_anthropic_parallel_tool_uses_form_one_batch():
+    model = make_model()
+    model.check_summarize_needed = lambda *_: False
+    calls = {"n": 0}
+
+    async def seq_create_message():
+        if calls["n"] == 0:
+            calls["n"] += 1
+            return FakeResponse([
+                FakeBlockText("go"),
+                FakeBlockToolUse("slow", {}, "id1"),
+                FakeBlockToolUse("fast", {}, "id2"),
+            ])
+        return FakeResponse([FakeBlockText("final")])
+
+    model.create_message = seq_create_message
+
+    class FakeClient:
+        async def call_tool(self, name, args):
+            await asyncio.sleep(0.05 if name == "slow" else 0)
+            return pytypes.SimpleNamespace(content=[pytypes.SimpleNamespace(text=name)])
+
+    model.client = FakeClient()
+
+    await asyncio.wait_for(model.process_query("hi"), timeout=2.0)
+
+    # user query, assistant (text + 2 tool_use), user (2 tool_result), assistant (final)
+    assert [m["role"] for m in model.messages] == ["user", "assistant", "user", "assistant"]
+    assert [block.type for block in model.messages[1]["content"]] == ["text", "tool_use", "tool_use"]
+    results = model.messages[2]["content"]
+    assert [r["tool_use_id"] for r in results] == ["id1", "id2"]
+    assert [r["content"][0].text for r in results] == ["slow", "fast"]
+
+
+@pytest.mark.asyncio
+async def test_anthropic_create_message_reports_known_errors_without_retrying():
+    printed = []
+    model = make_model(error_print=printed.append)
+
+    class CreditError(Exception):
+        status_code = 400
+        body = {"type": "error", "error": {"type": "invalid_request_error", "message": "Your credit balance is too low to access the Anthropic API. Please go to Plans & Billing to upgrade or purchase credits."}}
+
+    class FakeMessages:
+        async def create(self, **kwargs):
+            raise CreditError()
+
+    model.anthropic = pytypes.SimpleNamespace(messages=FakeMessages())
+
+    with pytest.raises(CreditError):
+        await model.create_message()
+    assert printed == ["You have no Anthropic credits. Purchase more to continue"]
+
+
+@pytest.mark.asyncio
+async def test_anthropic_prompt_caching_sets_breakpoints_and_reports_usage():
+    model = make_model(prompt_caching=True)
+    model.available_tools = [{"name": "a", "input_schema": {}}, {"name": "b", "input_schema": {}}]
+    model.messages.extend([
+        {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": [FakeBlockToolUse("a", {}, "id1")]},
+        {"role": "user", "content": [{"type": "tool_result", "tool_use_id": "id1", "content": "x"}]},
+    ])
+    requests = []
+
+    class FakeMessages:
+        async def create(self, **kwargs):
+            requests.append(kwargs)
+            response = FakeResponse([FakeBlockText("ok")])
+            response.usage = pytypes.SimpleNamespace(
+                input_tokens=5, output_tokens=2, cache_read_input_tokens=900, cache_creation_input_tokens=40
+            )
+            return response
+
+    model.anthropic = pytypes.SimpleNamespace(messages=FakeMessages())
+    await model.create_message()
+    await model.create_message()
+
+    params = requests[0]
+    assert params["system"] == [{"type": "text", "text": "system", "cache_control": {"type": "ephemeral"}}]
+    assert "cache_control" not in params["tools"][0]
+    assert params["tools"][1]["cache_control"] == {"type": "ephemeral"}
+    assert params["messages"][-1]["content"][-1]["cache_control"] == {"type": "ephemeral"}
+    # The history keeps no breakpoint, so the next request moves it forward
+    assert "cache_control" not in model.messages[-1]["content"][-1]
+    assert model.available_tools[1] == {"name": "b", "input_schema": {}}
+    assert model.token_usage == {"input_tokens": 10, "output_tokens": 4, "cache_read_tokens": 1800, "cache_write_tokens": 80}
+
+
+def test_anthropic_request_params_without_prompt_caching():
+    model = make_model()
+    model.messages.append({"role": "user", "content": "hi"})
+    params = model.get_request_params()
+    assert params["system"] == "system"
+    assert params["messages"] is model.messages
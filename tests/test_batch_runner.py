@@ -0,0 +1,88 @@
+import asyncio
+import json
+import types
+
+import pytest
+
+from conftest import model_kwargs
+from batch_runner import BatchRunner, read_queries
+from mcp_client import MCPClient
+from models.openai import OpenAIModel
+
+
+class FakeError(Exception):
+    status_code = 400
+
+
+class FakeCompletions:
+    """Answers "echo <query>" after the delay named in the query ("slow" or not)"""
+
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+
+    async def create(self, messages, **kwargs):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        query = messages[-1]["content"]
+        await asyncio.sleep(0.2 if query.startswith("slow") else 0.01)
+        self.active -= 1
+        if query == "boom":
+            raise FakeError("invalid request")
+        message = types.SimpleNamespace(content=f"echo {query}", tool_calls=[])
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(finish_reason="stop", message=message)])
+
+
+async def make_runner(**kwargs):
+    model = OpenAIModel(**model_kwargs(url="http://localhost:8000/mcp"))
+    completions = FakeCompletions()
+    model.openai = types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions))
+    mcp_client = MCPClient(model)
+    mcp_client.get_client()
+    await mcp_client.init()
+    return BatchRunner(mcp_client, **kwargs), completions
+
+
+@pytest.mark.asyncio
+async def test_queries_run_as_independent_sessions_with_bounded_concurrency():
+    runner, completions = await make_runner(concurrency=5)
+    records = await asyncio.wait_for(runner.run_all(f"q{n}" for n in range(20)), timeout=2)
+
+    assert sorted(record["id"] for record in records) == sorted(str(n) for n in range(20))
+    assert all(record["answer"] == f"echo {record['query']}" for record in records)
+    assert completions.peak == 5
+    # Every session was closed and the shared model was left untouched
+    assert len(runner.sessions) == 0
+    assert [m["content"] for m in runner.sessions.mcp_client.model.messages] == ["system"]
+
+
+@pytest.mark.asyncio
+async def test_results_are_yielded_as_they_complete():
+    runner, _ = await make_runner(concurrency=2)
+    order = [record["query"] async for record in runner.run(["slow", "fast 1", "fast 2"])]
+    assert order == ["fast 1", "fast 2", "slow"]
+
+
+@pytest.mark.asyncio
+async def test_resume_skips_the_queries_that_succeeded(tmp_path):
+    output = str(tmp_path / "results.jsonl")
+    runner, _ = await make_runner(output_path=output)
+    records = await runner.run_all(["a", "boom", "b"])
+    assert (runner.completed, runner.failed) == (2, 1)
+    assert next(record for record in records if record["query"] == "boom")["error"].startswith("FakeError")
+
+    # An interruption can leave a torn last line
+    with open(output, "ab") as file:
+        file.write(b'{"id": "2", "que')
+    runner, completions = await make_runner(output_path=output)
+    records = await runner.run_all(["a", "boom", "b", "c"])
+    assert sorted(record["query"] for record in records) == ["boom", "c"]
+    assert runner.skipped == 2
+    with open(output, "rb") as file:
+        assert len(file.read().splitlines()) == 5
+
+
+def test_read_queries_accepts_text_and_json_lines(tmp_path):
+    path = tmp_path / "queries.txt"
+    path.write_text("first question\n\n" + json.dumps({"id": "q-7", "query": "second"}) + "\n{not json\n", encoding="utf-8")
+    assert list(read_queries(str(path))) == [("1", "first question"), ("q-7", "second"), ("4", "{not json")]
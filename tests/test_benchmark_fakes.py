@@ -0,0 +1,54 @@
+import types
+
+import pytest
+
+from conftest import model_kwargs
+from benchmarks.fakes import QUERY_MARKER, SUMMARY_TEXT, FakeConfig, install_fake_client
+from models.anthropic import AnthropicModel
+from models.gemini import GeminiModel
+from models.openai import OpenAIModel
+from models.openai_responses import OpenAIResponsesModel
+
+
+class FakeMCPClient:
+    def __init__(self):
+        self.calls = []
+        # Passed as tool by GeminiModel
+        self.session = object()
+
+    async def call_tool(self, name, args):
+        self.calls.append((name, args))
+        return types.SimpleNamespace(content=[types.SimpleNamespace(text="value")])
+
+
+def make_model(model_class, format, printed):
+    m = model_class(**model_kwargs(format=format, max_tokens=100000, assistant_print=printed.append))
+    m.init()
+    m.init_tools([])
+    # The tool list only needs to be non empty for the fakes
+    m.available_tools = m.available_tools or ["lookup"]
+    m.client = FakeMCPClient()
+    return m
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("model_class,format", [
+    (OpenAIModel, "openai"),
+    (OpenAIResponsesModel, "openai-responses"),
+    (AnthropicModel, "anthropic"),
+    (GeminiModel, "gemini"),
+])
+async def test_fake_clients_drive_a_full_turn(model_class, format):
+    printed = []
+    model = make_model(model_class, format, printed)
+    config = FakeConfig(latency=0, fan_out=3, response_size=40)
+    install_fake_client(model, config)
+
+    await model.process_query(f"{QUERY_MARKER} 1")
+
+    assert [name for name, _ in model.client.calls] == ["lookup"] * 3
+    assert config.requests == 2
+    assert config.payload_chars > 0
+    assert printed == [config.answer_text()]
+
+    assert await model.create_summary(list(model.messages)) == SUMMARY_TEXT
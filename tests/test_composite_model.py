@@ -0,0 +1,215 @@
+import asyncio
+import json
+import types as pytypes
+
+import pytest
+
+from composite_model import CompositeModel
+from conftest import model_kwargs
+from google.genai import types
+from model_factory import ModelFactory
+from models.anthropic import AnthropicModel, anthropic_message_to_chat_message, chat_messages_to_anthropic_messages
+from models.gemini import GeminiModel, chat_messages_to_gemini_contents, gemini_response_to_chat_message
+from models.openai import OpenAIModel
+from tracing import InMemoryTracer
+
+
+class QuotaError(Exception):
+    status_code = 429
+    body = {"error": {"code": "insufficient_quota"}}
+
+
+def make_member(model_class, format, responses, delay=0):
+    """Member whose requests return (or raise) the given responses in order"""
+    member = model_class(**model_kwargs(format=format, name=format))
+    member.requests = []
+
+    async def request_message():
+        member.requests.append(list(member.messages))
+        await asyncio.sleep(delay)
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    member.request_message = request_message
+    return member
+
+
+def make_composite(members, **overrides):
+    model = CompositeModel(members=members, **model_kwargs(format="composite", **overrides))
+    model.init()
+    model.init_tools([])
+    return model
+
+
+def openai_choice(content=None, tool_calls=None):
+    return pytypes.SimpleNamespace(
+        finish_reason="tool_calls" if tool_calls else "stop",
+        message=pytypes.SimpleNamespace(role="assistant", content=content, tool_calls=tool_calls)
+    )
+
+
+def anthropic_message(*blocks):
+    return pytypes.SimpleNamespace(content=[pytypes.SimpleNamespace(**block) for block in blocks])
+
+
+TOOL_TURN = [
+    {"role": "system", "content": "summary"},
+    {"role": "user", "content": "weather?"},
+    {"role": "assistant", "content": "checking", "tool_calls": [
+        {"id": "call_1", "type": "function", "function": {"name": "weather", "arguments": '{"city": "Rome"}'}},
+        {"id": "call_2", "type": "function", "function": {"name": "weather", "arguments": '{"city": "Milan"}'}},
+    ]},
+    {"role": "tool", "tool_call_id": "call_1", "name": "weather", "content": "sunny"},
+    {"role": "tool", "tool_call_id": "call_2", "name": "weather", "content": "rainy"},
+]
+
+
+def test_chat_messages_become_anthropic_messages():
+    assert chat_messages_to_anthropic_messages(TOOL_TURN) == [
+        {"role": "user", "content": "summary"},
+        {"role": "user", "content": "weather?"},
+        {"role": "assistant", "content": [
+            {"type": "text", "text": "checking"},
+            {"type": "tool_use", "id": "call_1", "name": "weather", "input": {"city": "Rome"}},
+            {"type": "tool_use", "id": "call_2", "name": "weather", "input": {"city": "Milan"}},
+        ]},
+        {"role": "user", "content": [
+            {"type": "tool_result", "tool_use_id": "call_1", "content": "sunny"},
+            {"type": "tool_result", "tool_use_id": "call_2", "content": "rainy"},
+        ]},
+    ]
+    message = anthropic_message_to_chat_message(anthropic_message(
+        {"type": "text", "text": "checking"},
+        {"type": "tool_use", "id": "toolu_1", "name": "weather", "input": {"city": "Rome"}},
+    ))
+    assert message == {"role": "assistant", "content": "checking", "tool_calls": [
+        {"id": "toolu_1", "type": "function", "function": {"name": "weather", "arguments": '{"city": "Rome"}'}}
+    ]}
+
+
+def test_chat_messages_become_gemini_contents():
+    contents = chat_messages_to_gemini_contents(TOOL_TURN)
+    assert [content.role for content in contents] == ["user", "user", "model", "user"]
+    call = contents[2].parts[2].function_call
+    assert (call.id, call.name, call.args) == ("call_2", "weather", {"city": "Milan"})
+    result = contents[3].parts[1].function_response
+    assert (result.id, result.name, result.response) == ("call_2", "weather", {"result": "rainy"})
+
+    response = pytypes.SimpleNamespace(candidates=[pytypes.SimpleNamespace(content=types.Content(role="model", parts=[
+        types.Part(function_call=types.FunctionCall(name="weather", args={"city": "Rome"}))
+    ]))])
+    (tool_call,) = gemini_response_to_chat_message(response)["tool_calls"]
+    assert tool_call["id"].startswith("call_") and json.loads(tool_call["function"]["arguments"]) == {"city": "Rome"}
+
+
+@pytest.mark.asyncio
+async def test_slow_primary_is_hedged_on_the_next_member():
+    tracer = InMemoryTracer()
+    primary = make_member(OpenAIModel, "openai", [openai_choice("late")], delay=10)
+    secondary = make_member(AnthropicModel, "anthropic", [anthropic_message({"type": "text", "text": "hedged"})])
+    model = make_composite([primary, secondary], hedge_delay=0.01, tracer=tracer)
+    model.messages.append({"role": "user", "content": "hi"})
+
+    assert await model.create_message() == {"role": "assistant", "content": "hedged"}
+    (span,) = tracer.find("hedged_request")
+    assert span.attributes["member"] == "anthropic" and span.attributes["hedges"] == 1
+    # Anthropic got the history in its own format, without the system prompt
+    assert secondary.requests == [[{"role": "user", "content": "hi"}]]
+
+
+@pytest.mark.asyncio
+async def test_quota_error_fails_over_at_once():
+    tracer = InMemoryTracer()
+    primary = make_member(OpenAIModel, "openai", [QuotaError("insufficient_quota")])
+    primary.retry_policy.max_tries = 5
+    secondary = make_member(OpenAIModel, "openai", [openai_choice("backup")])
+    secondary.url = "http://backup"
+    model = make_composite([primary, secondary], hedge_delay=10, tracer=tracer)
+    model.messages.append({"role": "user", "content": "hi"})
+
+    assert await asyncio.wait_for(model.create_message(), 1) == {"role": "assistant", "content": "backup"}
+    # The quota error was not retried on the primary
+    assert len(primary.requests) == 1
+    assert tracer.find("hedged_request")[0].attributes["failovers"] == 1
+
+
+@pytest.mark.asyncio
+async def test_last_error_is_raised_when_every_member_fails():
+    members = [
+        make_member(OpenAIModel, "openai", [QuotaError("insufficient_quota")]),
+        make_member(GeminiModel, "gemini", [QuotaError("quota exceeded")]),
+    ]
+    model = make_composite(members)
+    model.messages.append({"role": "user", "content": "hi"})
+    with pytest.raises(QuotaError, match="quota exceeded"):
+        await model.create_message()
+
+
+@pytest.mark.asyncio
+async def test_tool_loop_across_members_keeps_every_history_in_sync():
+    primary = make_member(AnthropicModel, "anthropic", [
+        anthropic_message({"type": "tool_use", "id": "toolu_1", "name": "echo", "input": {"text": "ping"}}),
+        QuotaError("credit balance is too low"),
+    ])
+    secondary = make_member(OpenAIModel, "openai", [openai_choice("pong")])
+    printed = []
+    model = make_composite([primary, secondary], assistant_print=printed.append)
+
+    async def call_tool(name, args):
+        return pytypes.SimpleNamespace(content=[pytypes.SimpleNamespace(type="text", text=args["text"])])
+
+    model.call_tool = call_tool
+    await model.process_query("echo ping")
+
+    assert printed == ["pong"]
+    assert [message["role"] for message in model.messages] == ["system", "user", "assistant", "tool", "assistant"]
+    # The OpenAI member saw the tool call made by Anthropic
+    (history,) = secondary.requests
+    assert history[2]["tool_calls"][0]["id"] == "toolu_1" and history[3]["content"] == "ping"
+    # The second Anthropic request only appended the tool result
+    assert primary.requests[1][-1]["content"][0] == {"type": "tool_result", "tool_use_id": "toolu_1", "content": "ping"}
+
+
+def test_fork_forks_the_members():
+    members = [make_member(OpenAIModel, "openai", []), make_member(GeminiModel, "gemini", [])]
+    model = make_composite(members)
+    fork = model.fork()
+    assert all(a is not b for a, b in zip(fork.members, model.members))
+    assert fork.members[1].gemini is model.members[1].gemini
+    assert fork.client is model.client
+
+
+def test_fork_passes_the_prints_and_the_client_to_the_members():
+    members = [make_member(OpenAIModel, "openai", []), make_member(GeminiModel, "gemini", [])]
+    model = make_composite(members)
+    errors = []
+    client = pytypes.SimpleNamespace(session=object())
+    fork = model.fork(error_print=errors.append, client=client)
+    assert fork.client is client and "client" not in fork.__dict__
+    assert all(member.client is client and member.error_print == errors.append for member in fork.members)
+    # The parent keeps its own
+    assert model.client is not client
+    assert all(member.error_print != errors.append for member in model.members)
+
+
+def test_factory_builds_a_composite_with_fallbacks():
+    def make_factory(configure):
+        factory = ModelFactory()
+        configure(factory)
+        factory.set_max_tokens(1000)
+        factory.set_temperature(0.1)
+        factory.set_prints(lambda *_: None, lambda *_: None, lambda *_: None)
+        factory.set_summarizer_max_tokens(64)
+        factory.set_summarizer_language("english")
+        return factory
+
+    factory = make_factory(lambda f: (f.set_openai_api_key("k"), f.set_name("gpt-test")))
+    factory.set_fallbacks([make_factory(lambda f: (f.set_anthropic_api_key("k"), f.set_name("claude-test")))])
+    factory.set_hedge_delay(2)
+    model = factory.build()
+    assert isinstance(model, CompositeModel) and model.hedge_delay == 2
+    assert [type(member) for member in model.members] == [OpenAIModel, AnthropicModel]
+    with pytest.raises(ValueError):
+        factory.set_hedge_delay(-1)
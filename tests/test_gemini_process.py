@@ -19,12 +19,12 @@ class FakeCandidateStop:
 
 
 class FakeCandidateTool:
-    def __init__(self, name="echo", args='{"text":"hi"}', text=""):
-        self.finish_reason = "CALL_FUNCTION"
-        # parts that include a function_call object
-        func_call = pytypes.SimpleNamespace(name=name, args=args)
-        self.content = [pytypes.SimpleNamespace(function_call=func_call)]
-        self.text = text
+    def __init__(self, name="echo", args=None, text=""):
+        # Gemini ends a turn with function calls with STOP as well
+        self.finish_reason = "STOP"
+        parts = [types.Part(text=text)] if text else []
+        parts.append(types.Part(function_call=types.FunctionCall(id=f"call_{name}", name=name, args=args or {"text": "hi"})))
+        self.content = types.Content(role="model", parts=parts)
 
 
 def make_model(**overrides):
@@ -82,7 +82,7 @@ async def test_gemini_process_query_tool_call_then_stop():
     async def seq_create_message():
         if calls["n"] == 0:
             calls["n"] += 1
-            return FakeResponse([FakeCandidateTool(name="echo", args='{"text":"hi"}', text="")])
+            return FakeResponse([FakeCandidateTool(name="echo")])
         return FakeResponse([FakeCandidateStop(text="final")])
 
     model.create_message = seq_create_message
@@ -103,11 +103,138 @@ async def test_gemini_process_query_tool_call_then_stop():
 
     await asyncio.wait_for(model.process_query("hello"), timeout=2.0)
 
-    # A user message carrying tool output should be present
-    user_msgs = [m for m in model.messages if isinstance(m, types.Content) and m.role == "user"]
-    assert user_msgs and "called echo" in user_msgs[-1].parts[0].text
+    # The call is kept in the history and answered by a function response
+    call, result = model.messages[-3], model.messages[-2]
+    assert call.role == "model" and call.parts[0].function_call.name == "echo"
+    response = result.parts[0].function_response
+    assert result.role == "user" and response.id == "call_echo"
+    assert "called echo" in response.response["result"]
 
     # Final model message appended
     assert isinstance(model.messages[-1], types.Content)
     assert model.messages[-1].role == "model"
     assert model.messages[-1].parts[0].text == "final"
+
+
+@pytest.mark.asyncio
+async def test_gemini_streaming_prints_deltas_and_rebuilds_message():
+    printed = []
+    model = make_model(stream=True, assistant_print=printed.append)
+    model.check_summarize_needed = lambda *_: False
+    model.client = pytypes.SimpleNamespace(session=object())
+
+    def chunk(text, output_tokens, finish_reason=None):
+        content = types.Content(role="model", parts=[types.Part(text=text)])
+        usage = pytypes.SimpleNamespace(prompt_token_count=12, candidates_token_count=output_tokens)
+        return pytypes.SimpleNamespace(candidates=[pytypes.SimpleNamespace(content=content, finish_reason=finish_reason)], usage_metadata=usage)
+
+    async def generate_content_stream(model=None, contents=None, config=None):
+        async def gen():
+            yield chunk("ci", 1)
+            yield chunk("ao", 2, finish_reason="STOP")
+        return gen()
+
+    model.gemini = pytypes.SimpleNamespace(aio=pytypes.SimpleNamespace(
+        models=pytypes.SimpleNamespace(generate_content_stream=generate_content_stream)
+    ))
+
+    await asyncio.wait_for(model.process_query("hello"), timeout=2.0)
+
+    assert printed == ["ci", "ao"]
+    assert model.messages[-1].role == "model"
+    assert model.messages[-1].parts[0].text == "ciao"
+    # The usage reported by the last chunk is counted
+    assert model.token_usage["input_tokens"] == 12 and model.token_usage["output_tokens"] == 2
+
+
+class FakeCachingClient:
+    """Local stand-in of the google-genai client with cached contents"""
+
+    def __init__(self, fail_caches=False, responses=()):
+        self.fail_caches = fail_caches
+        self.responses = list(responses)
+        self.caches_created = []
+        self.requests = []
+        self.aio = pytypes.SimpleNamespace(
+            models=pytypes.SimpleNamespace(generate_content=self.generate_content),
+            caches=pytypes.SimpleNamespace(create=self.create_cache)
+        )
+
+    async def create_cache(self, model=None, config=None):
+        if self.fail_caches:
+            raise RuntimeError("cached content is too small")
+        self.caches_created.append(config)
+        return pytypes.SimpleNamespace(name=f"cachedContents/{len(self.caches_created)}")
+
+    async def generate_content(self, model=None, contents=None, config=None):
+        self.requests.append((list(contents), config))
+        if self.responses:
+            return FakeResponse([self.responses.pop(0)])
+        return FakeResponse([FakeCandidateStop("ok")])
+
+
+@pytest.mark.asyncio
+async def test_gemini_prompt_caching_reuses_and_refreshes_cached_content():
+    model = make_model(prompt_caching=True)
+    model.check_summarize_needed = lambda *_: False
+    model.client = pytypes.SimpleNamespace(session=object())
+    model.gemini = FakeCachingClient()
+    model.init_tools([pytypes.SimpleNamespace(name="echo", description="Echo", input_schema={"type": "object"})])
+
+    await model.process_query("one")
+    await model.process_query("two")
+
+    assert len(model.gemini.caches_created) == 1
+    cache = model.gemini.caches_created[0]
+    assert cache.system_instruction == "system"
+    assert cache.tools[0]["function_declarations"][0]["name"] == "echo"
+    contents, config = model.gemini.requests[-1]
+    # The system prompt and the tools come from the cache
+    assert config.cached_content == "cachedContents/1" and config.tools == []
+    assert contents[0].parts[0].text == "one"
+
+    model.set_system("new system")
+    await model.process_query("three")
+    assert len(model.gemini.caches_created) == 2
+    assert model.gemini.caches_created[1].system_instruction == "new system"
+    assert model.gemini.requests[-1][1].cached_content == "cachedContents/2"
+
+
+@pytest.mark.asyncio
+async def test_gemini_prompt_caching_falls_back_when_cache_fails():
+    model = make_model(prompt_caching=True)
+    model.check_summarize_needed = lambda *_: False
+    session = object()
+    model.client = pytypes.SimpleNamespace(session=session)
+    model.gemini = FakeCachingClient(fail_caches=True)
+
+    await model.process_query("one")
+
+    contents, config = model.gemini.requests[-1]
+    assert config.cached_content is None and config.tools == [session]
+    assert contents[0].parts[0].text == "system"
+
+
+@pytest.mark.asyncio
+async def test_gemini_function_calls_are_run_with_prompt_caching():
+    printed = []
+    model = make_model(prompt_caching=True, assistant_print=printed.append)
+    model.check_summarize_needed = lambda *_: False
+    calls = []
+
+    async def call_tool(name, args):
+        calls.append((name, args))
+        return pytypes.SimpleNamespace(content=[pytypes.SimpleNamespace(text="echoed")])
+
+    model.client = pytypes.SimpleNamespace(session=object(), call_tool=call_tool)
+    # Without the session as tool the SDK does not call the functions itself
+    model.gemini = FakeCachingClient(responses=[FakeCandidateTool(name="echo"), FakeCandidateStop("done")])
+    model.init_tools([pytypes.SimpleNamespace(name="echo", description="Echo", input_schema={"type": "object"})])
+
+    await model.process_query("hello")
+
+    assert calls == [("echo", {"text": "hi"})]
+    assert printed == ["done"]
+    contents, config = model.gemini.requests[-1]
+    assert config.cached_content is not None
+    assert contents[-1].parts[0].function_response.response == {"result": "echoed"}
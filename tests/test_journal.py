@@ -0,0 +1,213 @@
+import pytest
+
+import journal as journal_module
+from conftest import model_kwargs
+from google.genai import types
+from journal import Journal
+from models.anthropic import AnthropicModel
+from models.gemini import GeminiModel
+from models.openai import OpenAIModel
+
+
+def make_model(model_class=OpenAIModel, **overrides):
+    m = model_class(**model_kwargs(**overrides))
+    m.init()
+    m.init_tools([])
+    return m
+
+
+def turn(n):
+    return [
+        {"role": "user", "content": f"question {n}"},
+        {"role": "assistant", "content": f"answer {n}"},
+    ]
+
+
+def test_resume_restores_messages_and_token_counts_without_counting(tmp_path):
+    path = str(tmp_path / "session.jsonl")
+    model = make_model()
+    model.set_journal(Journal(path))
+    for n in range(50):
+        model.messages.extend(turn(n))
+    model.set_system("new system")
+    model.messages.extend(turn(3))
+    model.journal.close()
+
+    resumed = make_model()
+    counted = []
+    count_message = resumed.token_counter.count_message
+    resumed.token_counter.count_message = lambda message: counted.append(message) or count_message(message)
+    assert resumed.resume(Journal(path))
+    assert counted == []
+    assert resumed.messages == model.messages
+    assert resumed.messages.token_counts == model.messages.token_counts
+    assert resumed.get_token_count() == model.get_token_count()
+    # The journal goes on from the resumed history
+    resumed.messages.append({"role": "user", "content": "more"})
+    resumed.journal.close()
+    assert Journal(path).load()[0][-1] == {"role": "user", "content": "more"}
+
+
+@pytest.mark.asyncio
+async def test_summary_checkpoint_compacts_and_is_not_summarized_again(tmp_path):
+    path = str(tmp_path / "session.jsonl")
+    model = make_model()
+    model.set_journal(Journal(path))
+    model.messages.extend(turn(1) + turn(2))
+
+    async def fake_create_summary(messages):
+        return "summary"
+
+    model.create_summary = fake_create_summary
+    await model.summarize()
+    model.messages.extend(turn(3))
+    model.journal.close()
+
+    resumed = make_model()
+    resumed.resume(Journal(path))
+    assert resumed.messages == [
+        {"role": "system", "content": "system"},
+        {"role": "system", "content": "summary"},
+    ] + turn(2) + turn(3)
+    # The running summary is recognised, so only turn 2 is left to fold in
+    assert resumed.summarized_history is resumed.messages
+    assert resumed.get_summary_cut() == 4
+    # The lines before the last checkpoint were dropped
+    with open(path, "rb") as file:
+        lines = file.read().splitlines()
+    assert lines[0].startswith(journal_module.CHECKPOINT_PREFIX) and len(lines) == 3
+
+
+
+@pytest.mark.asyncio
+async def test_changes_after_a_summary_keep_it_recognised(tmp_path):
+    path = str(tmp_path / "session.jsonl")
+    model = make_model()
+    model.set_journal(Journal(path))
+    model.messages.extend(turn(1) + turn(2))
+
+    async def fake_create_summary(messages):
+        return "summary"
+
+    model.create_summary = fake_create_summary
+    await model.summarize()
+    # An in-place change (e.g. a refresh of the prompts) writes a checkpoint
+    model.set_system("new system")
+    model.messages.extend(turn(3))
+    model.journal.close()
+
+    resumed = make_model()
+    resumed.resume(Journal(path))
+    assert resumed.messages[0] == {"role": "system", "content": "new system"}
+    assert resumed.summarized_history is resumed.messages
+    assert resumed.get_summary_cut() == 4
+
+def test_anthropic_blocks_are_journaled_as_plain_dicts(tmp_path):
+    path = str(tmp_path / "session.jsonl")
+    model = make_model(AnthropicModel, format="anthropic")
+    model.set_journal(Journal(path))
+
+    class Block:
+        def __init__(self, **fields):
+            self.fields = fields
+
+        def model_dump(self, mode=None, exclude_none=False):
+            return {k: v for k, v in self.fields.items() if v is not None or not exclude_none}
+
+    model.messages.append({"role": "assistant", "content": [
+        Block(type="text", text="looking", citations=None),
+        Block(type="tool_use", id="1", name="f", input={"a": 1}),
+    ]})
+    model.messages.append({"role": "user", "content": [
+        {"type": "tool_result", "tool_use_id": "1", "content": [Block(type="text", text="out")]}
+    ]})
+    model.journal.close()
+
+    resumed = make_model(AnthropicModel, format="anthropic")
+    resumed.resume(Journal(path))
+    assert resumed.messages[0]["content"] == [
+        {"type": "text", "text": "looking"},
+        {"type": "tool_use", "id": "1", "name": "f", "input": {"a": 1}},
+    ]
+    assert resumed.is_tool_result(resumed.messages[1])
+
+
+def test_gemini_contents_are_decoded(tmp_path):
+    path = str(tmp_path / "session.jsonl")
+    model = make_model(GeminiModel, format="gemini")
+    model.set_journal(Journal(path))
+    model.messages.append(types.Content(role="user", parts=[types.Part(text="ciao")]))
+    model.journal.close()
+
+    resumed = make_model(GeminiModel, format="gemini")
+    resumed.resume(Journal(path))
+    assert isinstance(resumed.messages[-1], types.Content)
+    assert resumed.messages[-1].parts[0].text == "ciao"
+
+
+def test_torn_last_line_is_skipped(tmp_path):
+    path = str(tmp_path / "session.jsonl")
+    model = make_model()
+    model.set_journal(Journal(path))
+    model.messages.extend(turn(1))
+    model.journal.close()
+    with open(path, "ab") as file:
+        file.write(b'{"m":{"role":"user","cont')
+
+    resumed = make_model()
+    resumed.resume(Journal(path))
+    assert resumed.messages[1:] == turn(1)
+
+
+def test_torn_checkpoint_keeps_the_previous_history(tmp_path):
+    path = str(tmp_path / "session.jsonl")
+    model = make_model()
+    model.set_journal(Journal(path))
+    model.messages.extend(turn(1))
+    model.journal.close()
+    with open(path, "ab") as file:
+        file.write(b'{"c":[{"role":"system","content":"sys')
+
+    resumed = make_model()
+    assert resumed.resume(Journal(path))
+    assert resumed.messages == model.messages
+    # The file was not compacted down to the torn line
+    resumed.journal.close()
+    assert make_model().resume(Journal(path))
+
+
+def test_messages_after_a_torn_line_are_not_lost(tmp_path):
+    path = str(tmp_path / "session.jsonl")
+    with open(path, "wb") as file:
+        file.write(b'{"m":{"role":"user","content":"question 1"},"t":3}\n{"m":{"role":"assist')
+
+    journal = Journal(path)
+    assert journal.load() == ([{"role": "user", "content": "question 1"}], [3], False)
+    journal.append({"role": "assistant", "content": "answer 1"}, 3)
+    journal.close()
+    messages, token_counts, _ = Journal(path).load()
+    assert messages == [{"role": "user", "content": "question 1"}, {"role": "assistant", "content": "answer 1"}]
+    assert token_counts == [3, 3]
+
+
+def test_fsyncs_are_batched(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr(journal_module.os, "fsync", synced.append)
+    journal = Journal(str(tmp_path / "session.jsonl"), sync_every=3, sync_interval=60)
+    for n in range(7):
+        journal.append({"role": "user", "content": str(n)}, 1)
+    assert len(synced) == 2
+    journal.sync()
+    assert len(synced) == 3
+    journal.sync()
+    assert len(synced) == 3
+
+
+def test_forks_do_not_share_the_journal(tmp_path):
+    model = make_model()
+    model.set_journal(Journal(str(tmp_path / "session.jsonl")))
+    fork = model.fork()
+    assert fork.journal is None
+    fork.messages.append({"role": "user", "content": "only in the fork"})
+    model.journal.close()
+    assert Journal(model.journal.path).load()[0] == [{"role": "system", "content": "system"}]
@@ -0,0 +1,147 @@
+import asyncio
+import types as pytypes
+
+import pytest
+
+from conftest import model_kwargs
+from manifest_cache import ManifestCache
+from mcp_client import MCPClient
+from models.openai import OpenAIModel
+from session_manager import SessionManager
+from tracing import InMemoryTracer
+
+
+def tool(name):
+    return pytypes.SimpleNamespace(name=name, description=f"{name} tool", input_schema={"type": "object"})
+
+
+def prompt(name):
+    return pytypes.SimpleNamespace(name=name, description=f"{name} prompt")
+
+
+class FakeServer:
+    """MCP client whose lists take delay seconds and can be changed"""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.tools = [tool("weather")]
+        self.prompts = [prompt("forecast")]
+        self.listed = []
+        self.initialize_result = pytypes.SimpleNamespace(serverInfo={"name": "fake", "version": "1.0"})
+
+    async def list_tools(self):
+        self.listed.append("tools")
+        await asyncio.sleep(self.delay)
+        return list(self.tools)
+
+    async def list_prompts(self):
+        self.listed.append("prompts")
+        await asyncio.sleep(self.delay)
+        return list(self.prompts)
+
+
+def make_client(server, cache=None, tracer=None):
+    model = OpenAIModel(**model_kwargs(url="http://localhost:8000/mcp", tracer=tracer))
+    model.init()
+    mcp_client = MCPClient(model)
+    mcp_client.client = model.client = server
+    mcp_client.set_manifest_cache(cache)
+    return mcp_client
+
+
+def tool_names(mcp_client):
+    return [schema["function"]["name"] for schema in mcp_client.model.available_tools]
+
+
+@pytest.mark.asyncio
+async def test_tools_and_prompts_are_listed_concurrently():
+    tracer = InMemoryTracer()
+    mcp_client = make_client(FakeServer(delay=0.1), tracer=tracer)
+    await mcp_client.init()
+    (list_tools,) = tracer.find("list_tools")
+    (list_prompts,) = tracer.find("list_prompts")
+    assert list_prompts.start < list_tools.end
+    assert list_tools.parent.name == "discover"
+    assert tool_names(mcp_client) == ["weather"]
+    assert mcp_client.model.system == "system\nThe following commands are available: /forecast - forecast prompt"
+
+
+@pytest.mark.asyncio
+async def test_cached_manifest_is_used_at_once_and_revalidated(tmp_path):
+    cache = ManifestCache(str(tmp_path))
+    await make_client(FakeServer(), cache).init()
+
+    server = FakeServer(delay=10)
+    server.tools.append(tool("news"))
+    mcp_client = make_client(server, cache)
+    # The slow server is not waited for
+    await asyncio.wait_for(mcp_client.init(), 1)
+    assert tool_names(mcp_client) == ["weather"]
+
+    server.delay = 0
+    mcp_client.refresh_task.cancel()
+    assert await mcp_client.start_refresh() is True
+    assert tool_names(mcp_client) == ["weather", "news"]
+    # The prompts are not added to the system prompt twice
+    assert mcp_client.model.system.count("/forecast") == 1
+    # The next start gets the updated manifest
+    assert cache.load("http://localhost:8000/mcp", {"name": "fake", "version": "1.0"})["tools"][1]["name"] == "news"
+
+
+@pytest.mark.asyncio
+async def test_a_new_server_version_is_listed_again(tmp_path):
+    cache = ManifestCache(str(tmp_path))
+    await make_client(FakeServer(), cache).init()
+    server = FakeServer()
+    server.initialize_result.serverInfo = {"name": "fake", "version": "2.0"}
+    await make_client(server, cache).init()
+    assert sorted(server.listed) == ["prompts", "tools"]
+
+
+@pytest.mark.asyncio
+async def test_list_changed_notifications_refresh_only_that_list():
+    server = FakeServer(delay=0)
+    mcp_client = make_client(server)
+    await mcp_client.init()
+    server.listed.clear()
+    server.tools = [tool("news")]
+
+    notification = pytypes.SimpleNamespace(root=pytypes.SimpleNamespace(method="notifications/tools/list_changed"))
+    await mcp_client.handle_message(notification)
+    await mcp_client.refresh_task
+    assert server.listed == ["tools"]
+    assert tool_names(mcp_client) == ["news"]
+    # Other messages are ignored
+    await mcp_client.handle_message(pytypes.SimpleNamespace(root=pytypes.SimpleNamespace(method="notifications/message")))
+    assert server.listed == ["tools"]
+
+
+@pytest.mark.asyncio
+async def test_a_new_version_is_seen_whatever_the_spelling_of_server_info(tmp_path):
+    cache = ManifestCache(str(tmp_path))
+    await make_client(FakeServer(), cache).init()
+    server = FakeServer()
+    server.initialize_result = pytypes.SimpleNamespace(server_info={"name": "fake", "version": "2.0"})
+    mcp_client = make_client(server, cache)
+    assert mcp_client.get_fingerprint() == {"name": "fake", "version": "2.0"}
+    await mcp_client.init()
+    assert sorted(server.listed) == ["prompts", "tools"]
+
+
+@pytest.mark.asyncio
+async def test_refreshed_lists_reach_the_sessions():
+    server = FakeServer(delay=0)
+    mcp_client = make_client(server)
+    await mcp_client.init()
+    manager = SessionManager(mcp_client)
+    session = manager.get_session(manager.create_session())
+    closed = manager.get_session(manager.create_session("closed"))
+    manager.close_session("closed")
+    server.tools = [tool("news")]
+    server.prompts = [prompt("headlines")]
+
+    assert await mcp_client.refresh()
+    assert [schema["function"]["name"] for schema in session.available_tools] == ["news"]
+    assert "/headlines" in session.system and session.messages[0]["content"] == session.system
+    # A closed session is no longer updated
+    assert [schema["function"]["name"] for schema in closed.available_tools] == ["weather"]
@@ -0,0 +1,75 @@
+import copy
+
+from conftest import model_kwargs
+from message_history import MessageHistory
+from models.openai import OpenAIModel
+
+
+def count_chars(message):
+    return len(message["content"])
+
+
+def make_history(*contents):
+    return MessageHistory([{"role": "user", "content": c} for c in contents], count_chars)
+
+
+def test_append_and_extend_update_counts():
+    history = make_history("ab")
+    history.append({"role": "assistant", "content": "cde"})
+    history.extend([{"role": "user", "content": "f"}])
+    assert history.token_counts == [2, 3, 1]
+    assert history.total_tokens == 6
+
+
+def test_replace_delete_and_pop_keep_total_in_sync():
+    history = make_history("a", "bb", "ccc", "dddd")
+    history[0] = {"role": "system", "content": "xxxxx"}
+    assert history.total_tokens == 5 + 2 + 3 + 4
+    history[1:3] = [{"role": "user", "content": "y"}]
+    assert history.token_counts == [5, 1, 4]
+    del history[0]
+    assert history.total_tokens == 5
+    assert history.pop()["content"] == "dddd"
+    assert history.token_counts == [1] and history.total_tokens == 1
+    history.insert(0, {"role": "user", "content": "zz"})
+    assert history.token_counts == [2, 1] and history.total_tokens == 3
+
+
+def test_slices_are_plain_lists_and_copies_recount():
+    history = make_history("a", "bb")
+    assert type(history[:1]) is list
+    clone = copy.copy(history)
+    assert isinstance(clone, MessageHistory)
+    assert clone.token_counts == [1, 2] and clone.total_tokens == 3
+
+
+def make_model():
+    return OpenAIModel(**model_kwargs(name="gpt-test"))
+
+
+def test_check_summarize_needed_only_counts_the_next_message():
+    model = make_model()
+    for i in range(50):
+        model.messages.append({"role": "user", "content": f"message {i}"})
+
+    counted = []
+    original = model.count_message_tokens
+
+    def spy(message):
+        counted.append(message)
+        return original(message)
+
+    model.count_message_tokens = spy
+    model.check_summarize_needed([{"role": "user", "content": "next"}])
+    assert counted == [{"role": "user", "content": "next"}]
+
+
+def test_set_messages_and_set_system_are_accounted():
+    model = make_model()
+    model.set_messages([{"role": "user", "content": "hi"}])
+    expected = sum(model.count_message_tokens(m) for m in model.messages)
+    assert model.get_token_count() == expected
+
+    model.set_system("a much longer system prompt than before")
+    expected = sum(model.count_message_tokens(m) for m in model.messages)
+    assert model.get_token_count() == expected
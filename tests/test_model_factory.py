@@ -1,6 +1,10 @@
+import os
+import subprocess
+import sys
+
 import pytest
 
-from model_factory import ModelFactory
+from model_factory import ModelFactory, load_model_class
 from models.openai import OpenAIModel
 from models.gemini import GeminiModel
 from models.anthropic import AnthropicModel
@@ -51,3 +55,23 @@ def test_build_for_each_provider(setter, expected_cls):
     mf.set_prints(a, s, e)
     model = mf.build()
     assert isinstance(model, expected_cls)
+
+
+def test_import_does_not_load_provider_modules():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = (
+        "import sys, model_factory; "
+        "print([m for m in ('models.openai', 'models.gemini', 'models.anthropic', "
+        "'openai', 'anthropic', 'google.genai', 'tiktoken') if m in sys.modules])"
+    )
+    completed = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True)
+    assert completed.returncode == 0, completed.stderr
+    assert completed.stdout.strip() == "[]"
+
+
+@pytest.mark.parametrize(
+    "format, expected_cls",
+    [("openai", OpenAIModel), ("gemini", GeminiModel), ("anthropic", AnthropicModel)],
+)
+def test_load_model_class_imports_selected_provider(format, expected_cls):
+    assert load_model_class(format) is expected_cls
@@ -0,0 +1,141 @@
+import asyncio
+import time
+import types as pytypes
+
+import pytest
+
+from composite_model import CompositeModel
+from conftest import model_kwargs
+from mcp_client import MCPClient
+from models.gemini import GeminiModel
+from models.openai import OpenAIModel
+from multi_server_client import MultiServerClient
+
+
+def tool(name):
+    return pytypes.SimpleNamespace(name=name, description=f"{name} tool", input_schema={"type": "object"})
+
+
+class FakeServer:
+    """MCP client whose tool calls take delay seconds"""
+
+    def __init__(self, tools, delay=0.0, fail=False):
+        self.tools = [tool(name) for name in tools]
+        self.delay = delay
+        self.fail = fail
+        self.calls = []
+        self.connected = False
+        self.initialize_result = pytypes.SimpleNamespace(serverInfo={"name": tools[0], "version": "1.0"})
+
+    async def __aenter__(self):
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise ConnectionError("unreachable")
+        self.connected = True
+        return self
+
+    async def __aexit__(self, *exc):
+        self.connected = False
+
+    async def list_tools(self):
+        return list(self.tools)
+
+    async def list_prompts(self):
+        return []
+
+    async def call_tool(self, name, arguments=None):
+        self.calls.append((name, arguments))
+        await asyncio.sleep(self.delay)
+        return f"{name} done"
+
+
+def make_model(url=None):
+    return OpenAIModel(**model_kwargs(url=url))
+
+
+@pytest.mark.asyncio
+async def test_tools_are_namespaced_and_routed_to_their_server():
+    weather = FakeServer(["forecast"])
+    files = FakeServer(["read", "forecast"])
+    client = MultiServerClient({"weather": weather, "files": files})
+    async with client:
+        assert weather.connected and files.connected
+        names = [item.name for item in await client.list_tools()]
+        assert names == ["weather__forecast", "files__read", "files__forecast"]
+        assert await client.call_tool("files__forecast", {"path": "a"}) == "forecast done"
+        assert files.calls == [("forecast", {"path": "a"})] and weather.calls == []
+        with pytest.raises(LookupError):
+            await client.call_tool("mail__send")
+    assert not weather.connected
+    # The tools of the servers are not renamed in place
+    assert weather.tools[0].name == "forecast"
+
+
+@pytest.mark.asyncio
+async def test_a_slow_server_does_not_hold_up_the_others():
+    slow = FakeServer(["crawl"], delay=0.3)
+    fast = FakeServer(["ping"], delay=0.01)
+    client = MultiServerClient({"slow": slow, "fast": fast}, max_concurrent_calls=1)
+    started = time.monotonic()
+    slow_calls = asyncio.gather(*(client.call_tool("slow__crawl") for _ in range(2)))
+    await asyncio.sleep(0.01)
+    await asyncio.gather(*(client.call_tool("fast__ping") for _ in range(3)))
+    # The fast server answered while the slow one was still busy
+    assert time.monotonic() - started < 0.3
+    await slow_calls
+    # One call at a time on the slow server
+    assert time.monotonic() - started >= 0.6
+
+
+@pytest.mark.asyncio
+async def test_a_failed_connection_closes_the_other_servers():
+    healthy = FakeServer(["ping"])
+    client = MultiServerClient({"healthy": healthy, "down": FakeServer(["crawl"], fail=True)})
+    with pytest.raises(ConnectionError):
+        await client.__aenter__()
+    assert not healthy.connected
+
+
+def test_invalid_server_names_are_rejected():
+    with pytest.raises(ValueError):
+        MultiServerClient({"my__server": FakeServer(["ping"])})
+
+
+@pytest.mark.asyncio
+async def test_mcp_client_connects_to_the_servers_instead_of_the_model_url():
+    model = make_model(url="https://api.example.com/v1")
+    mcp_client = MCPClient(model, servers={"weather": "http://localhost:8001/mcp", "files": "http://localhost:8002/mcp"})
+    client = mcp_client.get_client()
+    assert isinstance(client, MultiServerClient) and model.client is client
+    assert [server.url for server in client.clients.values()] == ["http://localhost:8001/mcp", "http://localhost:8002/mcp"]
+
+    # The servers are discovered as one set of tools
+    client.clients = {"weather": FakeServer(["forecast"]), "files": FakeServer(["read"])}
+    model.init()
+    await mcp_client.init()
+    assert [schema["function"]["name"] for schema in model.available_tools] == ["weather__forecast", "files__read"]
+    assert mcp_client.get_server_key() == "files=http://localhost:8002/mcp weather=http://localhost:8001/mcp"
+
+
+def test_the_fingerprint_reads_either_spelling_of_server_info():
+    weather, files = FakeServer(["forecast"]), FakeServer(["read"])
+    files.initialize_result = pytypes.SimpleNamespace(server_info={"name": "read", "version": "2.0"})
+    client = MultiServerClient({"weather": weather, "files": files})
+    assert client.initialize_result.serverInfo == {
+        "weather": {"name": "forecast", "version": "1.0"},
+        "files": {"name": "read", "version": "2.0"},
+    }
+
+
+@pytest.mark.parametrize("members", [None, ["openai", "gemini"]])
+def test_models_that_need_a_single_session_are_rejected(members):
+    if members is None:
+        model = GeminiModel(**model_kwargs(format="gemini"))
+    else:
+        classes = {"openai": OpenAIModel, "gemini": GeminiModel}
+        model = CompositeModel(
+            members=[classes[format](**model_kwargs(format=format)) for format in members],
+            **model_kwargs(format="composite"),
+        )
+    with pytest.raises(ValueError):
+        MCPClient(model, servers={"weather": "http://localhost:8001/mcp"})
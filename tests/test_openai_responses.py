@@ -0,0 +1,192 @@
+import asyncio
+import types as pytypes
+
+import pytest
+
+from conftest import model_kwargs
+from model_factory import ModelFactory
+from models.openai_responses import OpenAIResponsesModel, StreamedResponseError, messages_to_responses_input
+
+
+class StubClient:
+    def __init__(self):
+        self.called = []
+
+    async def call_tool(self, name, args):
+        self.called.append((name, args))
+        return pytypes.SimpleNamespace(content=[pytypes.SimpleNamespace(text=f"{name}-result")])
+
+
+def text_response(response_id, text):
+    content = pytypes.SimpleNamespace(type="output_text", text=text)
+    return pytypes.SimpleNamespace(id=response_id, output=[pytypes.SimpleNamespace(type="message", content=[content])], usage=None)
+
+
+def call_response(response_id, *calls):
+    return pytypes.SimpleNamespace(id=response_id, output=[
+        pytypes.SimpleNamespace(type="function_call", call_id=call_id, name=name, arguments=arguments)
+        for call_id, name, arguments in calls
+    ], usage=None)
+
+
+class FakeResponses:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    async def create(self, **kwargs):
+        self.requests.append(kwargs)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def make_model(responses, **overrides):
+    m = OpenAIResponsesModel(**model_kwargs(**{"format": "openai-responses", "name": "gpt-test", **overrides}))
+    m.init_tools([])
+    m.client = StubClient()
+    m.openai = pytypes.SimpleNamespace(responses=FakeResponses(responses))
+    return m
+
+
+@pytest.mark.asyncio
+async def test_responses_chain_sends_only_new_items():
+    printed = []
+    model = make_model([
+        call_response("r1", ("c1", "lookup", '{"key": "a"}')),
+        text_response("r2", "done"),
+        text_response("r3", "again"),
+    ], assistant_print=printed.append)
+
+    await asyncio.wait_for(model.process_query("hello"), timeout=2.0)
+    await asyncio.wait_for(model.process_query("next"), timeout=2.0)
+
+    first, second, third = model.openai.responses.requests
+    assert first["instructions"] == "system"
+    assert "previous_response_id" not in first
+    assert first["input"] == [{"role": "user", "content": "hello"}]
+    assert second["previous_response_id"] == "r1"
+    assert second["input"] == [{"type": "function_call_output", "call_id": "c1", "output": "lookup-result"}]
+    assert third["previous_response_id"] == "r2"
+    assert third["input"] == [{"role": "user", "content": "next"}]
+
+    assert model.client.called == [("lookup", {"key": "a"})]
+    assert printed == ["done", "again"]
+    # The local mirror keeps the whole conversation in chat completions format
+    assert [m["role"] for m in model.messages] == ["system", "user", "assistant", "tool", "assistant", "user", "assistant"]
+    assert model.messages[2]["tool_calls"][0]["function"]["name"] == "lookup"
+
+
+@pytest.mark.asyncio
+async def test_responses_chain_restarts_when_history_is_replaced():
+    model = make_model([text_response("r1", "one"), text_response("r2", "two")])
+    await model.process_query("hello")
+
+    model.set_messages([{"role": "user", "content": "old"}, {"role": "assistant", "content": "answer"}])
+    await model.process_query("hello again")
+
+    request = model.openai.responses.requests[-1]
+    assert "previous_response_id" not in request
+    assert request["input"] == [
+        {"role": "user", "content": "old"},
+        {"role": "assistant", "content": "answer"},
+        {"role": "user", "content": "hello again"},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_responses_resend_history_when_previous_response_is_gone():
+    class NotFound(Exception):
+        status_code = 404
+
+    model = make_model([text_response("r1", "one"), NotFound(), text_response("r2", "two")])
+    await model.process_query("hello")
+    await model.process_query("again")
+
+    failed, retried = model.openai.responses.requests[1:]
+    assert failed["previous_response_id"] == "r1"
+    assert "previous_response_id" not in retried
+    assert [item["content"] for item in retried["input"]] == ["hello", "one", "again"]
+
+
+def stream(*events):
+    async def gen():
+        for event in events:
+            yield event
+    return gen()
+
+
+def event(type, **fields):
+    return pytypes.SimpleNamespace(type=type, **fields)
+
+
+@pytest.mark.asyncio
+async def test_a_stream_cut_at_max_output_tokens_returns_the_partial_response():
+    printed = []
+    model = make_model([stream(
+        event("response.output_text.delta", delta="The answer is"),
+        event("response.incomplete", response=text_response("r1", "The answer is")),
+    )], stream=True, assistant_print=printed.append)
+    await model.process_query("question")
+    assert printed == ["The answer is"]
+    assert model.messages[-1] == {"role": "assistant", "content": "The answer is"}
+    assert model.previous_response_id == "r1"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("last_event", [
+    event("response.failed", response=pytypes.SimpleNamespace(error=pytypes.SimpleNamespace(code="server_error", message="boom"))),
+    event("error", code="server_error", message="boom"),
+])
+async def test_a_failed_stream_raises(last_event):
+    model = make_model([stream(event("response.created"), last_event)], stream=True)
+    with pytest.raises(StreamedResponseError) as info:
+        await model.request_message()
+    # Retried like a 5xx of the non-streamed request
+    assert info.value.status_code == 500 and str(info.value) == "boom"
+
+
+@pytest.mark.asyncio
+async def test_a_stream_without_a_response_raises():
+    model = make_model([stream(event("response.created"))], stream=True)
+    with pytest.raises(StreamedResponseError):
+        await model.request_message()
+
+
+def test_messages_to_responses_input_converts_tool_calls():
+    items = messages_to_responses_input([
+        {"role": "assistant", "tool_calls": [{"id": "c1", "type": "function", "function": {"name": "f", "arguments": "{}"}}]},
+        {"role": "tool", "tool_call_id": "c1", "name": "f", "content": "out"},
+    ])
+    assert items == [
+        {"type": "function_call", "call_id": "c1", "name": "f", "arguments": "{}"},
+        {"type": "function_call_output", "call_id": "c1", "output": "out"},
+    ]
+
+
+def make_factory():
+    factory = ModelFactory()
+    factory.set_name("gpt-test")
+    factory.set_max_tokens(1000)
+    factory.set_temperature(0.1)
+    factory.set_prints(lambda *_: None, lambda *_: None, lambda *_: None)
+    factory.set_summarizer_max_tokens(64)
+    factory.set_summarizer_language("english")
+    factory.set_openai_responses(True)
+    return factory
+
+
+def test_factory_builds_responses_model():
+    factory = make_factory()
+    factory.set_openai_api_key("k")
+    model = factory.build()
+    assert isinstance(model, OpenAIResponsesModel)
+    assert model.format == "openai-responses"
+
+
+def test_factory_rejects_responses_for_other_providers():
+    factory = make_factory()
+    factory.set_gemini_api_key("k")
+    with pytest.raises(ValueError):
+        factory.build()
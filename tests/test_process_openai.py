@@ -107,3 +107,146 @@ async def test_process_query_tool_calls_invokes_client_and_appends_tool_result()
     # Final assistant message appended
     assert model.messages[-1]["role"] == "assistant"
     assert model.messages[-1]["content"] == "done"
+
+
+@pytest.mark.asyncio
+async def test_create_message_awaits_async_client():
+    model = make_model()
+    captured = {}
+
+    class FakeCompletions:
+        async def create(self, **kwargs):
+            captured.update(kwargs)
+            await asyncio.sleep(0)
+            return types.SimpleNamespace(choices=[FakeChoice(message=FakeChoiceMessage(content="ok"))])
+
+    model.openai = types.SimpleNamespace(chat=types.SimpleNamespace(completions=FakeCompletions()))
+
+    choice = await asyncio.wait_for(model.create_message(), timeout=2.0)
+
+    assert choice.message.content == "ok"
+    assert captured["model"] == "gpt-test"
+
+
+def _chunk(content=None, tool_calls=None, finish_reason=None):
+    delta = types.SimpleNamespace(content=content, tool_calls=tool_calls)
+    return types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta, finish_reason=finish_reason)])
+
+
+@pytest.mark.asyncio
+async def test_streaming_prints_deltas_and_rebuilds_tool_calls():
+    printed = []
+    model = make_model(stream=True, assistant_print=printed.append)
+    model.check_summarize_needed = lambda *_: False
+
+    def tool_delta(id=None, name=None, arguments=None):
+        return types.SimpleNamespace(index=0, id=id, function=types.SimpleNamespace(name=name, arguments=arguments))
+
+    responses = [
+        [
+            _chunk(content="Let me "),
+            _chunk(content="check"),
+            _chunk(tool_calls=[tool_delta(id="call_1", name="echo", arguments='{"text": ')]),
+            _chunk(tool_calls=[tool_delta(arguments='"hi"}')], finish_reason="tool_calls"),
+        ],
+        [
+            _chunk(content="do"),
+            _chunk(content="ne", finish_reason="stop"),
+            # Last chunk of a stream with include_usage
+            types.SimpleNamespace(choices=[], usage=types.SimpleNamespace(prompt_tokens=20, completion_tokens=2)),
+        ],
+    ]
+
+    class FakeCompletions:
+        async def create(self, **kwargs):
+            assert kwargs["stream"] is True
+            assert kwargs["stream_options"] == {"include_usage": True}
+            chunks = responses.pop(0)
+
+            async def gen():
+                for chunk in chunks:
+                    yield chunk
+
+            return gen()
+
+    model.openai = types.SimpleNamespace(chat=types.SimpleNamespace(completions=FakeCompletions()))
+
+    class FakeClient:
+        async def call_tool(self, name, args):
+            class R:
+                content = [types.SimpleNamespace(text=f"called {name} with {args}")]
+            return R()
+
+    model.client = FakeClient()
+
+    await asyncio.wait_for(model.process_query("hello"), timeout=2.0)
+
+    # Deltas are printed as they arrive and never repeated as a whole
+    assert printed == ["Let me ", "check", "do", "ne"]
+    assistant_calls = [m for m in model.messages if isinstance(m, dict) and m.get("tool_calls")]
+    assert assistant_calls[0]["content"] == "Let me check"
+    assert assistant_calls[0]["tool_calls"][0]["id"] == "call_1"
+    assert assistant_calls[0]["tool_calls"][0]["function"] == {"name": "echo", "arguments": '{"text": "hi"}'}
+    assert model.messages[-1] == {"role": "assistant", "content": "done"}
+    # The usage of the streamed responses is counted
+    assert model.token_usage["input_tokens"] == 20 and model.token_usage["output_tokens"] == 2
+
+
+class SlowClient:
+    """Tool client whose calls finish in reverse order and track concurrency"""
+
+    def __init__(self, delays):
+        self.delays = delays
+        self.running = 0
+        self.max_running = 0
+
+    async def call_tool(self, name, args):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(self.delays[name])
+        self.running -= 1
+
+        class R:
+            content = [types.SimpleNamespace(text=f"{name} done")]
+        return R()
+
+
+def _tool_call(id, name):
+    return types.SimpleNamespace(id=id, function=types.SimpleNamespace(name=name, arguments="{}"))
+
+
+@pytest.mark.asyncio
+async def test_process_query_runs_tool_calls_concurrently_in_order():
+    model = make_model()
+    model.check_summarize_needed = lambda *_: False
+    calls = {"n": 0}
+
+    async def fake_create_message():
+        if calls["n"] == 0:
+            calls["n"] += 1
+            return FakeChoice(
+                finish_reason="tool_calls",
+                message=FakeChoiceMessage(content="", tool_calls=[_tool_call("a", "slow"), _tool_call("b", "fast")]),
+            )
+        return FakeChoice(finish_reason="stop", message=FakeChoiceMessage(content="done"))
+
+    model.create_message = fake_create_message
+    model.client = SlowClient({"slow": 0.05, "fast": 0.0})
+
+    await asyncio.wait_for(model.process_query("hello"), timeout=2.0)
+
+    assert model.client.max_running == 2
+    tool_msgs = [m for m in model.messages if isinstance(m, dict) and m.get("role") == "tool"]
+    assert [m["tool_call_id"] for m in tool_msgs] == ["a", "b"]
+    assert [m["content"] for m in tool_msgs] == ["slow done", "fast done"]
+
+
+@pytest.mark.asyncio
+async def test_call_tools_respects_concurrency_limit():
+    model = make_model(max_concurrent_tools=1)
+    model.client = SlowClient({"t1": 0.01, "t2": 0.0, "t3": 0.0})
+
+    results = await asyncio.wait_for(model.call_tools([("t1", {}), ("t2", {}), ("t3", {})]), timeout=2.0)
+
+    assert model.client.max_running == 1
+    assert [r.content[0].text for r in results] == ["t1 done", "t2 done", "t3 done"]
@@ -0,0 +1,120 @@
+import asyncio
+import types as pytypes
+
+import pytest
+
+import rate_limiter
+from conftest import FakeClock
+from model_factory import ModelFactory
+from rate_limiter import RateLimiter, get_credentials_key
+from tracing import InMemoryTracer
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+    def __init__(self):
+        super().__init__("rate limited")
+        self.response = pytypes.SimpleNamespace(headers={"retry-after": "20"})
+
+
+def make_limiter(**limits):
+    clock = FakeClock()
+    return RateLimiter(**limits, clock=clock, sleep=clock.sleep), clock
+
+
+@pytest.mark.asyncio
+async def test_requests_wait_for_the_bucket_to_refill():
+    limiter, clock = make_limiter(requests_per_minute=2)
+    assert await limiter.acquire({}) == 0
+    assert await limiter.acquire({}) == 0
+    # One request every 30 seconds once the burst is spent
+    assert await limiter.acquire({}) == pytest.approx(30)
+
+
+@pytest.mark.asyncio
+async def test_callers_are_served_in_arrival_order():
+    limiter, clock = make_limiter(input_tokens_per_minute=600)
+    await limiter.acquire({"input_tokens": 500})
+    served = []
+
+    async def call(name, tokens):
+        await limiter.acquire({"input_tokens": tokens})
+        served.append(name)
+
+    # The small request would fit at once, but it does not overtake the large one
+    await asyncio.gather(call("large", 400), call("small", 50))
+    assert served == ["large", "small"]
+
+
+def test_the_limiter_works_across_event_loops():
+    limiter, clock = make_limiter(requests_per_minute=1)
+
+    async def burst():
+        # The third caller waits on the lock while the second one sleeps
+        await asyncio.gather(*(limiter.acquire({}) for _ in range(3)))
+
+    asyncio.run(burst())
+    # A second asyncio.run, as a second batch would do, gets a lock of its own and shares the budget
+    asyncio.run(burst())
+    assert clock.sleeps == [60] * 5
+
+
+@pytest.mark.asyncio
+async def test_reported_usage_corrects_the_estimate():
+    limiter, clock = make_limiter(output_tokens_per_minute=1000)
+    estimate = {"output_tokens": 1000}
+    await limiter.acquire(estimate)
+    limiter.settle(estimate, {"input_tokens": 10, "output_tokens": 100})
+    # The 900 unused tokens are back in the budget
+    assert await limiter.acquire({"output_tokens": 900}) == 0
+    limiter.settle({"output_tokens": 0}, {"output_tokens": 300})
+    # More usage than estimated leaves a debt that has to be paid back
+    assert await limiter.acquire({"output_tokens": 60}) == pytest.approx(21.6)
+
+
+def make_model(tracer, responses=False):
+    factory = ModelFactory()
+    factory.set_openai_responses(responses)
+    factory.set_openai_api_key("key")
+    factory.set_name("gpt-test")
+    factory.set_max_tokens(100)
+    factory.set_temperature(0.1)
+    factory.set_prints(lambda *_: None, lambda *_: None, lambda *_: None)
+    factory.set_summarizer_max_tokens(64)
+    factory.set_summarizer_language("english")
+    factory.set_max_tries(1)
+    factory.set_rate_limits(requests_per_minute=60)
+    factory.set_tracer(tracer)
+    model = factory.build()
+    model.init_tools([])
+    return model
+
+
+@pytest.mark.asyncio
+async def test_models_with_the_same_credentials_share_the_limiter():
+    limiter, clock = make_limiter(requests_per_minute=60)
+    rate_limiter.rate_limiters[get_credentials_key("openai", None, "key")] = limiter
+    tracer = InMemoryTracer()
+    # The chat completions and the Responses API draw from the same account limits
+    first, second = make_model(tracer), make_model(tracer, responses=True)
+    assert second.format == "openai-responses"
+    assert first.rate_limiter is second.rate_limiter is limiter
+    responses = [RateLimitError(), "ok"]
+
+    async def request():
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    assert await first.call_with_retry(request) is None
+    # The 429 received by the first model holds back the second one
+    assert await second.call_with_retry(request) == "ok"
+    waits = [span.attributes["rate_wait"] for span in tracer.find("create_message")]
+    assert waits == [0, pytest.approx(20)]
+
+
+def test_rate_limits_must_be_positive():
+    with pytest.raises(ValueError):
+        ModelFactory().set_rate_limits(requests_per_minute=0)
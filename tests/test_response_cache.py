@@ -0,0 +1,115 @@
+import json
+import types as pytypes
+
+import pytest
+
+from conftest import FakeCompletions, FakeServer, choice, model_kwargs, tool_call
+from mcp_client import MCPClient
+from models.openai import OpenAIModel
+from response_cache import Cassette, CassetteMissError, ResponseCache, to_data, to_record
+from tracing import InMemoryTracer
+
+
+def answer(messages):
+    """Asks for the weather tool, then answers with its result"""
+    if messages[-1]["role"] == "tool":
+        return choice(f"It is {messages[-1]['content']}")
+    return choice(tool_calls=[tool_call("weather", '{"city": "Rome"}')])
+
+
+def make_server():
+    weather = pytypes.SimpleNamespace(name="weather", description="Weather of a city", input_schema={"type": "object"})
+    return FakeServer([weather], outputs={"weather": "sunny"})
+
+
+def make_model(printed, **overrides):
+    model = OpenAIModel(**model_kwargs(temperature=0, assistant_print=printed.append, **overrides))
+    model.openai = pytypes.SimpleNamespace(chat=pytypes.SimpleNamespace(completions=FakeCompletions(answer=answer)))
+    return model
+
+
+async def connect(model, server):
+    mcp_client = MCPClient(model)
+    if server is not None:
+        mcp_client.client = model.client = server
+    model.init()
+    await mcp_client.init()
+    return mcp_client
+
+
+def test_cache_evicts_the_least_recently_used_entries(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_entries=2)
+    cache.put("a", {"n": 1})
+    cache.put("b", {"n": 2})
+    assert cache.get("a") == {"n": 1}
+    cache.put("c", {"n": 3})
+    assert cache.get("b") is None
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["a.json", "c.json"]
+    # A new instance finds the entries left on disk
+    assert ResponseCache(str(tmp_path)).get("c") == {"n": 3}
+    assert cache.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_identical_requests_are_answered_from_the_cache(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    tracer = InMemoryTracer()
+    printed = []
+    model = make_model(printed, response_cache=cache, tracer=tracer)
+    server = make_server()
+    await connect(model, server)
+    await model.process_query("weather in Rome?")
+    completions = model.openai.chat.completions
+    assert completions.calls == 2
+
+    fork = model.fork()
+    await fork.process_query("weather in Rome?")
+    assert completions.calls == 2
+    assert printed == ["It is sunny", "It is sunny"]
+    assert [span.attributes.get("cached") for span in tracer.find("create_message")] == [None, None, True, True]
+    # The tools still ran: the cache only answers the model requests
+    assert len(server.calls) == 2
+    # A different setting is a different request
+    model.temperature = 0.5
+    await model.fork().process_query("weather in Rome?")
+    assert completions.calls == 4
+
+
+@pytest.mark.asyncio
+async def test_recorded_session_is_replayed_offline(tmp_path):
+    path = str(tmp_path / "session.jsonl")
+    recorded = []
+    cassette = Cassette(path, mode="record")
+    model = make_model(recorded, cassette=cassette)
+    await connect(model, make_server())
+    await model.process_query("weather in Rome?")
+    cassette.close()
+    assert [json.loads(line)["kind"] for line in open(path)] == ["tools", "prompts", "response", "tool", "response"]
+
+    replayed = []
+    tracer = InMemoryTracer()
+    model = make_model(replayed, cassette=Cassette(path), tracer=tracer)
+    # Neither the provider nor the MCP server is available
+    model.openai = None
+    await connect(model, None)
+    assert [tool["function"]["name"] for tool in model.available_tools] == ["weather"]
+    await model.process_query("weather in Rome?")
+    assert replayed == recorded == ["It is sunny"]
+    assert tracer.find("call_tool")[0].attributes["replayed"] is True
+
+    with pytest.raises(CassetteMissError):
+        await model.process_query("weather in Milan?")
+    # Rewinding replays the same answers again
+    model.cassette.rewind()
+    await model.fork().process_query("weather in Rome?")
+    assert replayed == ["It is sunny", "It is sunny"]
+
+
+def test_decoded_responses_read_like_the_objects_they_came_from():
+    response = choice(content=None, tool_calls=[tool_call("weather", "{}")]).choices[0]
+    decoded = to_record(json.loads(json.dumps(to_data(response))))
+    assert decoded.message.content is None
+    assert decoded.message.tool_calls[0].function.name == "weather"
+    assert not hasattr(decoded, "usage")
+    # ...and are still plain dicts for the SDKs
+    assert json.loads(json.dumps(decoded))["finish_reason"] == "tool_calls"
@@ -0,0 +1,181 @@
+import types as pytypes
+
+import pytest
+
+import model as model_module
+from conftest import FakeClock, model_kwargs
+from retry import CircuitBreaker, CircuitOpenError, RetryPolicy, get_retry_after, is_quota_error, is_retryable
+from models.openai import OpenAIModel
+
+
+class FakeAPIError(Exception):
+    def __init__(self, status_code=None, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = pytypes.SimpleNamespace(headers=headers or {})
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(model_module.asyncio, "sleep", fake_sleep)
+    return delays
+
+
+def make_model(**overrides):
+    m = OpenAIModel(**model_kwargs(**{"name": "gpt-test", "max_tries": 5, "wait_seconds": 6, **overrides}))
+    m.init_tools([])
+    return m
+
+
+def failing_request(errors, result="ok"):
+    calls = []
+
+    async def request():
+        calls.append(len(calls))
+        if errors:
+            raise errors.pop(0)
+        return result
+
+    return request, calls
+
+
+def test_delay_grows_exponentially_and_is_capped():
+    policy = RetryPolicy(base_delay=0.5, max_delay=3, jitter=False)
+    assert [policy.get_delay(attempt) for attempt in range(1, 6)] == [0.5, 1, 2, 3, 3]
+
+
+def test_jitter_scales_the_delay():
+    policy = RetryPolicy(base_delay=1, max_delay=10, random=lambda: 0.25)
+    assert policy.get_delay(3) == 1.0
+
+
+def test_retry_after_headers_are_respected():
+    assert get_retry_after(FakeAPIError(429, {"retry-after-ms": "250"})) == 0.25
+    assert get_retry_after(FakeAPIError(429, {"retry-after": "2"})) == 2.0
+    assert get_retry_after(FakeAPIError(429)) is None
+    policy = RetryPolicy(base_delay=5, max_delay=10, jitter=False)
+    assert policy.get_delay(1, FakeAPIError(429, {"retry-after": "1"})) == 1.0
+
+
+@pytest.mark.parametrize("status,expected", [
+    (400, False), (401, False), (403, False), (404, False),
+    (408, True), (429, True), (500, True), (503, True), (529, True), (None, False),
+])
+def test_is_retryable(status, expected):
+    assert is_retryable(FakeAPIError(status)) is expected
+
+
+class APIConnectionError(Exception):
+    """Named like the connection errors of the openai and anthropic SDKs"""
+
+
+@pytest.mark.parametrize("error,expected", [
+    (ConnectionResetError(), True), (TimeoutError(), True), (APIConnectionError(), True),
+    (KeyError("choices"), False), (AttributeError("text"), False), (TypeError(), False),
+])
+def test_only_transport_errors_without_a_status_are_retried(error, expected):
+    assert is_retryable(error) is expected
+
+
+def test_circuit_breaker_opens_and_half_opens():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    clock.now = 10
+    assert breaker.state == "half_open" and breaker.allow()
+    # Only one probe at a time
+    assert not breaker.allow()
+    # A failure while half open reopens the circuit at once
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    clock.now = 20
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+def test_a_probe_that_never_reports_is_replaced():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    clock.now = 10
+    assert breaker.allow()
+    clock.now = 15
+    assert not breaker.allow()
+    clock.now = 20
+    assert breaker.allow()
+
+
+@pytest.mark.asyncio
+async def test_transient_errors_are_retried_with_backoff(sleeps):
+    model = make_model(retry_policy=RetryPolicy(max_tries=5, base_delay=1, max_delay=10, jitter=False))
+    request, calls = failing_request([FakeAPIError(500), FakeAPIError(429, {"retry-after": "0.5"})])
+
+    assert await model.call_with_retry(request) == "ok"
+    assert len(calls) == 3
+    assert sleeps == [1, 0.5]
+
+
+@pytest.mark.asyncio
+async def test_non_retryable_errors_are_raised_at_once(sleeps):
+    printed = []
+    model = make_model(error_print=printed.append)
+    request, calls = failing_request([FakeAPIError(401)])
+
+    with pytest.raises(FakeAPIError):
+        await model.call_with_retry(request)
+    assert len(calls) == 1
+    assert sleeps == []
+    assert printed == ["status 401"]
+
+
+@pytest.mark.asyncio
+async def test_exhausted_attempts_return_none(sleeps):
+    printed = []
+    model = make_model(max_tries=2, error_print=printed.append)
+    request, calls = failing_request([FakeAPIError(503), FakeAPIError(503)])
+
+    assert await model.call_with_retry(request) is None
+    assert len(calls) == 2
+    assert printed[-1] == "Maximum number of attempts reached, please try again later"
+
+
+@pytest.mark.asyncio
+async def test_open_circuit_fails_fast_for_every_model_of_the_provider(sleeps):
+    policy = RetryPolicy(max_tries=50, failure_threshold=3, jitter=False)
+    model = make_model(retry_policy=policy)
+    request, calls = failing_request([FakeAPIError(503)] * 50)
+
+    with pytest.raises(CircuitOpenError):
+        await model.call_with_retry(request)
+    assert len(calls) == 3
+
+    other = make_model(retry_policy=policy)
+    with pytest.raises(CircuitOpenError):
+        await other.call_with_retry(request)
+    assert len(calls) == 3
+
+
+def test_default_policy_uses_max_tries_and_wait_seconds():
+    model = make_model(max_tries=7, wait_seconds=3)
+    assert model.retry_policy.max_tries == 7
+    assert model.retry_policy.max_delay == 3
+
+
+def test_quota_errors_are_retried_only_when_the_policy_allows():
+    quota = FakeAPIError(429)
+    quota.body = {"error": {"code": "insufficient_quota"}}
+    assert is_quota_error(quota) and is_quota_error(FakeAPIError(402))
+    assert not is_quota_error(FakeAPIError(429)) and not is_quota_error(FakeAPIError(500))
+    assert RetryPolicy().is_retryable(quota)
+    assert not RetryPolicy(retry_quota=False).is_retryable(quota)
+    assert RetryPolicy(retry_quota=False).is_retryable(FakeAPIError(429))
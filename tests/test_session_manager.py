@@ -0,0 +1,147 @@
+import asyncio
+import types
+
+import pytest
+
+from conftest import model_kwargs
+from mcp_client import MCPClient
+from models.gemini import GeminiModel
+from models.openai import OpenAIModel
+from session_manager import SessionManager
+
+
+class FakeChoice:
+    def __init__(self, content):
+        self.finish_reason = "stop"
+        self.message = types.SimpleNamespace(content=content, tool_calls=[])
+
+
+async def make_manager(journal_dir=None, **overrides):
+    model = OpenAIModel(**model_kwargs(**{"url": "http://localhost:8000/mcp", **overrides}))
+    model.check_summarize_needed = lambda *_: False
+    mcp_client = MCPClient(model)
+    mcp_client.get_client()
+    await mcp_client.init()
+    return SessionManager(mcp_client, journal_dir=journal_dir)
+
+
+@pytest.mark.asyncio
+async def test_sessions_share_clients_and_tools():
+    manager = await make_manager()
+    first = manager.get_session(manager.create_session())
+    second = manager.get_session(manager.create_session())
+    model = manager.mcp_client.model
+
+    assert first is not second
+    assert first.openai is model.openai is second.openai
+    assert first.client is manager.mcp_client.client is second.client
+    assert first.available_tools is model.available_tools
+    assert len(manager) == 2
+
+
+@pytest.mark.asyncio
+async def test_session_histories_are_isolated():
+    manager = await make_manager()
+    a = manager.create_session("a")
+    b = manager.create_session("b")
+
+    async def echo_create_message(model):
+        return FakeChoice(f"echo {model.messages[-1]['content']}")
+
+    for session_id in (a, b):
+        model = manager.get_session(session_id)
+        model.create_message = lambda model=model: echo_create_message(model)
+
+    await manager.process_query(a, "hello")
+    await manager.process_query(b, "ciao")
+
+    assert [m["content"] for m in manager.get_session(a).messages] == ["system", "hello", "echo hello"]
+    assert [m["content"] for m in manager.get_session(b).messages] == ["system", "ciao", "echo ciao"]
+    # The model of the MCPClient is left untouched
+    assert [m["content"] for m in manager.mcp_client.model.messages] == ["system"]
+
+
+@pytest.mark.asyncio
+async def test_sessions_run_concurrently_and_queries_of_one_session_in_order():
+    manager = await make_manager()
+    ids = [manager.create_session() for _ in range(20)]
+    active = 0
+    peak = 0
+
+    async def slow_create_message(model):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return FakeChoice(model.messages[-1]["content"])
+
+    for session_id in ids:
+        model = manager.get_session(session_id)
+        model.create_message = lambda model=model: slow_create_message(model)
+
+    await asyncio.wait_for(asyncio.gather(
+        *(manager.process_query(session_id, "q") for session_id in ids),
+        manager.process_query(ids[0], "q2"),
+    ), timeout=2.0)
+
+    assert peak == 20
+    assert [m["content"] for m in manager.get_session(ids[0]).messages] == ["system", "q", "q", "q2", "q2"]
+
+
+@pytest.mark.asyncio
+async def test_session_prints_and_lifecycle():
+    printed = []
+    manager = await make_manager()
+    session_id = manager.create_session("user-1", assistant_print=printed.append)
+    model = manager.get_session(session_id)
+    model.create_message = lambda: asyncio.sleep(0, FakeChoice("hi"))
+
+    await manager.process_query(session_id, "hello")
+
+    assert printed == ["hi"]
+    with pytest.raises(ValueError, match="already exists"):
+        manager.create_session("user-1")
+    manager.close_session(session_id)
+    assert session_id not in manager
+    with pytest.raises(KeyError):
+        manager.get_session(session_id)
+
+
+@pytest.mark.asyncio
+async def test_max_sessions():
+    manager = await make_manager()
+    manager.max_sessions = 1
+    manager.create_session()
+    with pytest.raises(ValueError, match="Maximum number of sessions"):
+        manager.create_session()
+
+
+def test_gemini_fork_starts_from_the_system_prompt():
+    model = GeminiModel(**model_kwargs(format="gemini", url="http://localhost:8000/mcp"))
+    model.init()
+    model.messages.append(model.get_user_message("hello"))
+
+    fork = model.fork()
+
+    assert fork.gemini is model.gemini
+    assert len(fork.messages) == 1 and fork.messages[0].parts[0].text == "system"
+    assert len(model.messages) == 2
+
+
+@pytest.mark.asyncio
+async def test_sessions_resume_from_journal_after_restart(tmp_path):
+    manager = await make_manager(journal_dir=str(tmp_path))
+    session_id = manager.create_session("user-1")
+    model = manager.get_session(session_id)
+    model.create_message = lambda: asyncio.sleep(0, FakeChoice("hi"))
+    await manager.process_query(session_id, "hello")
+    manager.close_session(session_id)
+
+    restarted = await make_manager(journal_dir=str(tmp_path))
+    restarted.resume_session("user-1")
+    resumed = restarted.get_session("user-1")
+    assert [m["content"] for m in resumed.messages] == ["system", "hello", "hi"]
+    assert resumed.messages.token_counts == model.messages.token_counts
+    with pytest.raises(ValueError, match="no journal"):
+        restarted.resume_session("unknown")
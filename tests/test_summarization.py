@@ -0,0 +1,335 @@
+import asyncio
+import types as pytypes
+
+import pytest
+
+from conftest import model_kwargs
+from model_factory import ModelFactory
+from google.genai import types
+from models.anthropic import AnthropicModel
+from models.gemini import GeminiModel
+from models.openai import OpenAIModel
+
+
+def make_openai_model(**overrides):
+    m = OpenAIModel(**model_kwargs(**overrides))
+    m.init_tools([])
+    return m
+
+
+def make_anthropic_model(**overrides):
+    m = AnthropicModel(**model_kwargs(format="anthropic", **overrides))
+    m.init()
+    m.init_tools([])
+    return m
+
+
+def turn(n):
+    return [
+        {"role": "user", "content": f"question {n}"},
+        {"role": "assistant", "content": f"answer {n}"},
+    ]
+
+
+NEXT = [{"role": "user", "content": "q"}]
+
+
+@pytest.mark.asyncio
+async def test_summarize_keeps_last_two_messages():
+    model = make_openai_model()
+    model.messages.extend(turn(1) + turn(2))
+    summarized = []
+
+    async def fake_create_summary(messages):
+        summarized.append(list(messages))
+        return "summary"
+
+    model.create_summary = fake_create_summary
+
+    await model.summarize()
+
+    assert summarized == [turn(1)]
+    assert model.messages == [
+        {"role": "system", "content": "system"},
+        {"role": "system", "content": "summary"},
+    ] + turn(2)
+    assert model.get_token_count() == sum(model.count_message_tokens(m) for m in model.messages)
+
+
+@pytest.mark.asyncio
+async def test_soft_threshold_starts_background_summary_without_waiting():
+    model = make_openai_model(summarizer_soft_threshold=0.5)
+    model.messages.extend(turn(1) + turn(2))
+    model.max_tokens = int(model.get_token_count() * 1.5)
+    gate = asyncio.Event()
+
+    async def slow_create_summary(messages):
+        await gate.wait()
+        return "summary"
+
+    model.create_summary = slow_create_summary
+
+    await model.summarize_if_needed(NEXT)
+
+    # The history is untouched while the summary is prepared
+    assert model.summary_task is not None
+    assert not model.summary_task.done()
+    assert model.messages == [{"role": "system", "content": "system"}] + turn(1) + turn(2)
+    gate.set()
+    await model.summary_task
+
+
+@pytest.mark.asyncio
+async def test_hard_threshold_swaps_background_summary_and_keeps_new_messages():
+    model = make_openai_model(summarizer_soft_threshold=0.5)
+    model.messages.extend(turn(1) + turn(2))
+    model.max_tokens = int(model.get_token_count() * 1.5)
+    gate = asyncio.Event()
+    summarized = []
+
+    async def slow_create_summary(messages):
+        summarized.append(list(messages))
+        await gate.wait()
+        return "summary"
+
+    model.create_summary = slow_create_summary
+    await model.summarize_if_needed(NEXT)
+
+    # The conversation goes on while the summary is prepared
+    model.messages.extend(turn(3))
+    checks = iter([True, False])
+    model.check_summarize_needed = lambda *_: next(checks)
+    gate.set()
+
+    await model.summarize_if_needed(NEXT)
+
+    assert summarized == [turn(1)]
+    assert model.summary_task is None
+    assert model.messages == [
+        {"role": "system", "content": "system"},
+        {"role": "system", "content": "summary"},
+    ] + turn(2) + turn(3)
+
+
+@pytest.mark.asyncio
+async def test_background_summary_is_discarded_when_history_is_replaced():
+    model = make_openai_model(summarizer_soft_threshold=0.5)
+    model.messages.extend(turn(1) + turn(2))
+    model.max_tokens = int(model.get_token_count() * 1.5)
+    summarized = []
+
+    async def fake_create_summary(messages):
+        summarized.append(list(messages))
+        return f"summary {len(summarized)}"
+
+    model.create_summary = fake_create_summary
+    await model.summarize_if_needed(NEXT)
+    model.set_messages(turn(4) + turn(5))
+    model.check_summarize_needed = lambda *_: True
+
+    await model.summarize_if_needed(NEXT)
+
+    # The stale summary is ignored and the new history is summarized inline
+    assert summarized == [turn(1), turn(4)]
+    assert model.messages == [
+        {"role": "system", "content": "system"},
+        {"role": "system", "content": "summary 2"},
+    ] + turn(5)
+
+
+@pytest.mark.asyncio
+async def test_failed_background_summary_falls_back_to_inline_summary():
+    model = make_openai_model(summarizer_soft_threshold=0.5)
+    model.messages.extend(turn(1) + turn(2))
+    model.max_tokens = int(model.get_token_count() * 1.5)
+    calls = []
+
+    async def flaky_create_summary(messages):
+        calls.append(list(messages))
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+        return "summary"
+
+    model.create_summary = flaky_create_summary
+    await model.summarize_if_needed(NEXT)
+    model.check_summarize_needed = lambda *_: True
+
+    await model.summarize_if_needed(NEXT)
+
+    assert len(calls) == 2
+    assert model.messages[1] == {"role": "system", "content": "summary"}
+
+
+@pytest.mark.asyncio
+async def test_no_background_summary_without_soft_threshold():
+    model = make_openai_model()
+    model.messages.extend(turn(1) + turn(2))
+    model.max_tokens = int(model.get_token_count() * 1.5)
+
+    await model.summarize_if_needed(NEXT)
+
+    assert model.summary_task is None
+
+
+@pytest.mark.asyncio
+async def test_anthropic_summary_uses_system_parameter_and_text_blocks():
+    model = make_anthropic_model()
+    model.messages.extend(turn(1) + turn(2))
+    captured = {}
+
+    class FakeMessages:
+        async def create(self, **kwargs):
+            captured.update(kwargs)
+            return pytypes.SimpleNamespace(content=[
+                pytypes.SimpleNamespace(type="text", text="sum"),
+                pytypes.SimpleNamespace(type="text", text="mary"),
+            ])
+
+    model.anthropic = pytypes.SimpleNamespace(messages=FakeMessages())
+
+    await model.summarize()
+
+    assert captured["system"] == "sum sys"
+    assert [m["role"] for m in captured["messages"]] == ["user"]
+    assert "question 1" in captured["messages"][0]["content"]
+    assert model.messages == [{"role": "user", "content": "summary"}] + turn(2)
+
+
+def test_factory_rejects_invalid_soft_threshold():
+    mf = ModelFactory()
+    with pytest.raises(ValueError, match="between 0 and 1"):
+        mf.set_summarizer_soft_threshold(1.5)
+    mf.set_summarizer_soft_threshold(0.8)
+    assert mf.summarizer_soft_threshold == 0.8
+
+
+def tool_exchange(call_id):
+    return [
+        {"role": "assistant", "content": None, "tool_calls": [
+            {"id": call_id, "type": "function", "function": {"name": "lookup", "arguments": "{}"}}
+        ]},
+        {"role": "tool", "tool_call_id": call_id, "name": "lookup", "content": f"result {call_id}"},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_summarize_keeps_configured_number_of_turns():
+    model = make_openai_model(summarizer_keep_turns=2)
+    model.messages.extend(turn(1) + turn(2) + turn(3))
+    summarized = []
+
+    async def fake_create_summary(messages):
+        summarized.append(list(messages))
+        return "summary"
+
+    model.create_summary = fake_create_summary
+    await model.summarize()
+
+    assert summarized == [turn(1)]
+    assert model.messages[2:] == turn(2) + turn(3)
+
+
+def test_fewer_turns_than_keep_turns_are_kept_whole():
+    model = make_openai_model(summarizer_keep_turns=3)
+    model.messages.extend(turn(1) + turn(2) + [{"role": "user", "content": "question 3"}] + tool_exchange("a") + tool_exchange("b"))
+    # The first turn is summarized, the other two stay whole
+    assert model.get_summary_cut() == 3
+
+
+@pytest.mark.asyncio
+async def test_rolling_summary_only_folds_new_messages():
+    model = make_openai_model()
+    model.messages.extend(turn(1) + turn(2))
+    summarized = []
+
+    async def fake_create_summary(messages):
+        summarized.append(list(messages))
+        return f"summary {len(summarized)}"
+
+    model.create_summary = fake_create_summary
+    await model.summarize()
+    model.messages.extend(turn(3))
+    await model.summarize()
+
+    # The second pass sees the running summary and the turn added since, not turn 1
+    assert summarized[1] == [{"role": "system", "content": "summary 1"}] + turn(2)
+    assert model.messages == [
+        {"role": "system", "content": "system"},
+        {"role": "system", "content": "summary 2"},
+    ] + turn(3)
+
+
+@pytest.mark.asyncio
+async def test_summary_never_separates_tool_calls_from_results():
+    model = make_openai_model()
+    current = [{"role": "user", "content": "question 2"}] + tool_exchange("a") + tool_exchange("b")
+    model.messages.extend(turn(1) + current)
+
+    async def fake_create_summary(messages):
+        return "summary"
+
+    model.create_summary = fake_create_summary
+    await model.summarize()
+    # The whole current turn is kept, tool results included
+    assert model.messages[2:] == current
+
+    # The current turn alone is too long: the cut falls on its last model message
+    await model.summarize()
+    assert model.messages[2:] == tool_exchange("b")
+    assert model.get_summary_cut() is None
+
+
+def test_anthropic_tool_results_do_not_start_a_turn():
+    model = make_anthropic_model()
+    tool_result = {"role": "user", "content": [{"type": "tool_result", "tool_use_id": "1", "content": "out"}]}
+    model.messages.extend(turn(1) + [
+        {"role": "user", "content": "question 2"},
+        {"role": "assistant", "content": [pytypes.SimpleNamespace(type="tool_use", id="1", name="f", input={})]},
+        tool_result,
+    ])
+    assert model.is_tool_result(tool_result)
+    assert model.get_summary_cut() == 2
+
+
+def test_gemini_tool_results_do_not_start_a_turn():
+    model = GeminiModel(**model_kwargs(format="gemini"))
+    model.init()
+    model.init_tools([])
+
+    def content(role, text):
+        return types.Content(role=role, parts=[types.Part(text=text)])
+
+    def call(call_id):
+        return types.Content(role="model", parts=[types.Part(function_call=types.FunctionCall(id=call_id, name="f", args={}))])
+
+    def result(call_id):
+        response = types.FunctionResponse(id=call_id, name="f", response={"result": "out"})
+        return types.Content(role="user", parts=[types.Part(function_response=response)])
+
+    model.messages.extend([
+        content("user", "question 1"), content("model", "answer 1"),
+        content("user", "question 2"), call("1"), result("1"), call("2"), result("2"),
+    ])
+    assert model.is_tool_result(model.messages[5])
+    assert not model.is_tool_result(model.messages[4])
+    # The current question and its tool calls are kept together
+    assert model.get_summary_cut() == 3
+
+
+def test_summarizer_prompt_renders_messages():
+    model = make_openai_model()
+    prompt = model.get_summarizer_prompt(turn(1) + tool_exchange("a"))
+    assert prompt == "sum user" + "\n".join([
+        "user: question 1",
+        "assistant: answer 1",
+        "assistant: \nlookup {}",
+        "tool: result a",
+    ])
+
+
+def test_factory_rejects_invalid_keep_turns():
+    mf = ModelFactory()
+    with pytest.raises(ValueError, match="at least one turn"):
+        mf.set_summarizer_keep_turns(0)
+    mf.set_summarizer_keep_turns(3)
+    assert mf.summarizer_keep_turns == 3
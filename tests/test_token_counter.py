@@ -0,0 +1,95 @@
+import types as pytypes
+
+import token_counter
+from conftest import model_kwargs
+from google.genai import types
+from model_factory import ModelFactory
+from models.anthropic import AnthropicModel
+from models.openai import OpenAIModel
+from token_counter import AnthropicTokenCounter, TokenCounter, render_message
+
+
+def make_model(model_class=OpenAIModel, **overrides):
+    m = model_class(**model_kwargs(**overrides))
+    m.init()
+    m.init_tools([])
+    return m
+
+
+def test_render_message_uses_content_not_repr():
+    assert render_message({"role": "user", "content": "hello"}) == "hello"
+    assert render_message({
+        "role": "assistant",
+        "content": None,
+        "tool_calls": [{"id": "1", "type": "function", "function": {"name": "f", "arguments": '{"a": 1}'}}]
+    }) == '\nf {"a": 1}'
+    blocks = [
+        pytypes.SimpleNamespace(type="text", text="thinking"),
+        pytypes.SimpleNamespace(type="tool_use", name="f", input={"a": 1}),
+    ]
+    assert render_message({"role": "assistant", "content": blocks}) == 'thinking\nf {"a": 1}'
+    result = {"type": "tool_result", "tool_use_id": "1", "content": [pytypes.SimpleNamespace(type="text", text="out")]}
+    assert render_message({"role": "user", "content": [result]}) == "out"
+    assert render_message(types.Content(role="user", parts=[types.Part(text="ciao")])) == "ciao"
+
+
+def test_count_message_adds_overhead_to_rendered_text():
+    counter = TokenCounter()
+    # The test tiktoken stub counts UTF-8 bytes
+    assert counter.count_message({"role": "user", "content": "hello"}) == 5 + TokenCounter.message_overhead
+
+
+def test_counter_estimates_without_tokenizer(monkeypatch):
+    monkeypatch.setattr(token_counter, "get_encoding", lambda name: None)
+    assert TokenCounter().count_text("x" * 40) == 11
+
+
+def test_calibration_moves_ratio_towards_reported_usage():
+    counter = TokenCounter(smoothing=0.5)
+    counter.calibrate(100, 150)
+    assert counter.ratio == 1.5
+    counter.calibrate(100, 100)
+    assert counter.ratio == 1.25
+    counter.calibrate(100, 10000)
+    assert counter.ratio == 1.25 + 0.5 * (4.0 - 1.25)
+    assert counter.scale(100) == round(100 * counter.ratio)
+
+
+def test_anthropic_prompt_tokens_include_cache():
+    counter = AnthropicTokenCounter()
+    assert counter.get_prompt_tokens({"input_tokens": 5, "cache_read_tokens": 90, "cache_write_tokens": 5}) == 100
+
+
+def test_next_tokens_include_tool_schemas_and_calibration():
+    model = make_model()
+    base = model.count_next_tokens([])
+    model.available_tools = [{"type": "function", "function": {"name": "lookup", "parameters": {}}}]
+    tools = model.token_counter.count_tools(model.available_tools)
+    assert tools > 0
+    assert model.count_next_tokens([]) == base + tools
+
+    model.calibrate_token_counter({"input_tokens": 2 * (base + tools)})
+    assert model.token_counter.ratio == 2
+    assert model.count_next_tokens([]) == 2 * (base + tools)
+    assert model.get_token_count() == 2 * model.messages.total_tokens
+
+
+def test_anthropic_counts_system_prompt_apart_from_history():
+    model = make_model(AnthropicModel, format="anthropic", system_prompt="a long system prompt")
+    assert isinstance(model.token_counter, AnthropicTokenCounter)
+    assert model.get_token_count() == 0
+    assert model.count_next_tokens([]) == len("a long system prompt")
+
+
+def test_factory_passes_token_counter():
+    counter = TokenCounter(encoding="cl100k_base")
+    factory = ModelFactory()
+    factory.set_openai_api_key("k")
+    factory.set_name("gpt-test")
+    factory.set_max_tokens(1000)
+    factory.set_temperature(0.1)
+    factory.set_prints(lambda *_: None, lambda *_: None, lambda *_: None)
+    factory.set_summarizer_max_tokens(64)
+    factory.set_summarizer_language("english")
+    factory.set_token_counter(counter)
+    assert factory.build().token_counter is counter
@@ -0,0 +1,82 @@
+import asyncio
+import types
+
+import pytest
+
+from conftest import FakeClock, model_kwargs
+from tool_cache import ToolCache
+
+
+class CountingClient:
+    def __init__(self):
+        self.calls = []
+
+    async def call_tool(self, name, args):
+        self.calls.append((name, args))
+        return types.SimpleNamespace(content=[types.SimpleNamespace(text=f"{name}:{len(self.calls)}")], is_error=False)
+
+
+def test_key_is_canonical_across_arg_formats():
+    cache = ToolCache(["read"])
+    assert cache.make_key("read", {"b": 1, "a": None, "c": [1, None]}) == cache.make_key("read", '{"c": [1], "b": 1}')
+
+
+def test_hits_misses_and_ttl():
+    clock = FakeClock()
+    cache = ToolCache(["read"], ttl=10, tool_ttls={"slow": 100}, clock=clock)
+    assert cache.get("read", {"x": 1}) is None
+    cache.put("read", {"x": 1}, "value")
+    assert cache.get("read", {"x": 1}) == "value"
+    clock.now = 10
+    assert cache.get("read", {"x": 1}) is None
+    cache.put("slow", {}, "kept")
+    clock.now = 50
+    assert cache.get("slow", {}) == "kept"
+    assert cache.stats() == {"hits": 2, "misses": 2, "hit_rate": 0.5, "size": 1}
+
+
+def test_lru_eviction():
+    cache = ToolCache(["read"], max_size=2)
+    cache.put("read", {"n": 1}, 1)
+    cache.put("read", {"n": 2}, 2)
+    cache.get("read", {"n": 1})
+    cache.put("read", {"n": 3}, 3)
+    assert cache.get("read", {"n": 2}) is None
+    assert cache.get("read", {"n": 1}) == 1
+
+
+@pytest.mark.asyncio
+async def test_call_only_caches_allowed_tools_and_successes():
+    cache = ToolCache(["read"])
+    client = CountingClient()
+
+    await cache.call("read", {"p": 1}, client.call_tool)
+    await cache.call("read", {"p": 1}, client.call_tool)
+    await cache.call("write", {"p": 1}, client.call_tool)
+    await cache.call("write", {"p": 1}, client.call_tool)
+    assert [c[0] for c in client.calls] == ["read", "write", "write"]
+
+    async def failing(name, args):
+        return types.SimpleNamespace(content=[], is_error=True)
+
+    await cache.call("read", {"p": 2}, failing)
+    assert cache.get("read", {"p": 2}) is None
+
+
+@pytest.mark.asyncio
+async def test_model_call_tools_go_through_shared_cache():
+    from models.openai import OpenAIModel
+
+    cache = ToolCache(["read"])
+    client = CountingClient()
+    models = []
+    for _ in range(2):
+        model = OpenAIModel(**model_kwargs(name="gpt-test", tool_cache=cache))
+        model.client = client
+        models.append(model)
+
+    first = await asyncio.wait_for(models[0].call_tools([("read", {"path": "/"})]), timeout=2.0)
+    second = await asyncio.wait_for(models[1].call_tools([("read", {"path": "/"})]), timeout=2.0)
+    assert len(client.calls) == 1
+    assert first[0] is second[0]
+    assert cache.hits == 1 and cache.misses == 1
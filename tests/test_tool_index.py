@@ -0,0 +1,133 @@
+import types as pytypes
+
+import pytest
+
+from composite_model import CompositeModel
+from conftest import FakeCompletions, FakeServer, choice, model_kwargs, tool_call
+from models.anthropic import AnthropicModel
+from models.gemini import GeminiModel
+from models.openai import OpenAIModel
+from tool_index import ToolIndex, tokenize
+from tool_output_store import ToolOutputStore
+from tracing import InMemoryTracer
+
+
+def tool(name, description, **properties):
+    schema = {"type": "object", "properties": {key: {"type": "string", "description": text} for key, text in properties.items()}}
+    # The provider converters read either spelling of the schema
+    return pytypes.SimpleNamespace(name=name, description=description, input_schema=schema, inputSchema=schema)
+
+
+TOOLS = [
+    tool("get_weather", "Current weather of a city", city="Name of the city"),
+    tool("read_file", "Read a file from the disk", path="Path of the file"),
+    tool("sendEmail", "Send an email message", recipient="Address of the recipient", subject="Subject line"),
+    tool("list_calendar_events", "Events in the calendar of the user", day="Day of the events"),
+    tool("search_web", "Search the web for pages", query="Words to search for"),
+]
+
+
+def make_model(*choices, **overrides):
+    model = OpenAIModel(**model_kwargs(max_tokens=100000, temperature=0, **overrides))
+    model.openai = pytypes.SimpleNamespace(chat=pytypes.SimpleNamespace(completions=FakeCompletions(*choices)))
+    model.client = FakeServer()
+    model.init()
+    model.init_tools(TOOLS)
+    return model
+
+
+def test_tokens_split_names_and_fold_plurals():
+    assert tokenize("sendEmail list_calendar_events") == ["send", "email", "list", "calendar", "event"]
+
+
+@pytest.mark.asyncio
+async def test_tools_are_ranked_by_name_description_and_parameters():
+    index = ToolIndex(top_k=2)
+    index.build(TOOLS)
+    assert (await index.search("what's the weather in Rome?"))[0] == "get_weather"
+    assert (await index.search("email the recipient"))[0] == "sendEmail"
+    # Parameter descriptions are indexed too
+    assert await index.search("which path?") == ["read_file"]
+    assert await index.search("hello there") == []
+
+
+@pytest.mark.asyncio
+async def test_only_relevant_and_pinned_tools_are_sent():
+    tracer = InMemoryTracer()
+    model = make_model(choice("It is sunny"), tool_index=ToolIndex(top_k=1, pinned=["search_web"]), tracer=tracer)
+    everything = model.count_fixed_tokens()
+    await model.process_query("weather in Rome?")
+    assert model.openai.chat.completions.tools == [["get_weather", "search_web"]]
+    assert model.count_fixed_tokens() < everything
+    (span,) = tracer.find("select_tools")
+    assert span.attributes["count"] == 2 and span.attributes["total"] == 5
+
+
+@pytest.mark.asyncio
+async def test_the_selection_widens_when_the_model_asks_for_an_unseen_tool():
+    model = make_model(
+        choice(tool_calls=[tool_call("read_file")]),
+        choice(tool_calls=[tool_call("calendar")]),
+        choice("Done"),
+        tool_index=ToolIndex(top_k=1),
+    )
+    await model.process_query("weather in Rome?")
+    tools = model.openai.chat.completions.tools
+    assert tools[0] == ["get_weather"]
+    # A tool it named is added, and an unknown name adds the tools that match it
+    assert tools[1] == ["get_weather", "read_file"]
+    assert tools[2] == ["get_weather", "read_file", "list_calendar_events"]
+    assert model.client.calls == ["read_file", "calendar"]
+
+
+@pytest.mark.asyncio
+async def test_embeddings_are_blended_with_the_lexical_scores():
+    topics = {"get_weather": [1, 0], "search_web": [0, 1]}
+
+    async def embed(texts):
+        # The query about umbrellas is close to the weather
+        return [topics.get(text.split()[0], [1, 0.1] if "umbrella" in text else [0, 0]) for text in texts]
+
+    index = ToolIndex(top_k=1, embed=embed, embedding_weight=1)
+    index.build(TOOLS)
+    assert await index.search("do I need an umbrella?") == ["get_weather"]
+
+    async def broken(texts):
+        raise ConnectionError("no embeddings")
+
+    index = ToolIndex(top_k=1, embed=broken)
+    index.build(TOOLS)
+    assert await index.search("read the file") == ["read_file"]
+
+
+@pytest.mark.asyncio
+async def test_tools_are_left_out_when_none_matches_the_query():
+    model = make_model(choice("Hello!"), tool_index=ToolIndex(top_k=2))
+    await model.process_query("hello there")
+    # An empty tools array would be rejected by the API
+    assert model.openai.chat.completions.tools == [None]
+    assert model.messages[-1]["content"] == "Hello!"
+
+
+@pytest.mark.asyncio
+async def test_built_in_tools_stay_available():
+    store = ToolOutputStore()
+    model = make_model(choice("Done"), tool_index=ToolIndex(top_k=1), tool_output_store=store)
+    await model.process_query("weather in Rome?")
+    assert model.openai.chat.completions.tools == [["get_weather", "read_tool_output"]]
+
+
+def test_composite_members_get_the_selection():
+    members = [
+        OpenAIModel(**model_kwargs()),
+        AnthropicModel(**model_kwargs(format="anthropic")),
+    ]
+    model = CompositeModel(members=members, **model_kwargs(format="composite", tool_index=ToolIndex()))
+    model.init()
+    model.init_tools(TOOLS)
+    model.select_tools(["read_file"])
+    assert [schema["name"] for schema in members[1].available_tools] == ["read_file"]
+    assert model.available_tools is members[0].available_tools
+
+    with pytest.raises(ValueError):
+        GeminiModel(**model_kwargs(format="gemini", tool_index=ToolIndex()))
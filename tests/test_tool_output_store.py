@@ -0,0 +1,104 @@
+import types as pytypes
+
+import pytest
+
+from conftest import FakeServer, model_kwargs, text_result
+from model_factory import ModelFactory
+from models.anthropic import AnthropicModel
+from models.gemini import GeminiModel
+from models.openai import OpenAIModel
+from tool_output_store import ToolOutputStore
+from tracing import InMemoryTracer
+
+
+def make_model(model_class=OpenAIModel, **overrides):
+    m = model_class(**model_kwargs(**overrides))
+    m.init()
+    m.init_tools([])
+    return m
+
+
+def test_long_outputs_are_replaced_by_a_preview():
+    store = ToolOutputStore(max_chars=100, preview_chars=20)
+    short = text_result("short")
+    assert store.spill(short) is short
+
+    text = "a" * 10 + "b" * 200 + "c" * 10
+    spilled = store.spill(text_result(text))
+    (handle,) = store.outputs
+    preview = spilled.content[0].text
+    assert preview.startswith("a" * 10 + "\n") and preview.endswith("\n" + "c" * 10)
+    assert f'handle "{handle}"' in preview and "200 of 220 characters omitted" in preview
+    # The same output is stored once
+    store.spill(text_result(text))
+    assert len(store.outputs) == 1
+
+
+def test_non_text_outputs_are_kept():
+    store = ToolOutputStore(max_chars=10)
+    image = pytypes.SimpleNamespace(content=[pytypes.SimpleNamespace(type="image", data="x" * 100)])
+    assert store.spill(image) is image
+
+
+def test_read_pages_through_the_output():
+    store = ToolOutputStore(page_chars=4)
+    handle = store.store("0123456789")
+    assert store.read(handle) == "[characters 0-4 of 10]\n0123\n[next offset: 4]"
+    assert store.read(handle, offset=8, length=10) == "[characters 8-10 of 10]\n89"
+    assert store.call({"handle": "missing"}).is_error
+    assert store.call({"handle": handle, "offset": "x"}).is_error
+
+
+def test_least_recently_used_output_is_dropped():
+    store = ToolOutputStore(max_outputs=2)
+    first, second = store.store("one"), store.store("two")
+    store.read(first)
+    store.store("three")
+    assert first in store.outputs and second not in store.outputs
+
+
+@pytest.mark.asyncio
+async def test_model_spills_output_and_serves_read_tool_locally():
+    tracer = InMemoryTracer()
+    store = ToolOutputStore(max_chars=50, preview_chars=10, page_chars=100)
+    model = make_model(tool_output_store=store, tracer=tracer)
+    model.client = FakeServer(outputs={"list_files": "\n".join(f"file{n}.txt" for n in range(100))})
+
+    result = await model.call_tool("list_files", {})
+    (handle,) = store.outputs
+    assert handle in result.content[0].text and len(result.content[0].text) < 200
+
+    page = await model.call_tool("read_tool_output", {"handle": handle, "offset": 0})
+    assert page.content[0].text.startswith("[characters 0-100 of")
+    assert "file0.txt" in page.content[0].text
+    # read_tool_output never reaches the MCP server
+    assert model.client.calls == ["list_files"]
+    assert [span.attributes.get("spilled") for span in tracer.find("call_tool")] == [True, None]
+
+
+@pytest.mark.parametrize("model_class, format", [(OpenAIModel, "openai"), (AnthropicModel, "anthropic")])
+def test_read_tool_is_offered_to_every_provider(model_class, format):
+    model = make_model(model_class, format=format, tool_output_store=ToolOutputStore())
+    model.init_tools([pytypes.SimpleNamespace(name="echo", description="Echo", inputSchema={}, input_schema={})])
+    tools = str(model.available_tools)
+    assert "echo" in tools and "read_tool_output" in tools and "handle" in tools
+
+
+def test_gemini_rejects_the_store():
+    # The SDK is given the MCP session, so the model would never see read_tool_output
+    with pytest.raises(ValueError):
+        make_model(GeminiModel, format="gemini", tool_output_store=ToolOutputStore())
+
+
+def test_factory_passes_tool_output_store():
+    store = ToolOutputStore()
+    factory = ModelFactory()
+    factory.set_openai_api_key("k")
+    factory.set_name("gpt-test")
+    factory.set_max_tokens(1000)
+    factory.set_temperature(0.1)
+    factory.set_prints(lambda *_: None, lambda *_: None, lambda *_: None)
+    factory.set_summarizer_max_tokens(64)
+    factory.set_summarizer_language("english")
+    factory.set_tool_output_store(store)
+    assert factory.build().tool_output_store is store
@@ -0,0 +1,163 @@
+import asyncio
+import types as pytypes
+
+import pytest
+
+import model as model_module
+import retry
+from conftest import FakeClock, model_kwargs
+from model_factory import ModelFactory
+from models.openai import OpenAIModel
+from tool_cache import ToolCache
+from tracing import NOOP_SPAN, NOOP_TRACER, InMemoryTracer, Tracer
+
+
+class FakeAPIError(Exception):
+    status_code = 503
+
+
+class StubClient:
+    async def call_tool(self, name, args):
+        await asyncio.sleep(0)
+        return pytypes.SimpleNamespace(content=[pytypes.SimpleNamespace(text=f"{name}-result")])
+
+
+def make_model(**overrides):
+    m = OpenAIModel(**model_kwargs(**{"name": "gpt-test", "max_tries": 3, **overrides}))
+    m.init_tools([])
+    m.client = StubClient()
+    return m
+
+
+def completion(finish_reason, content=None, tool_calls=None, usage=None):
+    message = pytypes.SimpleNamespace(content=content, tool_calls=tool_calls)
+    return pytypes.SimpleNamespace(
+        choices=[pytypes.SimpleNamespace(finish_reason=finish_reason, message=message)],
+        usage=usage
+    )
+
+
+def tool_call(call_id, name):
+    return pytypes.SimpleNamespace(id=call_id, type="function", function=pytypes.SimpleNamespace(name=name, arguments="{}"))
+
+
+def test_model_defaults_to_noop_tracer():
+    model = make_model()
+    assert model.tracer is NOOP_TRACER
+    with model.tracer.span("anything", key="value") as span:
+        span.set(other=1)
+    assert span is NOOP_SPAN
+
+
+def test_in_memory_tracer_records_nesting_and_durations():
+    clock = FakeClock()
+    tracer = InMemoryTracer(clock=clock)
+    with tracer.span("outer", a=1) as outer:
+        clock.now = 1.0
+        with tracer.span("inner") as inner:
+            clock.now = 3.0
+            inner.set(b=2)
+    assert [span.name for span in tracer.spans] == ["inner", "outer"]
+    assert inner.parent is outer and outer.parent is None
+    assert inner.duration == 2.0 and outer.duration == 3.0
+    assert tracer.children(outer) == [inner]
+    assert inner.to_dict() == {"name": "inner", "parent": "outer", "duration": 2.0, "attributes": {"b": 2}}
+    assert tracer.summary() == {"inner": {"count": 1, "total": 2.0}, "outer": {"count": 1, "total": 3.0}}
+
+
+def test_span_records_error_type():
+    tracer = InMemoryTracer()
+    with pytest.raises(KeyError):
+        with tracer.span("failing"):
+            raise KeyError("x")
+    assert tracer.find("failing")[0].attributes["error"] == "KeyError"
+
+
+@pytest.mark.asyncio
+async def test_process_query_spans_model_calls_and_tools():
+    tracer = InMemoryTracer()
+    model = make_model(tracer=tracer)
+    responses = [
+        completion("tool_calls", tool_calls=[tool_call("1", "a"), tool_call("2", "b")],
+                   usage=pytypes.SimpleNamespace(prompt_tokens=10, completion_tokens=4)),
+        completion("stop", content="done", usage=pytypes.SimpleNamespace(prompt_tokens=20, completion_tokens=2)),
+    ]
+
+    async def create(**kwargs):
+        return responses.pop(0)
+
+    model.openai = pytypes.SimpleNamespace(chat=pytypes.SimpleNamespace(completions=pytypes.SimpleNamespace(create=create)))
+    await asyncio.wait_for(model.process_query("hello"), timeout=2.0)
+
+    (turn,) = tracer.find("process_query")
+    assert turn.attributes["provider"] == "openai" and turn.attributes["messages"] == len(model.messages)
+    messages = tracer.find("create_message")
+    assert [span.attributes["input_tokens"] for span in messages] == [10, 20]
+    assert [span.attributes["output_tokens"] for span in messages] == [4, 2]
+    assert all(span.attributes["tries"] == 1 and span.parent is turn for span in messages)
+    (tools,) = tracer.find("call_tools")
+    assert tools.attributes["count"] == 2 and tools.parent is turn
+    # Concurrent tool calls still nest under the call_tools span
+    assert sorted(span.attributes["tool"] for span in tracer.children(tools)) == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_create_message_span_counts_retries_and_sleep(monkeypatch):
+    async def fake_sleep(delay):
+        pass
+
+    monkeypatch.setattr(model_module.asyncio, "sleep", fake_sleep)
+    tracer = InMemoryTracer()
+    model = make_model(tracer=tracer, retry_policy=retry.RetryPolicy(max_tries=3, base_delay=1, jitter=False))
+    errors = [FakeAPIError(), FakeAPIError()]
+
+    async def request():
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    assert await model.call_with_retry(request) == "ok"
+    (span,) = tracer.find("create_message")
+    assert span.attributes["tries"] == 3
+    assert span.attributes["retry_sleep"] == 3
+
+
+@pytest.mark.asyncio
+async def test_summarize_and_check_spans():
+    tracer = InMemoryTracer()
+    model = make_model(tracer=tracer, max_tokens=1)
+    model.messages.extend([{"role": "user", "content": f"message {n}"} for n in range(4)])
+
+    async def create_summary(messages):
+        return "summary"
+
+    model.create_summary = create_summary
+    await model.summarize_if_needed([{"role": "user", "content": "q"}])
+
+    (check,) = tracer.find("check_summarize_needed")
+    assert check.attributes["needed"] is True and check.attributes["tokens"] > 1
+    (summary,) = tracer.find("summarize")
+    assert summary.attributes["tokens_after"] < summary.attributes["tokens_before"]
+
+
+@pytest.mark.asyncio
+async def test_call_tool_span_marks_cache_hits():
+    tracer = InMemoryTracer()
+    model = make_model(tracer=tracer, tool_cache=ToolCache(["a"]))
+    await model.call_tool("a", {"x": 1})
+    await model.call_tool("a", {"x": 1})
+    assert [span.attributes["cached"] for span in tracer.find("call_tool")] == [False, True]
+
+
+def test_factory_passes_tracer():
+    tracer = Tracer()
+    factory = ModelFactory()
+    factory.set_openai_api_key("k")
+    factory.set_name("gpt-test")
+    factory.set_max_tokens(1000)
+    factory.set_temperature(0.1)
+    factory.set_prints(lambda *_: None, lambda *_: None, lambda *_: None)
+    factory.set_summarizer_max_tokens(64)
+    factory.set_summarizer_language("english")
+    factory.set_tracer(tracer)
+    assert factory.build().tracer is tracer
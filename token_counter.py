@@ -0,0 +1,145 @@
+import functools
+import json
+import logging
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(name: str = "o200k_base"):
+    """
+    Load a tiktoken encoding on first use instead of at import time.
+    Returns None when it cannot be loaded (e.g. offline without a cached
+    copy of the encoding), in which case token counts are estimated.
+    """
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        logging.warning(f"Tokenizer {name} not available, token counts will be estimated: {e}")
+        return None
+
+def to_json(value):
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+def render_block(block):
+    if isinstance(block, dict):
+        if block.get("type") == "tool_use":
+            return f"{block.get('name')} {to_json(block.get('input'))}"
+        if block.get("type") == "tool_result":
+            return render_content(block.get("content"))
+        if "text" in block:
+            return block["text"] or ""
+        return to_json(block)
+    if getattr(block, "type", None) == "tool_use":
+        return f"{block.name} {to_json(block.input)}"
+    text = getattr(block, "text", None)
+    if isinstance(text, str):
+        return text
+    return str(block)
+
+def render_content(content):
+    if content is None:
+        return ""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "\n".join(render_block(block) for block in content)
+    return str(content)
+
+def get_role(message):
+    """Role of an OpenAI or Anthropic dict or of a Gemini Content"""
+    if isinstance(message, dict):
+        return message.get("role")
+    return getattr(message, "role", None)
+
+def render_message(message):
+    """
+    Text the provider actually tokenizes for message: the content of
+    OpenAI and Anthropic dicts (text, tool calls, tool results) or the
+    parts of a Gemini Content, without the Python repr around them.
+    """
+    if isinstance(message, dict):
+        text = render_content(message.get("content"))
+        for tool_call in message.get("tool_calls") or []:
+            function = tool_call.get("function", {})
+            text += f"\n{function.get('name')} {function.get('arguments')}"
+        return text
+    parts = getattr(message, "parts", None)
+    if parts is not None:
+        rendered = []
+        for part in parts:
+            function_call = getattr(part, "function_call", None)
+            function_response = getattr(part, "function_response", None)
+            if function_call:
+                rendered.append(f"{function_call.name} {to_json(function_call.args)}")
+            elif function_response:
+                rendered.append(f"{function_response.name} {to_json(function_response.response)}")
+            else:
+                rendered.append(getattr(part, "text", None) or "")
+        return "\n".join(rendered)
+    return str(message)
+
+class TokenCounter:
+    """
+    Count the tokens of rendered messages and tool schemas with a tiktoken
+    encoding, scaled by a ratio calibrated against the prompt tokens that
+    the provider reports. Counts stay raw (unscaled) in MessageHistory, so
+    a new calibration applies to the whole history at once.
+    """
+
+    # Role and separators added by the chat format to every message
+    message_overhead = 4
+    # Characters per token of the estimate used without tokenizer
+    chars_per_token = 4
+
+    def __init__(self, encoding: str = "o200k_base", smoothing: float = 0.3):
+        self.encoding = encoding
+        self.smoothing = smoothing
+        self.ratio = 1.0
+        self.samples = 0
+
+    def count_text(self, text: str):
+        if not text:
+            return 0
+        encoding = get_encoding(self.encoding)
+        if encoding is None:
+            return len(text) // self.chars_per_token + 1
+        return len(encoding.encode(text))
+
+    def count_message(self, message):
+        return self.count_text(render_message(message)) + self.message_overhead
+
+    def count_tools(self, tools):
+        if not tools:
+            return 0
+        return self.count_text(to_json(tools))
+
+    def scale(self, tokens: int):
+        return round(tokens * self.ratio)
+
+    def get_prompt_tokens(self, usage: dict):
+        """Prompt tokens of a request, from the dict returned by Model.get_usage()"""
+        return usage.get("input_tokens")
+
+    def calibrate(self, estimated: int, reported: int):
+        """Move the ratio towards reported / estimated (moving average)"""
+        if not estimated or not reported:
+            return
+        # Ignore absurd samples (e.g. usage of a different request)
+        ratio = min(max(reported / estimated, 0.25), 4.0)
+        if self.samples == 0:
+            self.ratio = ratio
+        else:
+            self.ratio += self.smoothing * (ratio - self.ratio)
+        self.samples += 1
+
+class AnthropicTokenCounter(TokenCounter):
+    """
+    Claude's tokenizer is not available offline: o200k_base is used and the
+    ratio learns the difference from the reported usage.
+    """
+
+    def get_prompt_tokens(self, usage: dict):
+        # input_tokens does not include the tokens read from or written to the cache
+        input_tokens = usage.get("input_tokens")
+        if input_tokens is None:
+            return None
+        return input_tokens + usage.get("cache_read_tokens", 0) + usage.get("cache_write_tokens", 0)
@@ -0,0 +1,81 @@
+from utils import normalize_args
+
+from collections import OrderedDict
+import copy
+import json
+import time
+
+class ToolCache:
+    """
+    Opt-in cache of MCP tool results. Only the tools in the allow-list are
+    cached, so it must contain read-only tools only. Entries expire after a
+    per-tool time-to-live and the least recently used entry is evicted when
+    the cache is full. One instance can be shared by several models.
+    """
+
+    def __init__(self, tools, ttl: float = 300, max_size: int = 1024, tool_ttls: dict = None, clock=time.monotonic):
+        self.tools = set(tools)
+        self.ttl = ttl
+        self.tool_ttls = dict(tool_ttls or {})
+        self.max_size = max_size
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def is_cacheable(self, tool_name: str):
+        return tool_name in self.tools
+
+    def make_key(self, tool_name: str, tool_args):
+        # normalize_args removes None values in place, so work on a copy
+        args = normalize_args(copy.deepcopy(tool_args))
+        return tool_name, json.dumps(args, sort_keys=True, separators=(",", ":"), default=str)
+
+    def get(self, tool_name: str, tool_args):
+        key = self.make_key(tool_name, tool_args)
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] <= self.clock():
+            del self.entries[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, tool_name: str, tool_args, result):
+        key = self.make_key(tool_name, tool_args)
+        expires_at = self.clock() + self.tool_ttls.get(tool_name, self.ttl)
+        self.entries[key] = (expires_at, result)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, tool_name: str = None):
+        if tool_name is None:
+            self.entries.clear()
+        else:
+            for key in [key for key in self.entries if key[0] == tool_name]:
+                del self.entries[key]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self.entries)
+        }
+
+    async def call(self, tool_name: str, tool_args, call_tool):
+        """Return the cached result or await call_tool(tool_name, tool_args) and cache it"""
+        if not self.is_cacheable(tool_name):
+            return await call_tool(tool_name, tool_args)
+        result = self.get(tool_name, tool_args)
+        if result is None:
+            result = await call_tool(tool_name, tool_args)
+            # Never keep failures around
+            if not getattr(result, "is_error", False):
+                self.put(tool_name, tool_args, result)
+        return result
@@ -0,0 +1,126 @@
+import inspect
+import logging
+import math
+import re
+from collections import Counter
+
+def tokenize(text: str):
+    """Lowercase words of text, with snake_case and camelCase names split and plurals folded"""
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", text)
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    return [word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word for word in words]
+
+def get_text(value, keys: bool = False):
+    """Strings found in value (nested dicts and lists), with the dict keys when keys is True"""
+    if isinstance(value, str):
+        return [value]
+    texts = []
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if keys:
+                texts.append(str(key))
+            texts.extend(get_text(item, keys))
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            texts.extend(get_text(item, keys))
+    return texts
+
+def get_tool_text(tool):
+    """Name, description and parameter schema of an MCP tool as text"""
+    schema = getattr(tool, "input_schema", None) or getattr(tool, "inputSchema", None) or {}
+    return " ".join([tool.name, getattr(tool, "description", None) or ""] + get_text(schema, keys=True))
+
+def cosine(a, b):
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return sum(x * y for x, y in zip(a, b)) / norm if norm else 0.0
+
+class ToolIndex:
+    """
+    Local BM25 index over the names, descriptions and parameter schemas of
+    the MCP tools, used to send a model only the top_k tools relevant to a
+    query plus the pinned ones. With embed, an async function returning
+    one vector per text, the lexical score is blended with the cosine
+    similarity of the query and the tool (embedding_weight of the score).
+    """
+
+    def __init__(self, top_k: int = 10, pinned=(), embed=None, embedding_weight: float = 0.5, name_weight: int = 2, k1: float = 1.5, b: float = 0.75):
+        if top_k < 1:
+            raise ValueError("top_k must be at least 1")
+        if not 0 <= embedding_weight <= 1:
+            raise ValueError("The embedding weight must be between 0 and 1")
+        self.top_k = top_k
+        self.pinned = list(pinned)
+        self.embed = embed
+        self.embedding_weight = embedding_weight
+        self.name_weight = name_weight
+        self.k1 = k1
+        self.b = b
+        self.names = []
+        self.texts = []
+        self.vectors = None
+        self.term_counts = []
+        self.lengths = []
+        self.average_length = 0
+        self.idf = {}
+
+    def build(self, tools):
+        """Index the tools (MCP tools or anything with name, description and input_schema)"""
+        self.names = [tool.name for tool in tools]
+        self.texts = [get_tool_text(tool) for tool in tools]
+        self.vectors = None
+        # The words of the name count name_weight times
+        documents = [tokenize(tool.name) * self.name_weight + tokenize(text) for tool, text in zip(tools, self.texts)]
+        self.term_counts = [Counter(document) for document in documents]
+        self.lengths = [len(document) for document in documents]
+        self.average_length = sum(self.lengths) / len(documents) if documents else 0
+        frequencies = Counter(term for counts in self.term_counts for term in counts)
+        self.idf = {
+            term: math.log(1 + (len(documents) - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in frequencies.items()
+        }
+
+    def get_lexical_scores(self, query: str):
+        terms = [term for term in set(tokenize(query)) if term in self.idf]
+        scores = []
+        for counts, length in zip(self.term_counts, self.lengths):
+            score = 0.0
+            for term in terms:
+                frequency = counts.get(term, 0)
+                if frequency:
+                    norm = 1 - self.b + self.b * length / (self.average_length or 1)
+                    score += self.idf[term] * frequency * (self.k1 + 1) / (frequency + self.k1 * norm)
+            scores.append(score)
+        return scores
+
+    async def get_embeddings(self, texts):
+        vectors = self.embed(texts)
+        if inspect.isawaitable(vectors):
+            vectors = await vectors
+        return list(vectors)
+
+    async def get_semantic_scores(self, query: str):
+        """Cosine similarities of query and every tool, or None when the embeddings are not available"""
+        try:
+            if self.vectors is None:
+                self.vectors = await self.get_embeddings(self.texts)
+            (vector,) = await self.get_embeddings([query])
+        except Exception as e:
+            logging.warning(f"Tool embeddings not available, using the lexical scores: {e}")
+            return None
+        return [max(cosine(vector, tool_vector), 0.0) for tool_vector in self.vectors]
+
+    async def search(self, query: str, top_k: int = None):
+        """Names of the top_k tools most relevant to query, best first; tools with no score are left out"""
+        scores = self.get_lexical_scores(query)
+        best = max(scores, default=0)
+        if best:
+            scores = [score / best for score in scores]
+        if self.embed is not None and self.names:
+            semantic = await self.get_semantic_scores(query)
+            if semantic is not None:
+                scores = [
+                    (1 - self.embedding_weight) * score + self.embedding_weight * similarity
+                    for score, similarity in zip(scores, semantic)
+                ]
+        ranked = sorted(range(len(scores)), key=lambda index: -scores[index])
+        return [self.names[index] for index in ranked if scores[index] > 0][:top_k or self.top_k]
@@ -0,0 +1,100 @@
+from mcp.types import TextContent
+
+from collections import OrderedDict
+from types import SimpleNamespace
+import hashlib
+
+class ToolOutputStore:
+    """
+    Keeps tool outputs longer than max_chars out of the history: the model
+    gets a preview (head and tail) with a handle, and pages through the
+    whole output with the built-in read_tool_output tool. Outputs are
+    stored by content, so a repeated output reuses its handle; the least
+    recently used output is dropped when max_outputs are stored. One
+    instance can be shared by several models.
+    """
+
+    tool_name = "read_tool_output"
+
+    def __init__(self, max_chars: int = 8000, preview_chars: int = 1000, page_chars: int = 4000, max_outputs: int = 256):
+        self.max_chars = max_chars
+        self.preview_chars = preview_chars
+        self.page_chars = page_chars
+        self.max_outputs = max_outputs
+        self.outputs = OrderedDict()
+
+    def get_tool(self):
+        """Description of read_tool_output in the shape of an MCP tool"""
+        schema = {
+            "type": "object",
+            "properties": {
+                "handle": {"type": "string", "description": "Handle shown in the preview of the output"},
+                "offset": {"type": "integer", "description": "First character to read, 0 by default"},
+                "length": {"type": "integer", "description": f"Characters to read, at most {self.page_chars}"}
+            },
+            "required": ["handle"]
+        }
+        # The provider converters read either spelling of the schema
+        return SimpleNamespace(
+            name=self.tool_name,
+            description="Read a part of a tool output that was too long to be shown in full",
+            inputSchema=schema,
+            input_schema=schema
+        )
+
+    def store(self, text: str):
+        handle = hashlib.sha1(text.encode()).hexdigest()[:12]
+        self.outputs[handle] = text
+        self.outputs.move_to_end(handle)
+        while len(self.outputs) > self.max_outputs:
+            self.outputs.popitem(last=False)
+        return handle
+
+    def make_preview(self, handle: str, text: str):
+        half = self.preview_chars // 2
+        return (
+            f"{text[:half]}\n"
+            f"[... {len(text) - 2 * half} of {len(text)} characters omitted. "
+            f"Call {self.tool_name} with handle \"{handle}\" and an offset to read them ...]\n"
+            f"{text[-half:]}"
+        )
+
+    def spill(self, result):
+        """Return result, or a copy with a preview when its text is too long"""
+        content = getattr(result, "content", None)
+        # Only plain text outputs are spilled
+        if not content or any(getattr(item, "type", "text") != "text" for item in content):
+            return result
+        text = "\n".join(item.text for item in content)
+        if len(text) <= self.max_chars:
+            return result
+        handle = self.store(text)
+        return make_result(self.make_preview(handle, text), getattr(result, "is_error", False))
+
+    def read(self, handle: str, offset: int = 0, length: int = None):
+        """One page of a stored output; raises KeyError for unknown handles"""
+        text = self.outputs[handle]
+        self.outputs.move_to_end(handle)
+        length = min(length or self.page_chars, self.page_chars)
+        offset = max(offset, 0)
+        end = min(offset + length, len(text))
+        page = f"[characters {offset}-{end} of {len(text)}]\n{text[offset:end]}"
+        if end < len(text):
+            page += f"\n[next offset: {end}]"
+        return page
+
+    def call(self, tool_args):
+        """Run read_tool_output with the arguments chosen by the model"""
+        args = tool_args or {}
+        try:
+            return make_result(self.read(
+                str(args.get("handle")), int(args.get("offset") or 0), int(args.get("length") or 0) or None
+            ))
+        except KeyError:
+            return make_result(f"Unknown or expired handle: {args.get('handle')}", is_error=True)
+        except (TypeError, ValueError) as e:
+            return make_result(f"Invalid arguments: {e}", is_error=True)
+
+def make_result(text: str, is_error: bool = False):
+    """Tool result with the content and is_error attributes of an MCP result"""
+    return SimpleNamespace(content=[TextContent(type="text", text=text)], is_error=is_error)
@@ -0,0 +1,108 @@
+import contextvars
+import time
+
+class NoopSpan:
+    """Span returned by the default tracer: every operation does nothing"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+NOOP_SPAN = NoopSpan()
+
+class Tracer:
+    """
+    Instrumentation hook of Model and MCPClient. The default implementation
+    records nothing and hands out one shared span, so an untraced turn pays
+    a method call per span. Subclasses override span() to collect or export
+    the spans.
+    """
+
+    def span(self, name: str, **attributes):
+        return NOOP_SPAN
+
+NOOP_TRACER = Tracer()
+
+class Span:
+    def __init__(self, tracer, name: str, attributes: dict):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.parent = None
+        self.start = None
+        self.end = None
+        self._token = None
+
+    @property
+    def duration(self):
+        """Seconds between enter and exit, None while the span is open"""
+        if self.end is None:
+            return None
+        return self.end - self.start
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.parent = self.tracer.current.get()
+        self._token = self.tracer.current.set(self)
+        self.start = self.tracer.clock()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = self.tracer.clock()
+        self.tracer.current.reset(self._token)
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        self.tracer.record(self)
+        return False
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "parent": self.parent.name if self.parent is not None else None,
+            "duration": self.duration,
+            "attributes": dict(self.attributes)
+        }
+
+class InMemoryTracer(Tracer):
+    """
+    Keep every finished span in self.spans, in the order they end. The
+    parent of a span is the span open in the same asyncio context when it
+    started, so the tool calls of a turn are children of its process_query
+    span even when they run concurrently.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.spans = []
+        self.current = contextvars.ContextVar(f"current_span_{id(self)}", default=None)
+
+    def span(self, name: str, **attributes):
+        return Span(self, name, attributes)
+
+    def record(self, span):
+        self.spans.append(span)
+
+    def find(self, name: str):
+        return [span for span in self.spans if span.name == name]
+
+    def children(self, span):
+        return [child for child in self.spans if child.parent is span]
+
+    def clear(self):
+        self.spans.clear()
+
+    def summary(self):
+        """Number of spans and total seconds per span name"""
+        summary = {}
+        for span in self.spans:
+            entry = summary.setdefault(span.name, {"count": 0, "total": 0.0})
+            entry["count"] += 1
+            entry["total"] += span.duration
+        return summary